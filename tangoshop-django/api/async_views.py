@@ -0,0 +1,128 @@
+from api.serializers import LoginSerializer
+from api.services.auth_service import auth_service
+from api.services.catalog_service import catalog_service
+from api.services.supplier_service import supplier_service
+from api.utils.coalescing import acoalesce
+from api.utils.conditional import ContentVersion, not_modified_response, set_validators
+from api.utils.decorators import require_auth, require_methods, require_role
+from api.utils.json_codec import JSONResponse, loads
+from api.utils.password_hasher import HasherBusyError
+
+# Versiones async de los endpoints mas usados, para servir bajo ASGI con el
+# AsyncClient de Firestore. Son vistas de Django (DRF no soporta vistas
+# async) y responden con el mismo formato que las de views.py. Los
+# decoradores de django.views.decorators de Django 4.2 no soportan vistas
+# async, por eso se usan los de api.utils.decorators.
+
+@require_methods('POST')
+async def login(request):
+    try:
+        data = loads(request.body or b'{}')
+    except ValueError:
+        data = None
+
+    serializer = LoginSerializer(data=data)
+    if not serializer.is_valid():
+        return JSONResponse({
+            'success': False,
+            'message': 'Datos invalidos',
+            'errors': serializer.errors
+        }, status=400)
+
+    try:
+        result = await auth_service.alogin(serializer.validated_data)
+        return JSONResponse({
+            'success': True,
+            'message': 'Login exitoso',
+            'data': result
+        }, status=200)
+    except HasherBusyError as exc:
+        response = JSONResponse({'success': False, 'message': str(exc)}, status=503)
+        response['Retry-After'] = '1'
+        return response
+    except ValueError as exc:
+        code = 401 if 'Credenciales' in str(exc) or 'Cuenta desactivada' in str(exc) else 400
+        return JSONResponse({'success': False, 'message': str(exc)}, status=code)
+    except Exception as exc:
+        return JSONResponse({
+            'success': False,
+            'message': 'Error al iniciar sesion',
+            'error': str(exc)
+        }, status=500)
+
+# Igual que en las vistas de DRF: la API se autentica por token, no por cookie.
+login.csrf_exempt = True
+
+@require_methods('GET')
+@require_auth
+@require_role('reseller')
+async def get_my_catalog(request):
+    try:
+        version = ContentVersion()
+        reseller_id = request.user_data['userId']
+        result = await acoalesce('catalog', (reseller_id,),
+                                 lambda loaded: catalog_service.aget_reseller_catalog(reseller_id, version=loaded), version)
+        not_modified = not_modified_response(request, version)
+        if not_modified is not None:
+            return not_modified
+
+        return set_validators(JSONResponse({
+            'success': True,
+            'data': result
+        }, status=200), version)
+
+    except ValueError as exc:
+        return JSONResponse({
+            'success': False,
+            'message': str(exc)
+        }, status=404)
+
+    except Exception as exc:
+        return JSONResponse({
+            'success': False,
+            'message': 'Error al obtener catálogo',
+            'error': str(exc)
+        }, status=500)
+
+@require_methods('GET')
+@require_auth
+@require_role('supplier')
+async def get_resellers_high_markup(request, product_id):
+    try:
+        version = ContentVersion()
+        supplier_id = request.user_data['userId']
+        result = await acoalesce(
+            'high_markup', (supplier_id, product_id),
+            lambda loaded: supplier_service.aget_resellers_high_markup(supplier_id, product_id, version=loaded),
+            version,
+        )
+        not_modified = not_modified_response(request, version)
+        if not_modified is not None:
+            return not_modified
+
+        return set_validators(JSONResponse({
+            'success': True,
+            'data': result
+        }, status=200), version)
+
+    except ValueError as exc:
+        error_msg = str(exc)
+
+        if 'no te pertenece' in error_msg:
+            code = 403
+        elif 'no encontrado' in error_msg:
+            code = 404
+        else:
+            code = 400
+
+        return JSONResponse({
+            'success': False,
+            'message': error_msg
+        }, status=code)
+
+    except Exception as exc:
+        return JSONResponse({
+            'success': False,
+            'message': 'Error al obtener revendedores',
+            'error': str(exc)
+        }, status=500)
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.utils.shared_cache import SharedCacheServer
+
+
+class Command(BaseCommand):
+    help = 'Cache de documentos compartido entre los workers de gunicorn (socket unix)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=getattr(settings, 'DOCUMENT_CACHE_SOCKET', None))
+        parser.add_argument('--max-entries', type=int,
+                            default=getattr(settings, 'DOCUMENT_CACHE_SERVER_MAX_ENTRIES', 100000))
+
+    def handle(self, *args, **options):
+        path = options['socket']
+        if not path:
+            raise CommandError('Falta --socket (o DOCUMENT_CACHE_SOCKET)')
+
+        server = SharedCacheServer(path, options['max_entries'])
+        self.stdout.write(f'Cache de documentos escuchando en {path}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
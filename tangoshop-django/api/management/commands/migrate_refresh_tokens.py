@@ -0,0 +1,96 @@
+from django.core.management.base import BaseCommand
+
+from api.services.auth_service import refresh_token_id
+from api.utils.firebase_config import db
+
+# Cada token migrado usa dos operaciones (set + delete) y un batch admite 500.
+MAX_BATCH_DOCS = 250
+# Intentos por token cuando el documento cambia entre la lectura y el commit.
+MAX_RETRIES = 5
+
+
+class Command(BaseCommand):
+    help = 'Reescribe los documentos de refreshTokens con id = sha256(token)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=MAX_BATCH_DOCS)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        from google.api_core.exceptions import FailedPrecondition
+        from google.cloud.firestore_v1.field_path import FieldPath
+
+        batch_size = max(1, min(options['batch_size'], MAX_BATCH_DOCS))
+        dry_run = options['dry_run']
+        collection = db.collection('refreshTokens')
+
+        scanned = migrated = skipped = 0
+        last_id = None
+
+        while True:
+            query = collection.order_by(FieldPath.document_id()).limit(batch_size)
+            if last_id:
+                query = query.start_after({FieldPath.document_id(): last_id})
+            docs = query.get()
+            if not docs:
+                break
+
+            batch = db.batch()
+            pending = []
+            for doc in docs:
+                scanned += 1
+                data = doc.to_dict()
+                if not data.get('token'):
+                    skipped += 1
+                    continue
+                if self._move(batch, collection, doc):
+                    pending.append(doc)
+
+            if pending and not dry_run:
+                try:
+                    batch.commit()
+                except FailedPrecondition:
+                    # Un token cambio (por ejemplo, se revoco) despues de
+                    # leerlo: se migran de a uno, releyendo cada documento.
+                    pending = [doc for doc in pending if self._retry(collection, doc.id)]
+            migrated += len(pending)
+            last_id = docs[-1].id
+            self.stdout.write(f'{scanned} revisados, {migrated} migrados')
+
+            if len(docs) < batch_size:
+                break
+
+        action = 'a migrar' if dry_run else 'migrados'
+        self.stdout.write(self.style.SUCCESS(
+            f'Listo: {scanned} revisados, {migrated} {action}, {skipped} sin token'
+        ))
+
+    def _move(self, batch, collection, doc) -> bool:
+        # El delete lleva como precondicion el update_time leido: si el token
+        # cambio entre la lectura y el commit, el batch falla en lugar de
+        # revivirlo con la copia vieja.
+        data = doc.to_dict()
+        target_id = refresh_token_id(data['token'])
+        if doc.id == target_id:
+            return False
+        batch.set(collection.document(target_id), data)
+        batch.delete(collection.document(doc.id), option=db.write_option(last_update_time=doc.update_time))
+        return True
+
+    def _retry(self, collection, doc_id: str) -> bool:
+        from google.api_core.exceptions import FailedPrecondition
+
+        for _ in range(MAX_RETRIES):
+            doc = collection.document(doc_id).get()
+            if not doc.exists or not (doc.to_dict() or {}).get('token'):
+                return False
+            batch = db.batch()
+            if not self._move(batch, collection, doc):
+                return False
+            try:
+                batch.commit()
+                return True
+            except FailedPrecondition:
+                continue
+        self.stderr.write(f'No se pudo migrar {doc_id}: cambio en cada intento')
+        return False
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from api.services.public_catalog_service import public_catalog_service
+from api.utils.firebase_config import db
+
+PAGE_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Genera los catalogos publicos de los revendedores y, con --watch, los regenera cuando cambian sus datos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reseller', action='append', default=[], help='solo estos revendedores')
+        parser.add_argument('--watch', action='store_true')
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help='segundos que se juntan cambios antes de regenerar')
+
+    def handle(self, *args, **options):
+        reseller_ids = options['reseller'] or self._public_resellers()
+        self._generate(reseller_ids)
+        if not options['watch']:
+            return
+
+        watches = public_catalog_service.watch()
+        self.stdout.write('Escuchando cambios (Ctrl+C para salir)')
+        try:
+            while True:
+                self._generate(sorted(public_catalog_service.take_dirty(settle=options['interval'])))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for watch in watches:
+                watch.unsubscribe()
+
+    def _public_resellers(self):
+        reseller_ids = []
+        last_id = None
+        while True:
+            query = db.collection('resellers') \
+                .where('catalogSettings.isPublic', '==', True) \
+                .select([]) \
+                .order_by(FieldPath.document_id()) \
+                .limit(PAGE_SIZE)
+            if last_id:
+                query = query.start_after({FieldPath.document_id(): last_id})
+            docs = query.get()
+            reseller_ids.extend(doc.id for doc in docs)
+            if len(docs) < PAGE_SIZE:
+                return reseller_ids
+            last_id = docs[-1].id
+
+    def _generate(self, reseller_ids):
+        published = unpublished = failed = 0
+        for reseller_id in reseller_ids:
+            try:
+                version = public_catalog_service.generate(reseller_id)
+            except Exception as exc:
+                failed += 1
+                self.stderr.write(f'{reseller_id}: {exc}')
+                continue
+            if version is None:
+                unpublished += 1
+            else:
+                published += 1
+        self.stdout.write(f'{published} publicados, {unpublished} no publicos, {failed} con error')
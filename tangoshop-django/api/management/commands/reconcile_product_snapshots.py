@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from api.models import Product
+from api.services.product_snapshot_service import needs_refresh, product_snapshot, snapshot_update
+from api.utils.firebase_config import db
+from api.utils.firestore_batch import MAX_BATCH_WRITES, commit_updates, fetch_documents
+
+
+class Command(BaseCommand):
+    help = ('Detecta y repara los productSnapshot de favorites que no coinciden con su producto, '
+            'y renueva productSnapshotAt de las copias por vencer')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=MAX_BATCH_WRITES)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        dry_run = options['dry_run']
+        collection = db.collection('favorites')
+
+        scanned = missing = drifted = renewed = repaired = 0
+        last_id = None
+
+        while True:
+            query = collection.select(['productId', 'productSnapshot', 'productSnapshotAt']) \
+                .order_by(FieldPath.document_id()) \
+                .limit(batch_size)
+            if last_id:
+                query = query.start_after({FieldPath.document_id(): last_id})
+            docs = query.get()
+            if not docs:
+                break
+
+            product_ids = {doc.id: (doc.to_dict() or {}).get('productId') for doc in docs}
+            product_docs = fetch_documents(db, 'products', product_ids.values(), field_paths=Product.SNAPSHOT)
+            updates = []
+            for doc in docs:
+                scanned += 1
+                product_doc = product_docs.get(product_ids[doc.id])
+                expected = product_snapshot(product_doc.to_dict() if product_doc is not None and product_doc.exists else None)
+                data = doc.to_dict() or {}
+                if not needs_refresh(data, expected):
+                    continue
+                current = data.get('productSnapshot')
+                if current is None:
+                    missing += 1
+                elif current != expected:
+                    drifted += 1
+                else:
+                    renewed += 1
+                updates.append((doc.reference, snapshot_update(expected)))
+
+            if updates and not dry_run:
+                repaired += commit_updates(db, updates)
+            last_id = docs[-1].id
+            self.stdout.write(f'{scanned} revisados, {missing} sin copia, {drifted} desactualizados, {renewed} por vencer')
+
+            if len(docs) < batch_size:
+                break
+
+        action = 'a reparar' if dry_run else 'reparados'
+        count = missing + drifted + renewed if dry_run else repaired
+        self.stdout.write(self.style.SUCCESS(
+            f'Listo: {scanned} revisados, {missing} sin copia, {drifted} desactualizados, '
+            f'{renewed} por vencer, {count} {action}'
+        ))
@@ -0,0 +1,19 @@
+import threading
+
+from django.core.management.base import BaseCommand
+
+from api.services.product_snapshot_service import product_snapshot_service
+
+
+class Command(BaseCommand):
+    help = 'Escucha cambios en products y actualiza el productSnapshot de sus favoritos'
+
+    def handle(self, *args, **options):
+        watch = product_snapshot_service.watch()
+        self.stdout.write('Escuchando cambios en products (Ctrl+C para salir)')
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watch.unsubscribe()
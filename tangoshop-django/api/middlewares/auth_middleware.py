@@ -1,28 +1,91 @@
+import hashlib
 import os
+import time
+from typing import Dict, Optional
 
 import jwt
-from django.http import JsonResponse
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from api.utils.json_codec import JSONResponse
+from api.utils.lru_cache import LRUCache
+
+# Claims ya verificados, por sha256 del token. Cada entrada vence en el exp
+# del token; los tokens invalidos o vencidos nunca se guardan.
+token_cache: Optional[LRUCache] = None
+
+
+def token_cache_stats() -> Dict:
+    return token_cache.stats() if token_cache is not None else {}
+
 
 class FirebaseAuthMiddleware:
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
+        global token_cache
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
         self.jwt_secret = os.getenv('JWT_SECRET')
         self.jwt_algorithm = os.getenv('JWT_ALGORITHM', 'HS256')
+        cache_size = getattr(settings, 'JWT_CACHE_SIZE', 4096)
+        self.token_cache = LRUCache(max_entries=cache_size) if cache_size > 0 else None
+        self.max_cache_ttl = getattr(settings, 'JWT_CACHE_MAX_TTL', 3600)
+        token_cache = self.token_cache
+
+    def _decode(self, token: str) -> Dict:
+        if self.token_cache is None:
+            return self._verify(token)
+
+        key = hashlib.sha256(token.encode()).digest()
+        user_data = self.token_cache.get(key)
+        if user_data is None:
+            decoded = self._verify(token)
+            user_data = {
+                'userId': decoded.get('userId'),
+                'email': decoded.get('email'),
+                'userType': decoded.get('userType')
+            }
+            exp = decoded.get('exp')
+            ttl = min(exp - time.time(), self.max_cache_ttl) if isinstance(exp, (int, float)) else self.max_cache_ttl
+            self.token_cache.set(key, user_data, ttl=ttl)
+        return user_data
+
+    def _verify(self, token: str) -> Dict:
+        return jwt.decode(
+            token,
+            self.jwt_secret,
+            algorithms=[self.jwt_algorithm]
+        )
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        error = self._authenticate(request)
+        if error is not None:
+            return error
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        # Bajo ASGI la verificacion (solo CPU) corre en el event loop y la
+        # cadena sigue siendo async hasta la vista.
+        error = self._authenticate(request)
+        if error is not None:
+            return error
+        return await self.get_response(request)
+
+    def _authenticate(self, request):
         auth_header = request.META.get('HTTP_AUTHORIZATION', '')
 
         if not auth_header.startswith('Bearer '):
-            return self.get_response(request)
+            return None
 
         token = auth_header.split(' ')[1]
 
         try:
-            decoded = jwt.decode(
-                token,
-                self.jwt_secret,
-                algorithms=[self.jwt_algorithm]
-            )
+            decoded = self._decode(token)
 
             request.user_data = {
                 'userId': decoded.get('userId'),
@@ -31,15 +94,15 @@ class FirebaseAuthMiddleware:
             }
 
         except jwt.ExpiredSignatureError:
-            return JsonResponse({
+            return JSONResponse({
                 'success': False,
                 'message': 'Token expirado',
                 'expired': True
             }, status=401)
         except jwt.InvalidTokenError:
-            return JsonResponse({
+            return JSONResponse({
                 'success': False,
                 'message': 'Token inválido'
             }, status=401)
 
-        return self.get_response(request)
+        return None
@@ -0,0 +1,106 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse
+
+from api.utils import metrics
+
+
+class MetricsMiddleware:
+    # Abre el contexto de metricas del request: las operaciones de Firestore
+    # que ocurran hasta la respuesta se atribuyen a la vista resuelta, y al
+    # final se registra la latencia y la cantidad de operaciones del request.
+    # Una respuesta streaming se genera despues de salir del middleware: su
+    # contenido se recorre con el mismo contexto y el request se registra
+    # cuando el servidor la cierra.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = metrics.start_request()
+        start = time.perf_counter()
+        response = None
+        try:
+            response = self.get_response(request)
+            return response
+        finally:
+            self._finish(request, start, token, response)
+
+    async def __acall__(self, request):
+        token = metrics.start_request()
+        start = time.perf_counter()
+        response = None
+        try:
+            response = await self.get_response(request)
+            return response
+        finally:
+            self._finish(request, start, token, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = metrics.current_request()
+        if stats is not None:
+            match = request.resolver_match
+            stats.view = match.view_name if match is not None else view_func.__name__
+        return None
+
+    def _finish(self, request, start, token, response) -> None:
+        stats = metrics.current_request()
+        metrics.end_request(token)
+        request.firestore_stats = stats
+        # Los archivos no leen Firestore y se dejan como estan, para no perder
+        # el envio directo del servidor (wsgi.file_wrapper).
+        if response is not None and response.streaming and not isinstance(response, FileResponse):
+            stream = _AsyncMeteredStream if response.is_async else _MeteredStream
+            response.streaming_content = stream(response.streaming_content, stats, request.method, start)
+            return
+        metrics.record_request(stats, request.method, time.perf_counter() - start)
+
+
+class _MeteredStream:
+    def __init__(self, content, stats, method: str, start: float) -> None:
+        self.content = content
+        self.stats = stats
+        self.method = method
+        self.start = start
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        token = metrics.resume_request(self.stats)
+        try:
+            return next(self.content)
+        finally:
+            metrics.end_request(token)
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            metrics.record_request(self.stats, self.method, time.perf_counter() - self.start)
+
+
+class _AsyncMeteredStream(_MeteredStream):
+    __iter__ = None
+    __next__ = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        token = metrics.resume_request(self.stats)
+        try:
+            return await self.content.__anext__()
+        finally:
+            metrics.end_request(token)
@@ -0,0 +1,96 @@
+import hmac
+import logging
+import os
+import random
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from api.utils.profiling import DeterministicProfiler, SamplingProfiler
+
+logger = logging.getLogger(__name__)
+
+
+class ProfilingMiddleware:
+    # Perfila la vista de los requests con un X-Profile igual a
+    # PROFILING_TOKEN y de una fraccion PROFILING_SAMPLE_RATE del resto. El
+    # perfil se guarda en PROFILING_DIR y las funciones mas costosas van al
+    # log y, si el request lo pidio, al header X-Profile-Summary. Sin token ni
+    # muestreo el middleware se quita de la cadena al arrancar.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.token = getattr(settings, 'PROFILING_TOKEN', None)
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+        if not self.token and self.sample_rate <= 0:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+        self.mode = getattr(settings, 'PROFILING_MODE', 'deterministic')
+        self.directory = getattr(settings, 'PROFILING_DIR', '/tmp/tangoshop-profiles')
+        self.top = getattr(settings, 'PROFILING_TOP', 5)
+        self.interval = getattr(settings, 'PROFILING_SAMPLE_INTERVAL_MS', 5) / 1000
+
+    def _requested(self, request) -> bool:
+        header = request.headers.get('X-Profile')
+        return bool(self.token and header and hmac.compare_digest(header, self.token))
+
+    def _profiler(self):
+        if self.mode == 'sampling':
+            return SamplingProfiler(interval=self.interval)
+        return DeterministicProfiler()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        requested = self._requested(request)
+        if not requested and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        profiler = self._profiler()
+        start = time.perf_counter()
+        profiler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.stop()
+        return self._report(request, response, profiler, requested, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        # En async el perfil incluye lo que corra el event loop mientras la
+        # vista espera, no solo este request.
+        requested = self._requested(request)
+        if not requested and random.random() >= self.sample_rate:
+            return await self.get_response(request)
+
+        profiler = self._profiler()
+        start = time.perf_counter()
+        profiler.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profiler.stop()
+        return self._report(request, response, profiler, requested, time.perf_counter() - start)
+
+    def _report(self, request, response, profiler, requested, seconds):
+        match = request.resolver_match
+        view = match.url_name if match is not None and match.url_name else 'unmatched'
+        profile_id = f'{time.strftime("%Y%m%dT%H%M%S")}-{view}-{uuid.uuid4().hex[:8]}'
+        summary = '; '.join(f'{function} {ms}ms' for function, ms in profiler.top(self.top))
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            profiler.write(os.path.join(self.directory, f'{profile_id}.{profiler.extension}'))
+        except OSError:
+            logger.exception('No se pudo guardar el perfil %s', profile_id)
+
+        logger.info('Perfil %s de %s %s (%.1f ms): %s', profile_id, request.method, request.path, seconds * 1000, summary)
+        if requested:
+            response['X-Profile-Id'] = profile_id
+            response['X-Profile-Summary'] = summary.encode('ascii', 'replace').decode()
+        return response
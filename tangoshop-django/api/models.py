@@ -1,7 +1,64 @@
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import MISSING, dataclass, fields
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 
-@dataclass
+# Modelos de los documentos de Firestore que usan los servicios. Son
+# dataclasses con slots (sin __dict__ por instancia) y se decodifican con
+# from_snapshot, que lee solo los campos de PROJECTION: los mismos que se
+# piden con select()/field_paths, asi no viajan ni se guardan en memoria
+# descripciones, fotos o hashes que las vistas no usan.
+
+# Por clase: (campos proyectados con su default y su modelo anidado, valores
+# fijos de los demas campos). Se arma en la primera decodificacion.
+_DECODERS: Dict[type, Tuple[List[Tuple[str, object, Optional[type]]], Dict[str, object]]] = {}
+
+
+class FirestoreModel:
+    __slots__ = ()
+
+    # Campos que lee from_snapshot; los demas quedan con su valor por defecto.
+    PROJECTION: Tuple[str, ...] = ()
+    # Campos proyectados que son mapas con otro modelo adentro.
+    NESTED: Dict[str, type] = {}
+    # Valor al decodificar cuando el documento no trae el campo, si no es el
+    # default del modelo. Un campo obligatorio sin valor aca queda en None,
+    # como el .get() que usaban los servicios.
+    DECODE_DEFAULTS: Dict[str, object] = {}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        decoder = _DECODERS.get(cls)
+        if decoder is None:
+            decoder = _DECODERS[cls] = cls._decoder()
+        projected, fixed = decoder
+
+        values = dict(fixed)
+        for name, default, model in projected:
+            value = data.get(name, default)
+            values[name] = model.from_dict(value) if model is not None and value is not None else value
+        return cls(**values)
+
+    @classmethod
+    def _decoder(cls):
+        projected, fixed = [], {}
+        for field in fields(cls):
+            default = cls.DECODE_DEFAULTS.get(field.name, field.default)
+            if default is MISSING:
+                default = None
+            if field.name in cls.PROJECTION:
+                projected.append((field.name, default, cls.NESTED.get(field.name)))
+            else:
+                fixed[field.name] = default
+        return projected, fixed
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        if not snapshot.exists:
+            return None
+        return cls.from_dict(snapshot.to_dict() or {})
+
+
+@dataclass(slots=True)
 class Address:
     province: Optional[str] = None
     city: Optional[str] = None
@@ -9,7 +66,7 @@ class Address:
     number: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class SupplierStats:
     totalProducts: int = 0
     avgRating: float = 0
@@ -17,8 +74,8 @@ class SupplierStats:
     totalFavorites: int = 0
 
 
-@dataclass
-class Product:
+@dataclass(slots=True)
+class Product(FirestoreModel):
     name: str
     description: str
     price: float
@@ -28,4 +85,32 @@ class Product:
     rating: float = 0
     reviewCount: int = 0
     favoritesCount: int = 0
-    isActive: bool = True
\ No newline at end of file
+    isActive: bool = True
+
+    PROJECTION = ('name', 'price', 'supplierId', 'isActive')
+    # Un documento sin isActive se trata como inactivo, igual que antes.
+    DECODE_DEFAULTS = {'price': 0, 'isActive': False}
+    # Copia compacta que se guarda en cada favorito (productSnapshot).
+    SNAPSHOT = ('name', 'price', 'isActive')
+
+
+@dataclass(slots=True)
+class Favorite(FirestoreModel):
+    resellerId: str = ''
+    productId: str = ''
+    markupType: str = 'default'
+    markupValue: float = 0
+    # None si el favorito todavia no tiene la copia del producto.
+    productSnapshot: Optional[Product] = None
+    productSnapshotAt: Optional[datetime] = None
+
+    PROJECTION = ('resellerId', 'productId', 'markupType', 'markupValue', 'productSnapshot', 'productSnapshotAt')
+    NESTED = {'productSnapshot': Product}
+
+
+@dataclass(slots=True)
+class Reseller(FirestoreModel):
+    markupType: str = 'percentage'
+    defaultMarkupValue: float = 0
+
+    PROJECTION = ('markupType', 'defaultMarkupValue')
@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 
 class RegisterResellerSerializer(serializers.Serializer):
@@ -62,4 +63,9 @@ class ProductSerializer(serializers.Serializer):
 
 class ReactivateAccountSerializer(serializers.Serializer):
     email = serializers.EmailField(required=True)
-    password = serializers.CharField(required=True, min_length=8)
\ No newline at end of file
+    password = serializers.CharField(required=True, min_length=8)
+
+class CatalogQuerySerializer(serializers.Serializer):
+    page_size = serializers.IntegerField(required=False, min_value=1, max_value=settings.CATALOG_MAX_PAGE_SIZE)
+    page_token = serializers.CharField(required=False)
+    stream = serializers.BooleanField(required=False, default=False)
\ No newline at end of file
@@ -1,12 +1,32 @@
+import asyncio
+import hashlib
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Dict, Tuple
 
-import bcrypt
 import jwt
-from firebase_admin import firestore
+from django.conf import settings
 
-from api.utils.firebase_config import db
+from api.utils.background import background_queue, notification_writer
+from api.utils.firebase_config import async_db, db, firestore
+from api.utils.lru_cache import LRUCache
+from api.utils.password_hasher import HasherBusyError, password_hasher
+
+_MISS = object()
+
+_PROFILE_COLLECTIONS = {'reseller': 'resellers', 'supplier': 'suppliers'}
+
+async def _none():
+    return None
+
+def refresh_token_id(refresh_token: str) -> str:
+    return hashlib.sha256(refresh_token.encode()).hexdigest()
+
+def email_key(email: str) -> str:
+    # Id de documento en userEmails. El email va tal cual, sin pasarlo a
+    # minusculas: la unicidad distingue mayusculas igual que la consulta por
+    # email. Solo se escapan '%' y '/', que los ids de Firestore no admiten.
+    return email.replace('%', '%25').replace('/', '%2F')
 
 def _parse_expires(value: str, default: timedelta) -> timedelta:
     if not value:
@@ -30,9 +50,19 @@ class AuthService:
         self.jwt_algorithm = os.getenv('JWT_ALGORITHM', 'HS256')
         self.access_expires = _parse_expires(os.getenv('JWT_EXPIRES_IN'), timedelta(hours=1))
         self.refresh_expires = _parse_expires(os.getenv('JWT_REFRESH_EXPIRES_IN'), timedelta(days=7))
-
-    def _generate_tokens(self, user_id: str, email: str, user_type: str) -> Tuple[str, str]:
-        now = datetime.utcnow()
+        # email -> userId (None si no existe). Solo se cachea el id: los datos
+        # del usuario se leen siempre con un get directo al documento. Un email
+        # que no existe se recuerda solo EMAIL_CACHE_NEGATIVE_TTL segundos, lo
+        # que puede tardar en entrar alguien que se registro en otro worker o
+        # desde la API de Node; los registros de este worker lo reemplazan.
+        self.email_index = LRUCache(
+            max_entries=getattr(settings, 'EMAIL_CACHE_MAX_ENTRIES', 10000),
+            ttl=getattr(settings, 'EMAIL_CACHE_TTL', 300),
+        )
+        self.email_negative_ttl = getattr(settings, 'EMAIL_CACHE_NEGATIVE_TTL', 5)
+
+    def _encode_tokens(self, user_id: str, email: str, user_type: str) -> Tuple[str, str, Dict]:
+        now = datetime.now(timezone.utc)
         access_payload = {
             'userId': user_id,
             'email': email,
@@ -51,19 +81,107 @@ class AuthService:
         access_token = jwt.encode(access_payload, self.jwt_secret, algorithm=self.jwt_algorithm)
         refresh_token = jwt.encode(refresh_payload, self.jwt_refresh_secret, algorithm=self.jwt_algorithm)
 
-        db.collection('refreshTokens').add({
+        token_data = {
             'userId': user_id,
             'token': refresh_token,
             'isValid': True,
             'createdAt': firestore.SERVER_TIMESTAMP,
             'expiresAt': now + self.refresh_expires,
-        })
+        }
+        return access_token, refresh_token, token_data
+
+    def _generate_tokens(self, user_id: str, email: str, user_type: str, batch=None) -> Tuple[str, str]:
+        access_token, refresh_token, token_data = self._encode_tokens(user_id, email, user_type)
+        token_ref = db.collection('refreshTokens').document(refresh_token_id(refresh_token))
+        if batch is not None:
+            batch.set(token_ref, token_data)
+        else:
+            token_ref.set(token_data)
 
         return access_token, refresh_token
 
-    def _find_user_by_email(self, email: str):
+    def _commit_registration(self, batch, email: str, user_id: str) -> None:
+        from google.api_core.exceptions import AlreadyExists
+
+        # userEmails/{email} se crea en el mismo batch: si otro registro ya lo
+        # tomo, create() falla y no se escribe ninguno de los documentos. Solo
+        # cubre los registros de esta API (la de Node no escribe userEmails):
+        # contra esos y contra las cuentas anteriores sigue valiendo la
+        # consulta por email que se hace antes de registrar.
+        batch.create(db.collection('userEmails').document(email_key(email)), {
+            'userId': user_id,
+            'email': email,
+            'createdAt': firestore.SERVER_TIMESTAMP,
+        })
+        self.email_index.delete(email)
+        try:
+            batch.commit()
+        except AlreadyExists:
+            raise ValueError('El email ya esta registrado')
+        self._remember_email(email, user_id)
+
+    def _schedule_rehash(self, user_doc, password: str) -> None:
+        # El hash guardado usa otro costo: se actualiza con el costo actual,
+        # en segundo plano para que el login no espere otro bcrypt. Es un solo
+        # intento, asi el password no queda en la cola esperando reintentos;
+        # si falla se vuelve a intentar en el proximo login.
+        background_queue.submit('rehash_password', self._rehash_password,
+                                user_doc.id, user_doc.update_time, password, retry=False)
+
+    def _rehash_password(self, user_id: str, update_time, password: str) -> None:
+        from google.api_core.exceptions import FailedPrecondition
+
+        try:
+            hashed = password_hasher.hash(password)
+        except HasherBusyError:
+            return
+        # Solo si el usuario no cambio desde el login: un reset de password
+        # que llegue antes no se pisa con el hash del password anterior.
+        try:
+            db.collection('users').document(user_id).update({
+                'password': hashed,
+                'updatedAt': firestore.SERVER_TIMESTAMP,
+            }, option=db.write_option(last_update_time=update_time))
+        except FailedPrecondition:
+            pass
+
+    def _find_user_by_email(self, email: str, trust_misses: bool = True):
+        # El registro pasa trust_misses=False: un "no existe" cacheado no
+        # alcanza para dar de alta el email.
+        user_id = self.email_index.get(email, _MISS)
+        if user_id is None and trust_misses:
+            return None
+        if user_id is not _MISS and user_id is not None:
+            user_doc = db.collection('users').document(user_id).get()
+            if user_doc.exists and user_doc.to_dict().get('email') == email:
+                return user_doc
+            self.email_index.delete(email)
+
         snap = db.collection('users').where('email', '==', email).get()
-        return snap[0] if snap else None
+        user_doc = snap[0] if snap else None
+        self._remember_email(email, user_doc.id if user_doc else None)
+        return user_doc
+
+    async def _afind_user_by_email(self, email: str):
+        user_id = self.email_index.get(email, _MISS)
+        if user_id is None:
+            return None
+        if user_id is not _MISS:
+            user_doc = await async_db.collection('users').document(user_id).get()
+            if user_doc.exists and user_doc.to_dict().get('email') == email:
+                return user_doc
+            self.email_index.delete(email)
+
+        snap = await async_db.collection('users').where('email', '==', email).get()
+        user_doc = snap[0] if snap else None
+        self._remember_email(email, user_doc.id if user_doc else None)
+        return user_doc
+
+    def _remember_email(self, email: str, user_id) -> None:
+        if user_id is None:
+            self.email_index.set(email, None, ttl=self.email_negative_ttl)
+        else:
+            self.email_index.set(email, user_id)
 
     def register_reseller(self, payload: Dict) -> Dict:
         email = payload.get('email')
@@ -73,12 +191,16 @@ class AuthService:
         phone = payload.get('phone', '')
         website = payload.get('website', '')
 
-        if self._find_user_by_email(email):
+        if self._find_user_by_email(email, trust_misses=False):
             raise ValueError('El email ya esta registrado')
 
-        hashed_password = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+        hashed_password = password_hasher.hash(password)
+
+        user_ref = db.collection('users').document()
+        user_id = user_ref.id
+        batch = db.batch()
 
-        user_doc = db.collection('users').add({
+        batch.set(user_ref, {
             'email': email,
             'password': hashed_password,
             'firstName': first_name,
@@ -90,11 +212,9 @@ class AuthService:
             'isActive': True,
             'createdAt': firestore.SERVER_TIMESTAMP,
             'updatedAt': firestore.SERVER_TIMESTAMP,
-        })[1]
-
-        user_id = user_doc.id
+        })
 
-        db.collection('resellers').document(user_id).set({
+        batch.set(db.collection('resellers').document(user_id), {
             'userId': user_id,
             'markupType': 'percentage',
             'defaultMarkupValue': 0,
@@ -110,7 +230,12 @@ class AuthService:
             'updatedAt': firestore.SERVER_TIMESTAMP,
         })
 
-        db.collection('notifications').add({
+        access_token, refresh_token = self._generate_tokens(user_id, email, 'reseller', batch)
+        self._commit_registration(batch, email, user_id)
+
+        # La respuesta no depende de la notificacion: se escribe en segundo
+        # plano, y solo si el registro se commiteo.
+        notification_writer.add({
             'userId': user_id,
             'type': 'welcome',
             'message': 'Bienvenido a TangoShop, explora productos y crea tu catalogo.',
@@ -119,8 +244,6 @@ class AuthService:
             'createdAt': firestore.SERVER_TIMESTAMP,
         })
 
-        access_token, refresh_token = self._generate_tokens(user_id, email, 'reseller')
-
         return {
             'token': access_token,
             'refreshToken': refresh_token,
@@ -143,12 +266,16 @@ class AuthService:
         website = payload.get('website', '')
         address = payload.get('address', {})
 
-        if self._find_user_by_email(email):
+        if self._find_user_by_email(email, trust_misses=False):
             raise ValueError('El email ya esta registrado')
 
-        hashed_password = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+        hashed_password = password_hasher.hash(password)
+
+        user_ref = db.collection('users').document()
+        user_id = user_ref.id
+        batch = db.batch()
 
-        user_doc = db.collection('users').add({
+        batch.set(user_ref, {
             'email': email,
             'password': hashed_password,
             'firstName': company_name,
@@ -160,11 +287,9 @@ class AuthService:
             'isActive': True,
             'createdAt': firestore.SERVER_TIMESTAMP,
             'updatedAt': firestore.SERVER_TIMESTAMP,
-        })[1]
-
-        user_id = user_doc.id
+        })
 
-        db.collection('suppliers').document(user_id).set({
+        batch.set(db.collection('suppliers').document(user_id), {
             'userId': user_id,
             'companyName': company_name,
             'address': {
@@ -183,7 +308,10 @@ class AuthService:
             'updatedAt': firestore.SERVER_TIMESTAMP,
         })
 
-        db.collection('notifications').add({
+        access_token, refresh_token = self._generate_tokens(user_id, email, 'supplier', batch)
+        self._commit_registration(batch, email, user_id)
+
+        notification_writer.add({
             'userId': user_id,
             'type': 'welcome',
             'message': 'Bienvenido a TangoShopm comienza a gestionar tus productos.',
@@ -192,8 +320,6 @@ class AuthService:
             'createdAt': firestore.SERVER_TIMESTAMP,
         })
 
-        access_token, refresh_token = self._generate_tokens(user_id, email, 'supplier')
-
         return {
             'token': access_token,
             'refreshToken': refresh_token,
@@ -213,30 +339,63 @@ class AuthService:
         password = credentials.get('password')
 
         user_doc = self._find_user_by_email(email)
-        if not user_doc:
-            raise ValueError('Credenciales invalidas')
-
-        user_data = user_doc.to_dict()
+        user_data = self._active_user_data(user_doc)
         user_id = user_doc.id
 
-        if not user_data.get('isActive', True):
-            raise ValueError('Cuenta desactivada')
-
-        if not bcrypt.checkpw(password.encode(), user_data['password'].encode()):
+        if not password_hasher.check(password, user_data['password']):
             raise ValueError('Credenciales invalidas')
 
+        if password_hasher.needs_rehash(user_data['password']):
+            self._schedule_rehash(user_doc, password)
+
         access_token, refresh_token = self._generate_tokens(user_id, user_data['email'], user_data['userType'])
 
         additional_data = {}
-        if user_data['userType'] == 'reseller':
-            reseller_doc = db.collection('resellers').document(user_id).get()
-            if reseller_doc.exists:
-                additional_data = reseller_doc.to_dict()
-        elif user_data['userType'] == 'supplier':
-            supplier_doc = db.collection('suppliers').document(user_id).get()
-            if supplier_doc.exists:
-                additional_data = supplier_doc.to_dict()
+        profile_collection = _PROFILE_COLLECTIONS.get(user_data['userType'])
+        if profile_collection:
+            profile_doc = db.collection(profile_collection).document(user_id).get()
+            if profile_doc.exists:
+                additional_data = profile_doc.to_dict()
+
+        return self._login_result(user_id, user_data, access_token, refresh_token, additional_data)
+
+    async def alogin(self, credentials: Dict) -> Dict:
+        email = credentials.get('email')
+        password = credentials.get('password')
+
+        user_doc = await self._afind_user_by_email(email)
+        user_data = self._active_user_data(user_doc)
+        user_id = user_doc.id
+
+        # El perfil se lee mientras bcrypt verifica el password.
+        profile_collection = _PROFILE_COLLECTIONS.get(user_data['userType'])
+        valid, profile_doc = await asyncio.gather(
+            password_hasher.acheck(password, user_data['password']),
+            async_db.collection(profile_collection).document(user_id).get() if profile_collection else _none(),
+        )
+        if not valid:
+            raise ValueError('Credenciales invalidas')
+
+        if password_hasher.needs_rehash(user_data['password']):
+            self._schedule_rehash(user_doc, password)
+
+        access_token, refresh_token, token_data = self._encode_tokens(user_id, user_data['email'], user_data['userType'])
+        await async_db.collection('refreshTokens').document(refresh_token_id(refresh_token)).set(token_data)
+
+        additional_data = profile_doc.to_dict() if profile_doc is not None and profile_doc.exists else {}
+        return self._login_result(user_id, user_data, access_token, refresh_token, additional_data)
 
+    def _active_user_data(self, user_doc) -> Dict:
+        if not user_doc:
+            raise ValueError('Credenciales invalidas')
+
+        user_data = user_doc.to_dict()
+        if not user_data.get('isActive', True):
+            raise ValueError('Cuenta desactivada')
+        return user_data
+
+    def _login_result(self, user_id: str, user_data: Dict, access_token: str, refresh_token: str,
+                      additional_data: Dict) -> Dict:
         return {
             'token': access_token,
             'refreshToken': refresh_token,
@@ -253,20 +412,33 @@ class AuthService:
             },
         }
 
-    def logout(self, user_id: str, refresh_token: str):
-        snap = db.collection('refreshTokens') \
-            .where('userId', '==', user_id) \
-            .where('token', '==', refresh_token) \
-            .where('isValid', '==', True) \
-            .get()
+    def _invalidate_refresh_token(self, token_doc) -> None:
+        # snapshot.reference es la referencia del cliente de Firestore, sin
+        # los proxies de metricas y cache: se escribe desde db.
+        db.collection('refreshTokens').document(token_doc.id).update({'isValid': False})
+
+    def _get_refresh_token_doc(self, refresh_token: str):
+        token_doc = db.collection('refreshTokens').document(refresh_token_id(refresh_token)).get()
+        if token_doc.exists:
+            return token_doc
+
+        # Tokens emitidos antes de migrar (o por la API Node) tienen id automatico.
+        if getattr(settings, 'REFRESH_TOKEN_LEGACY_LOOKUP', True):
+            snap = db.collection('refreshTokens') \
+                .where('token', '==', refresh_token) \
+                .where('isValid', '==', True) \
+                .get()
+            if snap:
+                return snap[0]
+        return None
 
-        if not snap:
+    def logout(self, user_id: str, refresh_token: str):
+        token_doc = self._get_refresh_token_doc(refresh_token)
+        token_data = token_doc.to_dict() if token_doc is not None else {}
+        if token_data.get('userId') != user_id or not token_data.get('isValid'):
             raise ValueError('Token no encontrado')
 
-        batch = db.batch()
-        for doc in snap:
-            batch.update(doc.reference, {'isValid': False})
-        batch.commit()
+        self._invalidate_refresh_token(token_doc)
         return {'message': 'Logout exitoso'}
 
     def refresh_token(self, refresh_token: str) -> Dict:
@@ -275,23 +447,18 @@ class AuthService:
         except jwt.PyJWTError:
             raise ValueError('Refresh token invalido o expirado')
 
-        snap = db.collection('refreshTokens') \
-            .where('token', '==', refresh_token) \
-            .where('isValid', '==', True) \
-            .get()
-
-        if not snap:
+        token_doc = self._get_refresh_token_doc(refresh_token)
+        token_data = token_doc.to_dict() if token_doc is not None else {}
+        if not token_data.get('isValid'):
             raise ValueError('Refresh token no valido')
 
-        token_doc = snap[0]
-        token_data = token_doc.to_dict()
         exp_value = token_data.get('expiresAt')
         exp_dt = exp_value.to_datetime() if hasattr(exp_value, 'to_datetime') else exp_value
-        if exp_dt and exp_dt < datetime.utcnow():
-            token_doc.reference.update({'isValid': False})
+        if exp_dt and exp_dt < datetime.now(timezone.utc):
+            self._invalidate_refresh_token(token_doc)
             raise ValueError('Refresh token expirado')
 
-        token_doc.reference.update({'isValid': False})
+        self._invalidate_refresh_token(token_doc)
 
         access_token, new_refresh_token = self._generate_tokens(decoded['userId'], decoded['email'], decoded['userType'])
         return {'token': access_token, 'refreshToken': new_refresh_token}
@@ -306,8 +473,8 @@ class AuthService:
             'userId': user_id,
             'email': email,
             'type': 'password-reset',
-            'iat': int(datetime.utcnow().timestamp()),
-            'exp': int((datetime.utcnow() + timedelta(hours=1)).timestamp()),
+            'iat': int(datetime.now(timezone.utc).timestamp()),
+            'exp': int((datetime.now(timezone.utc) + timedelta(hours=1)).timestamp()),
         }
         reset_token = jwt.encode(reset_payload, self.jwt_secret, algorithm=self.jwt_algorithm)
 
@@ -317,7 +484,7 @@ class AuthService:
             'email': email,
             'isUsed': False,
             'createdAt': firestore.SERVER_TIMESTAMP,
-            'expiresAt': datetime.utcnow() + timedelta(hours=1),
+            'expiresAt': datetime.now(timezone.utc) + timedelta(hours=1),
         })
 
         return {'message': 'Si el email existe, recibiras un correo con instrucciones'}
@@ -342,10 +509,10 @@ class AuthService:
         reset_data = reset_doc.to_dict()
         exp_value = reset_data.get('expiresAt')
         exp_dt = exp_value.to_datetime() if hasattr(exp_value, 'to_datetime') else exp_value
-        if exp_dt and exp_dt < datetime.utcnow():
+        if exp_dt and exp_dt < datetime.now(timezone.utc):
             raise ValueError('Token expirado')
 
-        hashed_password = bcrypt.hashpw(new_password.encode(), bcrypt.gensalt()).decode()
+        hashed_password = password_hasher.hash(new_password)
 
         user_snap = db.collection('users').document(decoded['userId']).get()
         if not user_snap.exists:
@@ -356,7 +523,7 @@ class AuthService:
             'updatedAt': firestore.SERVER_TIMESTAMP,
         })
 
-        reset_doc.reference.update({'isUsed': True})
+        db.collection('passwordResets').document(reset_doc.id).update({'isUsed': True})
 
         tokens_snap = db.collection('refreshTokens') \
             .where('userId', '==', decoded['userId']) \
@@ -364,7 +531,7 @@ class AuthService:
             .get()
         batch = db.batch()
         for doc in tokens_snap:
-            batch.update(doc.reference, {'isValid': False})
+            batch.update(db.collection('refreshTokens').document(doc.id), {'isValid': False})
         batch.commit()
 
         return {'message': 'Contraseña restablecida exitosamente'}
@@ -380,7 +547,7 @@ class AuthService:
         if user_data.get('userType') != 'reseller':
             raise ValueError('Solo los revendedores pueden reactivar su cuenta')
 
-        if not bcrypt.checkpw(password.encode(), user_data['password'].encode()):
+        if not password_hasher.check(password, user_data['password']):
             raise ValueError('Credenciales invalidas')
 
         if user_data.get('isActive', True):
@@ -391,7 +558,7 @@ class AuthService:
             'updatedAt': firestore.SERVER_TIMESTAMP,
         })
 
-        db.collection('notifications').add({
+        notification_writer.add({
             'userId': user_id,
             'type': 'account_reactivated',
             'title': 'Cuenta reactivada',
@@ -0,0 +1,244 @@
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from django.conf import settings
+
+from api.models import Favorite, Product, Reseller
+from api.services.product_snapshot_service import snapshot_expiry, usable_snapshot, use_product_snapshots
+from api.utils.conditional import ContentVersion, version_part
+from api.utils.lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Limite de Firestore para valores en un filtro 'in'.
+_IN_FILTER_LIMIT = 30
+
+# unsubscribe() no puede llamarse desde el hilo del propio listener: los
+# listeners desalojados se cierran en este hilo.
+_closer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='catalog-cache-close')
+
+
+class CatalogEntry:
+    def __init__(self, reseller_id: str, reseller_data: Reseller, favorites: List[Favorite],
+                 products: Dict[str, Optional[Product]], versions: Dict) -> None:
+        self.reseller_id = reseller_id
+        self.reseller_data = reseller_data
+        self.favorites = favorites
+        self.products = products
+        # path -> update_time de los documentos leidos para esta entrada.
+        self.versions = versions
+        self.catalog: Optional[Dict] = None
+        self.watches: List = []
+        self.listeners = 2 + math.ceil(len(products) / _IN_FILTER_LIMIT)
+        ttl = getattr(settings, 'CATALOG_CACHE_TTL', 600)
+        self.stale_at = time.time() + ttl if ttl > 0 else math.inf
+        self.expires_at = min(self.stale_at, _snapshots_expiry(favorites, products))
+
+    def watching(self) -> bool:
+        # Si un stream se corta por error, Firestore cierra el listener sin
+        # avisar al callback: la entrada ya no se mantiene al dia.
+        return all(getattr(watch, 'is_active', True) for watch in self.watches)
+
+
+def _snapshots_expiry(favorites: List[Favorite], products: Dict) -> float:
+    # La entrada vale hasta que vence la copia mas vieja que usa.
+    if not use_product_snapshots():
+        return math.inf
+    expiries = (snapshot_expiry(fav) for fav in favorites if fav.productId not in products)
+    return min((expiry for expiry in expiries if expiry is not None), default=math.inf)
+
+
+class CatalogCache:
+    # Catalogo materializado por revendedor. Los listeners on_snapshot sobre
+    # el revendedor, sus favoritos y los productos leidos (los de favoritos
+    # sin productSnapshot utilizable) mantienen la entrada al dia: los cambios
+    # de productos, copias y markup se aplican en memoria, y un favorito nuevo
+    # cuyo producto no se leyo la invalida. Una entrada armada con copias
+    # vence junto con la copia mas vieja, y ninguna vive mas de
+    # CATALOG_CACHE_TTL. Los listeners abiertos no pasan de
+    # CATALOG_CACHE_MAX_LISTENERS: al llegar al tope se desalojan las entradas
+    # menos usadas.
+    def __init__(self, builder: Callable[[Reseller, List[Favorite], Dict], Dict]) -> None:
+        self.builder = builder
+        self.invalidations = 0
+        self.patches = 0
+        self.listeners = 0
+        self._lock = threading.RLock()
+        self._entries: Optional[LRUCache] = None
+
+    @property
+    def enabled(self) -> bool:
+        return getattr(settings, 'CATALOG_CACHE_ENABLED', True)
+
+    @property
+    def entries(self) -> LRUCache:
+        if self._entries is None:
+            with self._lock:
+                if self._entries is None:
+                    self._entries = LRUCache(
+                        max_entries=getattr(settings, 'CATALOG_CACHE_MAX_RESELLERS', 256),
+                        max_size=getattr(settings, 'CATALOG_CACHE_MAX_ITEMS', 50000),
+                        size_fn=lambda entry: len(entry.favorites) + 1,
+                        on_evict=lambda _key, entry: self._close(entry),
+                    )
+        return self._entries
+
+    def get(self, reseller_id: str, version: Optional[ContentVersion] = None) -> Optional[Dict]:
+        entry = self.entries.get(reseller_id)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.time() or not entry.watching():
+            self.invalidate(reseller_id, entry)
+            return None
+        with self._lock:
+            if version is not None:
+                version.update(entry.versions)
+            return entry.catalog
+
+    def store(self, client, reseller_id: str, reseller_data: Reseller, favorites: List[Favorite],
+              products: Dict[str, Optional[Product]], versions: Optional[Dict] = None) -> Dict:
+        entry = CatalogEntry(reseller_id, reseller_data, favorites, products, dict(versions or {}))
+        entry.catalog = self.builder(reseller_data, favorites, products)
+
+        max_listeners = getattr(settings, 'CATALOG_CACHE_MAX_LISTENERS', 100)
+        if entry.listeners > max_listeners or not self.entries.set(reseller_id, entry):
+            return entry.catalog
+        with self._lock:
+            self.listeners += entry.listeners
+        while self.listeners > max_listeners and self.entries.evict_oldest():
+            pass
+
+        try:
+            self._watch(client, entry)
+        except Exception:
+            logger.exception('No se pudieron registrar listeners del catalogo %s', reseller_id)
+            self.invalidate(reseller_id)
+        return entry.catalog
+
+    def invalidate(self, reseller_id: str, entry: Optional[CatalogEntry] = None) -> None:
+        with self._lock:
+            current = self.entries.get(reseller_id, count=False)
+            if current is None or (entry is not None and current is not entry):
+                return
+            self.entries.delete(reseller_id)
+            self.invalidations += 1
+        self._close(current)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.entries.clear()
+            self.invalidations = 0
+            self.patches = 0
+            self.listeners = 0
+
+    def stats(self) -> Dict:
+        stats = self.entries.stats()
+        stats.update({'invalidations': self.invalidations, 'patches': self.patches, 'listeners': self.listeners})
+        return stats
+
+    def _watch(self, client, entry: CatalogEntry) -> None:
+        from google.cloud.firestore_v1.field_path import FieldPath
+
+        reseller_id = entry.reseller_id
+
+        entry.watches.append(
+            client.collection('resellers').document(reseller_id)
+            .on_snapshot(lambda docs, changes, read_time: self._on_reseller(entry, docs))
+        )
+        entry.watches.append(
+            client.collection('favorites')
+            .where('resellerId', '==', reseller_id)
+            .where('isActive', '==', True)
+            .on_snapshot(lambda docs, changes, read_time: self._on_favorites(entry, docs))
+        )
+
+        products = client.collection('products')
+        product_ids = list(entry.products)
+        for start in range(0, len(product_ids), _IN_FILTER_LIMIT):
+            chunk = product_ids[start:start + _IN_FILTER_LIMIT]
+            refs = [products.document(product_id) for product_id in chunk]
+            entry.watches.append(
+                products.where(FieldPath.document_id(), 'in', refs)
+                .on_snapshot(lambda docs, changes, read_time, chunk=chunk: self._on_products(entry, chunk, docs))
+            )
+
+    def _is_current(self, entry: CatalogEntry) -> bool:
+        return self.entries.get(entry.reseller_id, count=False) is entry
+
+    def _rebuild(self, entry: CatalogEntry) -> None:
+        entry.catalog = self.builder(entry.reseller_data, entry.favorites, entry.products)
+        self.patches += 1
+
+    def _on_reseller(self, entry: CatalogEntry, docs: List) -> None:
+        with self._lock:
+            if not self._is_current(entry):
+                return
+            snapshot = docs[0] if docs else None
+            if snapshot is None or not snapshot.exists:
+                self.invalidate(entry.reseller_id, entry)
+                return
+            path, update_time = version_part(snapshot)
+            entry.versions = {**entry.versions, path: update_time}
+            # Los listeners no admiten proyecciones: el documento llega
+            # completo y se decodifica con el mismo modelo que la lectura.
+            reseller_data = Reseller.from_snapshot(snapshot)
+            if reseller_data != entry.reseller_data:
+                entry.reseller_data = reseller_data
+                self._rebuild(entry)
+
+    def _on_favorites(self, entry: CatalogEntry, docs: List) -> None:
+        with self._lock:
+            if not self._is_current(entry):
+                return
+            versions = {path: update_time for path, update_time in entry.versions.items() if not path.startswith('favorites/')}
+            versions.update(version_part(doc) for doc in docs)
+            entry.versions = versions
+            favorites = [Favorite.from_snapshot(doc) for doc in docs]
+            if favorites == entry.favorites:
+                return
+            # Un favorito nuevo sin copia utilizable necesita leer el producto.
+            snapshots, now = use_product_snapshots(), time.time()
+            if any(fav.productId not in entry.products and not (snapshots and usable_snapshot(fav, now))
+                   for fav in favorites):
+                self.invalidate(entry.reseller_id, entry)
+                return
+            entry.favorites = favorites
+            entry.expires_at = min(entry.stale_at, _snapshots_expiry(favorites, entry.products))
+            self._rebuild(entry)
+
+    def _on_products(self, entry: CatalogEntry, chunk: List[str], docs: List) -> None:
+        with self._lock:
+            if not self._is_current(entry):
+                return
+            current = {doc.id: Product.from_snapshot(doc) for doc in docs}
+            versions = dict(entry.versions)
+            versions.update({f'products/{product_id}': None for product_id in chunk})
+            versions.update(version_part(doc) for doc in docs)
+            entry.versions = versions
+            changed = False
+            for product_id in chunk:
+                product_data = current.get(product_id)
+                if entry.products.get(product_id) != product_data:
+                    entry.products[product_id] = product_data
+                    changed = True
+            if changed:
+                self._rebuild(entry)
+
+    def _close(self, entry: CatalogEntry) -> None:
+        with self._lock:
+            watches, entry.watches = entry.watches, []
+            self.listeners -= entry.listeners
+            entry.listeners = 0
+        if watches:
+            _closer.submit(self._unsubscribe, entry.reseller_id, watches)
+
+    def _unsubscribe(self, reseller_id: str, watches: List) -> None:
+        for watch in watches:
+            try:
+                watch.unsubscribe()
+            except Exception:
+                logger.exception('Error al cerrar listener del catalogo %s', reseller_id)
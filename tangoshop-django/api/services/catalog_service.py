@@ -1,68 +1,218 @@
-from api.utils.firebase_config import db
+import asyncio
+import base64
+import json
+import time
+from typing import Dict, Iterator, List, Optional
+
+from asgiref.sync import sync_to_async
+
+from api.models import Favorite, Product, Reseller
+from api.services.catalog_cache import CatalogCache
+from api.services.pricing_service import pricing_service
+from api.services.product_snapshot_service import usable_snapshot, use_product_snapshots
+from api.utils.conditional import ContentVersion
+from api.utils.firebase_config import async_db, db
+from api.utils.firestore_batch import afetch_documents, fetch_documents
 
 class CatalogService:
-    def get_reseller_catalog(self, reseller_id: str) -> dict:
+    def __init__(self) -> None:
+        self.cache = CatalogCache(self._build_catalog)
 
-        reseller_doc = db.collection('resellers').document(reseller_id).get()
-        if not reseller_doc.exists:
-            raise ValueError('Revendedor no encontrado')
-        
-        reseller_data = reseller_doc.to_dict()
-        default_markup_type = reseller_data.get('markupType', 'percentage')
-        default_markup_value = reseller_data.get('defaultMarkupValue', 0)
+    def get_reseller_catalog(self, reseller_id: str, version: Optional[ContentVersion] = None,
+                             use_cache: bool = True) -> dict:
+        # use_cache=False lee de Firestore sin registrar la entrada ni sus
+        # listeners, para los procesos que recorren todos los revendedores.
+        use_cache = use_cache and self.cache.enabled
+        if use_cache:
+            cached = self.cache.get(reseller_id, version)
+            if cached is not None:
+                return cached
+
+        loaded = ContentVersion()
+        reseller_data = self._get_reseller_data(reseller_id, loaded)
 
         favorites_snap = db.collection('favorites') \
+            .select(Favorite.PROJECTION) \
             .where('resellerId', '==', reseller_id) \
             .where('isActive', '==', True) \
             .get()
 
-        if not favorites_snap:
+        favorites = [Favorite.from_snapshot(fav_doc) for fav_doc in favorites_snap]
+        loaded.add_all(favorites_snap)
+        products = self._load_products(favorites, loaded)
+
+        if version is not None:
+            version.update(loaded.parts)
+        if use_cache:
+            return self.cache.store(db, reseller_id, reseller_data, favorites, products, loaded.parts)
+        return self._build_catalog(reseller_data, favorites, products)
+
+    async def aget_reseller_catalog(self, reseller_id: str, version: Optional[ContentVersion] = None) -> dict:
+        if self.cache.enabled:
+            cached = self.cache.get(reseller_id, version)
+            if cached is not None:
+                return cached
+
+        # El revendedor y sus favoritos no dependen entre si: se leen a la vez.
+        loaded = ContentVersion()
+        reseller_doc, favorites_snap = await asyncio.gather(
+            async_db.collection('resellers').document(reseller_id).get(field_paths=Reseller.PROJECTION),
+            async_db.collection('favorites')
+            .select(Favorite.PROJECTION)
+            .where('resellerId', '==', reseller_id)
+            .where('isActive', '==', True)
+            .get(),
+        )
+        if not reseller_doc.exists:
+            raise ValueError('Revendedor no encontrado')
+        reseller_data = Reseller.from_snapshot(reseller_doc)
+        loaded.add(reseller_doc)
+
+        favorites = [Favorite.from_snapshot(fav_doc) for fav_doc in favorites_snap]
+        loaded.add_all(favorites_snap)
+        product_docs = await afetch_documents(async_db, 'products', self._products_to_load(favorites),
+                                              field_paths=Product.PROJECTION)
+        loaded.add_all(product_docs.values())
+        products = self._products_from(product_docs)
+
+        if version is not None:
+            version.update(loaded.parts)
+        if self.cache.enabled:
+            # Los listeners del cache usan el cliente sincronico.
+            return await sync_to_async(self.cache.store)(db, reseller_id, reseller_data, favorites, products, loaded.parts)
+        return self._build_catalog(reseller_data, favorites, products)
+
+    def get_reseller_catalog_page(self, reseller_id: str, page_size: int, page_token: Optional[str] = None) -> dict:
+        reseller_data = self._get_reseller_data(reseller_id)
+        after = self._decode_page_token(reseller_id, page_token) if page_token else None
+        products_list, last_favorite_id = self._read_page(reseller_id, reseller_data, page_size, after)
+
+        # Una pagina no conoce el total del catalogo (saberlo obliga a leerlo
+        # entero): en lugar de totalProducts trae pageCount, los productos de
+        # esta pagina.
+        return {
+            'pageSize': page_size,
+            'pageCount': len(products_list),
+            'products': products_list,
+            'nextPageToken': self._encode_page_token(reseller_id, last_favorite_id) if last_favorite_id else None
+        }
+
+    def iter_reseller_catalog(self, reseller_id: str, batch_size: int) -> Iterator[List[Dict]]:
+        # El revendedor se valida antes de devolver el generador para que el
+        # error llegue antes de empezar a responder.
+        reseller_data = self._get_reseller_data(reseller_id)
+
+        def batches():
+            after = None
+            while True:
+                products_list, after = self._read_page(reseller_id, reseller_data, batch_size, after)
+                if products_list:
+                    yield products_list
+                if after is None:
+                    return
+
+        return batches()
+
+    def _get_reseller_data(self, reseller_id: str, version: Optional[ContentVersion] = None) -> Reseller:
+        reseller_doc = db.collection('resellers').document(reseller_id).get(field_paths=Reseller.PROJECTION)
+        if not reseller_doc.exists:
+            raise ValueError('Revendedor no encontrado')
+        if version is not None:
+            version.add(reseller_doc)
+        return Reseller.from_snapshot(reseller_doc)
+
+    def _products_to_load(self, favorites: List[Favorite]) -> List[str]:
+        # Los favoritos con productSnapshot no necesitan leer el producto;
+        # solo se leen los que no lo tienen o lo tienen vencido.
+        if not use_product_snapshots():
+            return [fav.productId for fav in favorites]
+        now = time.time()
+        return [fav.productId for fav in favorites if not usable_snapshot(fav, now)]
+
+    def _load_products(self, favorites: List[Favorite], version: Optional[ContentVersion] = None) -> Dict:
+        product_docs = fetch_documents(db, 'products', self._products_to_load(favorites),
+                                       field_paths=Product.PROJECTION)
+        if version is not None:
+            version.add_all(product_docs.values())
+        return self._products_from(product_docs)
+
+    def _products_from(self, product_docs: Dict) -> Dict[str, Optional[Product]]:
+        return {product_id: Product.from_snapshot(snap) for product_id, snap in product_docs.items()}
+
+    def _read_page(self, reseller_id: str, reseller_data: Reseller, page_size: int, after: Optional[str]):
+        from google.cloud.firestore_v1.field_path import FieldPath
+
+        query = db.collection('favorites') \
+            .select(Favorite.PROJECTION) \
+            .where('resellerId', '==', reseller_id) \
+            .where('isActive', '==', True) \
+            .order_by(FieldPath.document_id())
+        if after:
+            query = query.start_after({FieldPath.document_id(): after})
+
+        favorites_snap = query.limit(page_size).get()
+        favorites = [Favorite.from_snapshot(fav_doc) for fav_doc in favorites_snap]
+        catalog = self._build_catalog(reseller_data, favorites, self._load_products(favorites))
+
+        last_favorite_id = favorites_snap[-1].id if len(favorites_snap) == page_size else None
+        return catalog['products'], last_favorite_id
+
+    def _encode_page_token(self, reseller_id: str, last_favorite_id: str) -> str:
+        payload = json.dumps({'r': reseller_id, 'a': last_favorite_id}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def _decode_page_token(self, reseller_id: str, page_token: str) -> str:
+        try:
+            padded = page_token + '=' * (-len(page_token) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            last_favorite_id = payload['a']
+        except (ValueError, TypeError, KeyError):
+            raise ValueError('Token de pagina invalido')
+        if payload.get('r') != reseller_id or not isinstance(last_favorite_id, str):
+            raise ValueError('Token de pagina invalido')
+        return last_favorite_id
+
+    def _build_catalog(self, reseller_data: Reseller, favorites: List[Favorite], products: Dict) -> dict:
+        rows = []
+        for fav_data in favorites:
+            product_id = fav_data.productId
+            # Un producto leido (o actualizado por un listener) tiene
+            # prioridad sobre la copia del favorito.
+            product_data = products[product_id] if product_id in products else fav_data.productSnapshot
+            if product_data is not None and product_data.isActive:
+                rows.append((product_id, product_data, fav_data))
+
+        if not rows:
             return {
                 'totalProducts': 0,
                 'products': []
             }
 
-        products_list = []
-        
-        for fav_doc in favorites_snap:
-            fav_data = fav_doc.to_dict()
-            product_id = fav_data.get('productId')
-            
-            product_doc = db.collection('products').document(product_id).get()
-            if not product_doc.exists or not product_doc.to_dict().get('isActive'):
-                continue
-            
-            product_data = product_doc.to_dict()
-            base_price = product_data.get('price', 0)
-            
-            markup_type = fav_data.get('markupType', 'default')
-            markup_value = fav_data.get('markupValue', 0)
-            
-            if markup_type == 'default':
-                markup_type = default_markup_type
-                markup_value = default_markup_value
-
-            if markup_type == 'fixed':
-                final_price = base_price + markup_value
-            elif markup_type == 'percentage':
-                final_price = base_price * (1 + markup_value / 100)
-            else:
-                final_price = base_price
-            
-            final_price = round(final_price, 2)
-            
-            products_list.append({
+        pricing = pricing_service.apply_markups(
+            [product_data.price for _, product_data, _ in rows],
+            [fav_data.markupType for _, _, fav_data in rows],
+            [fav_data.markupValue for _, _, fav_data in rows],
+            reseller_data.markupType,
+            reseller_data.defaultMarkupValue,
+        )
+        final_prices = pricing.rounded_final_prices()
+
+        products_list = [
+            {
                 'productId': product_id,
-                'name': product_data.get('name'),
-                'basePrice': base_price,
+                'name': product_data.name,
+                'basePrice': product_data.price,
                 'markupType': markup_type,
                 'markupValue': markup_value,
                 'finalPrice': final_price
-            })
+            }
+            for (product_id, product_data, _), markup_type, markup_value, final_price
+            in zip(rows, pricing.markup_types, pricing.markup_values, final_prices)
+        ]
 
         return {
             'totalProducts': len(products_list),
             'products': products_list
         }
 
-catalog_service = CatalogService()
\ No newline at end of file
+catalog_service = CatalogService()
@@ -0,0 +1,111 @@
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+
+MARKUP_DEFAULT = 'default'
+MARKUP_FIXED = 'fixed'
+MARKUP_PERCENTAGE = 'percentage'
+
+
+class PricingResult:
+    def __init__(self, final_prices, percentage_increases, markup_types, markup_values, integral) -> None:
+        self.final_prices = final_prices
+        self.percentage_increases = percentage_increases
+        self.markup_types = markup_types
+        self.markup_values = markup_values
+        # Filas cuyo precio final se calculaba solo con enteros (precio base
+        # entero y markup fijo entero, o sin markup): esas siguen saliendo
+        # como int.
+        self.integral = integral
+
+    def __len__(self) -> int:
+        return len(self.final_prices)
+
+    def rounded_final_prices(self, selected: Optional[np.ndarray] = None) -> List:
+        final_prices = self.final_prices if selected is None else self.final_prices[selected]
+        integral = self.integral if selected is None else self.integral[selected]
+        prices = round2(final_prices)
+        for index in np.flatnonzero(integral).tolist():
+            prices[index] = int(prices[index])
+        return prices
+
+
+# Constante de Dekker para partir un double en dos mitades de 26 bits.
+_SPLIT = 134217729.0
+# Desde aca x * 100 ya no tiene decimales que redondear en un double.
+_EXACT_LIMIT = 2.0 ** 52 / 100
+
+
+def round2(values: np.ndarray) -> List[float]:
+    # Mismo resultado que round(x, 2) para cada valor. np.round redondea
+    # x * 100 ya redondeado, y falla cuando ese producto cae justo en .5 (ej.
+    # 2.675 * 100 da 267.5 pero 2.675 es 2.67499999...). Aca se calcula
+    # tambien el error exacto del producto (Dekker) y con el se decide el
+    # desempate.
+    values = np.asarray(values, dtype=np.float64)
+    with np.errstate(invalid='ignore', over='ignore'):
+        scaled = values * 100
+        split = _SPLIT * values
+        high = split - (split - values)
+        low = values - high
+        error = (high * 100 - scaled) + low * 100
+        nearest = np.rint(scaled)
+        half = scaled - nearest
+        nearest = np.where((half == 0.5) & (error > 0), nearest + 1, nearest)
+        nearest = np.where((half == -0.5) & (error < 0), nearest - 1, nearest)
+        rounded = (nearest / 100).tolist()
+    # Valores enormes, infinitos o NaN: los resuelve round().
+    for index in np.flatnonzero(~(np.abs(values) < _EXACT_LIMIT)).tolist():
+        rounded[index] = round(float(values[index]), 2)
+    return rounded
+
+
+def _is_int(values, size: int) -> np.ndarray:
+    return np.fromiter((type(value) is int for value in values), dtype=bool, count=size)
+
+
+def _column(values, size: int, dtype) -> np.ndarray:
+    array = np.asarray(values, dtype=dtype)
+    if array.ndim == 0:
+        return np.full(size, array.item(), dtype=dtype)
+    return array
+
+
+class PricingService:
+    def apply_markups(
+        self,
+        base_prices: Sequence[float],
+        markup_types: Sequence[str],
+        markup_values: Sequence[float],
+        default_types: Union[str, Sequence[str]],
+        default_values: Union[float, Sequence[float]],
+    ) -> PricingResult:
+        base = np.asarray(base_prices, dtype=np.float64)
+        size = len(base)
+        types = _column(markup_types, size, object)
+        values = _column(markup_values, size, object)
+
+        use_default = types == MARKUP_DEFAULT
+        resolved_types = np.where(use_default, _column(default_types, size, object), types)
+        resolved_values = np.where(use_default, _column(default_values, size, object), values)
+        fixed = resolved_types == MARKUP_FIXED
+        percentage = resolved_types == MARKUP_PERCENTAGE
+
+        # Solo se convierten los valores que se usan: con otro tipo de markup
+        # el valor se ignora, sea lo que sea.
+        used = fixed | percentage
+        numeric_values = np.zeros(size, dtype=np.float64)
+        numeric_values[used] = resolved_values[used].astype(np.float64)
+
+        final = np.where(fixed, base + numeric_values, np.where(percentage, base * (1 + numeric_values / 100), base))
+        integral = _is_int(base_prices, size) & ((fixed & _is_int(resolved_values, size)) | ~used)
+
+        # Con precio base 0 el aumento porcentual queda en 0 en lugar de fallar.
+        increases = np.zeros(size, dtype=np.float64)
+        np.divide(final - base, base, out=increases, where=base != 0)
+        increases *= 100
+
+        return PricingResult(final, increases, resolved_types, resolved_values, integral)
+
+
+pricing_service = PricingService()
@@ -0,0 +1,139 @@
+import logging
+import math
+import threading
+import time
+from typing import Dict, Optional
+
+from django.conf import settings
+
+from api.models import Favorite, Product
+from api.utils.firebase_config import db, firestore
+from api.utils.firestore_batch import commit_updates
+
+logger = logging.getLogger(__name__)
+
+# Cada favorito guarda en productSnapshot una copia de name, price e isActive
+# de su producto, asi el catalogo sale de una sola consulta de favoritos. Esta
+# clase mantiene esas copias: fan_out reescribe los favoritos de un producto
+# que cambio y watch lo dispara desde un listener sobre products. Los
+# desajustes que queden (por ejemplo cambios mientras el listener no corria)
+# los repara el comando reconcile_product_snapshots.
+#
+# productSnapshotAt es el momento en que la copia se comparo con el producto.
+# Pasado CATALOG_PRODUCT_SNAPSHOT_MAX_AGE la copia deja de usarse y el
+# catalogo vuelve a leer el producto: si el listener se cae, los precios
+# viejos duran a lo sumo ese tiempo. La reconciliacion renueva las marcas.
+
+
+def use_product_snapshots() -> bool:
+    return getattr(settings, 'CATALOG_PRODUCT_SNAPSHOTS', False)
+
+
+def snapshot_max_age() -> float:
+    return getattr(settings, 'CATALOG_PRODUCT_SNAPSHOT_MAX_AGE', 86400)
+
+
+def snapshot_expiry(favorite: Favorite) -> Optional[float]:
+    # Hasta cuando (epoch) se puede usar la copia del favorito; None si no
+    # tiene una copia utilizable.
+    if favorite.productSnapshot is None:
+        return None
+    max_age = snapshot_max_age()
+    if max_age <= 0:
+        return math.inf
+    if favorite.productSnapshotAt is None:
+        return None
+    return favorite.productSnapshotAt.timestamp() + max_age
+
+
+def usable_snapshot(favorite: Favorite, now: Optional[float] = None) -> bool:
+    expiry = snapshot_expiry(favorite)
+    return expiry is not None and expiry > (time.time() if now is None else now)
+
+
+def needs_refresh(favorite_data: Dict, snapshot: Dict) -> bool:
+    # La copia se reescribe si no coincide, o si le queda menos de la mitad
+    # de su vida: asi una reconciliacion diaria la mantiene utilizable.
+    if favorite_data.get('productSnapshot') != snapshot:
+        return True
+    max_age = snapshot_max_age()
+    if max_age <= 0:
+        return False
+    stamp = favorite_data.get('productSnapshotAt')
+    return not hasattr(stamp, 'timestamp') or stamp.timestamp() < time.time() - max_age / 2
+
+
+def snapshot_update(snapshot: Dict) -> Dict:
+    return {'productSnapshot': snapshot, 'productSnapshotAt': firestore.SERVER_TIMESTAMP}
+
+
+def product_snapshot(product_data: Optional[Dict]) -> Dict:
+    # Un producto borrado queda como {}: se decodifica como inactivo.
+    product_data = product_data or {}
+    return {field: product_data[field] for field in Product.SNAPSHOT if field in product_data}
+
+
+class ProductSnapshotService:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._known: Optional[Dict[str, Dict]] = None
+
+    def fan_out(self, product_id: str, product_data: Optional[Dict], client=None) -> int:
+        client = client or db
+        snapshot = product_snapshot(product_data)
+        favorites = client.collection('favorites') \
+            .select(['productSnapshot', 'productSnapshotAt']) \
+            .where('productId', '==', product_id) \
+            .get()
+
+        updates = [
+            (favorite.reference, snapshot_update(snapshot))
+            for favorite in favorites
+            if needs_refresh(favorite.to_dict() or {}, snapshot)
+        ]
+        written = commit_updates(client, updates)
+        if written:
+            logger.info('productSnapshot de %s actualizado en %d favoritos', product_id, written)
+        return written
+
+    def watch(self, client=None):
+        # El primer snapshot del listener es la linea base: no dispara
+        # fan-out (para eso esta la reconciliacion).
+        client = client or db
+        with self._lock:
+            self._known = None
+        return client.collection('products').on_snapshot(
+            lambda docs, changes, read_time: self._on_products(client, docs, changes)
+        )
+
+    def _on_products(self, client, docs, changes) -> None:
+        from google.cloud.firestore_v1.watch import ChangeType
+
+        # Corre en el hilo del listener; los eventos siguientes esperan a que
+        # termine el fan-out, no se pierden. Despues de la linea base solo se
+        # miran los documentos que cambiaron, no la coleccion entera.
+        pending = []
+        with self._lock:
+            if self._known is None:
+                self._known = {doc.id: product_snapshot(doc.to_dict()) for doc in docs}
+                return
+            for change in changes:
+                product_id = change.document.id
+                if change.type == ChangeType.REMOVED:
+                    snapshot = product_snapshot(None)
+                    self._known.pop(product_id, None)
+                else:
+                    snapshot = product_snapshot(change.document.to_dict())
+                    if self._known.get(product_id) == snapshot:
+                        continue
+                    self._known[product_id] = snapshot
+                pending.append((product_id, snapshot))
+
+        for product_id, snapshot in pending:
+            try:
+                self.fan_out(product_id, snapshot, client)
+            except Exception:
+                logger.exception('No se pudo actualizar productSnapshot de %s', product_id)
+
+
+product_snapshot_service = ProductSnapshotService()
@@ -0,0 +1,259 @@
+import gzip
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Hashable, Iterable, Optional, Set
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.urls import reverse
+
+from api.services.catalog_service import catalog_service
+from api.services.product_snapshot_service import product_snapshot, use_product_snapshots
+from api.utils.document_cache import document_cache
+from api.utils.firebase_config import db, firestore
+from api.utils.json_codec import dumps
+
+logger = logging.getLogger(__name__)
+
+# Catalogos publicos precalculados: generate() arma el catalogo con precios de
+# un revendedor y lo escribe en PUBLIC_CATALOG_DIR/<revendedor>/ como
+# <version>.json y <version>.html (mas sus .gz), donde la version es un hash
+# del contenido; el archivo current apunta a la ultima. La vista publica solo
+# lee esos archivos, sin Firestore ni calculo de precios. watch() marca los
+# revendedores cuyos datos cambiaron para que el comando
+# publish_public_catalogs los regenere.
+
+FORMATS = {
+    'json': 'application/json',
+    'html': 'text/html; charset=utf-8',
+}
+
+# Versiones anteriores que se conservan, para quien tenga abierta una pagina
+# que pide la version que ya conoce.
+_KEEP_VERSIONS = 3
+_NAME_FIELDS = ('firstName', 'lastName')
+_ID = re.compile(r'^[A-Za-z0-9_-]{1,128}$')
+_VERSION = re.compile(r'^[0-9a-f]{16}$')
+
+
+def catalog_root() -> Path:
+    return Path(getattr(settings, 'PUBLIC_CATALOG_DIR', '/tmp/tangoshop-catalogs'))
+
+
+def public_url(reseller_id: str) -> str:
+    return reverse('public_catalog', args=[reseller_id])
+
+
+def _write(path: Path, data: bytes) -> None:
+    # Se escribe a un temporal y se renombra: quien lea nunca ve un archivo
+    # a medias.
+    descriptor, temporary = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    try:
+        with os.fdopen(descriptor, 'wb') as output:
+            output.write(data)
+        os.chmod(temporary, 0o644)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def _public_products(catalog: Dict) -> list:
+    # Al publico solo le llega el precio final, no el precio base ni el markup.
+    return [
+        {'productId': product['productId'], 'name': product['name'], 'price': product['finalPrice']}
+        for product in catalog['products']
+    ]
+
+
+class PublicCatalogService:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._dirty: Set[str] = set()
+        self._changed = threading.Event()
+
+    def current_version(self, reseller_id: str) -> Optional[str]:
+        if not _ID.match(reseller_id):
+            return None
+        try:
+            version = (catalog_root() / reseller_id / 'current').read_text().strip()
+        except OSError:
+            return None
+        return version if _VERSION.match(version) else None
+
+    def file_path(self, reseller_id: str, version: str, fmt: str, compressed: bool = False) -> Optional[Path]:
+        if not _ID.match(reseller_id) or not _VERSION.match(version) or fmt not in FORMATS:
+            return None
+        path = catalog_root() / reseller_id / f'{version}.{fmt}{".gz" if compressed else ""}'
+        return path if path.is_file() else None
+
+    def generate(self, reseller_id: str) -> Optional[str]:
+        # Devuelve la version publicada, o None si el catalogo no es publico.
+        if not _ID.match(reseller_id):
+            raise ValueError('Revendedor no encontrado')
+        reseller_ref = db.collection('resellers').document(reseller_id)
+        reseller_doc = reseller_ref.get(field_paths=['catalogSettings'])
+        if not reseller_doc.exists:
+            raise ValueError('Revendedor no encontrado')
+        catalog_settings = (reseller_doc.to_dict() or {}).get('catalogSettings') or {}
+        if not catalog_settings.get('isPublic', False):
+            self.unpublish(reseller_id, catalog_settings)
+            return None
+
+        catalog = catalog_service.get_reseller_catalog(reseller_id, use_cache=False)
+        user_doc = db.collection('users').document(reseller_id).get(field_paths=_NAME_FIELDS)
+        user_data = (user_doc.to_dict() if user_doc.exists else None) or {}
+        products = _public_products(catalog)
+        payload = {
+            'resellerId': reseller_id,
+            'name': ' '.join(filter(None, (user_data.get('firstName'), user_data.get('lastName')))),
+            'totalProducts': len(products),
+            'products': products,
+        }
+        content = dumps(payload)
+        version = hashlib.sha256(content).hexdigest()[:16]
+        url = public_url(reseller_id)
+        if version == self.current_version(reseller_id) and catalog_settings.get('catalogUrl') == url:
+            return version
+
+        directory = catalog_root() / reseller_id
+        directory.mkdir(parents=True, exist_ok=True)
+        html = render_to_string('api/public_catalog.html', {'catalog': payload}).encode()
+        for fmt, data in (('json', content), ('html', html)):
+            _write(directory / f'{version}.{fmt}', data)
+            _write(directory / f'{version}.{fmt}.gz', gzip.compress(data, compresslevel=9, mtime=0))
+        _write(directory / 'current', version.encode())
+        self._prune(directory, version)
+
+        reseller_ref.update({
+            'catalogSettings.lastGenerated': firestore.SERVER_TIMESTAMP,
+            'catalogSettings.catalogUrl': url,
+        })
+        logger.info('Catalogo publico de %s generado (version %s, %d productos)', reseller_id, version, len(products))
+        return version
+
+    def unpublish(self, reseller_id: str, catalog_settings: Optional[Dict] = None) -> None:
+        directory = catalog_root() / reseller_id
+        if directory.exists():
+            # Primero el puntero: desde ahi la vista responde 404.
+            (directory / 'current').unlink(missing_ok=True)
+            shutil.rmtree(directory, ignore_errors=True)
+        if catalog_settings and catalog_settings.get('catalogUrl'):
+            db.collection('resellers').document(reseller_id).update({'catalogSettings.catalogUrl': ''})
+
+    def _prune(self, directory: Path, current: str) -> None:
+        versions = {}
+        for path in directory.iterdir():
+            version = path.name.split('.', 1)[0]
+            if _VERSION.match(version) and version != current:
+                versions[version] = max(versions.get(version, 0), path.stat().st_mtime)
+        stale = sorted(versions, key=versions.get, reverse=True)[_KEEP_VERSIONS:]
+        for path in directory.iterdir():
+            if path.name.split('.', 1)[0] in stale:
+                path.unlink(missing_ok=True)
+
+    def mark_dirty(self, reseller_ids: Iterable[str]) -> None:
+        with self._lock:
+            self._dirty.update(reseller_id for reseller_id in reseller_ids if reseller_id)
+            if self._dirty:
+                self._changed.set()
+
+    def take_dirty(self, settle: float = 0, timeout: Optional[float] = None) -> Set[str]:
+        # Espera el primer cambio y despues settle segundos mas, para juntar
+        # los que llegan seguidos (un producto editado toca muchos favoritos).
+        if not self._changed.wait(timeout):
+            return set()
+        if settle > 0:
+            time.sleep(settle)
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            self._changed.clear()
+        return dirty
+
+    def watch(self, client=None) -> list:
+        # Listeners sobre los datos que entran en un catalogo publico. El
+        # primer snapshot de cada uno es la linea base y no marca nada.
+        client = client or db
+        favorites = _DiffWatch(
+            'favorites',
+            lambda data: (data.get('resellerId'), data.get('isActive'), data.get('markupType'),
+                          data.get('markupValue'), data.get('productId'), data.get('productSnapshot')),
+            lambda doc_id, old, new: self.mark_dirty(value[0] for value in (old, new) if value is not None),
+        )
+        resellers = _DiffWatch(
+            'resellers',
+            lambda data: (data.get('markupType'), data.get('defaultMarkupValue'),
+                          (data.get('catalogSettings') or {}).get('isPublic')),
+            lambda doc_id, old, new: self.mark_dirty([doc_id]),
+        )
+        users = _DiffWatch(
+            'users',
+            lambda data: tuple(data.get(field) for field in _NAME_FIELDS),
+            lambda doc_id, old, new: self.mark_dirty([doc_id]),
+        )
+        watches = [
+            client.collection('favorites').on_snapshot(favorites.callback),
+            client.collection('resellers').on_snapshot(resellers.callback),
+            client.collection('users').where('userType', '==', 'reseller').on_snapshot(users.callback),
+        ]
+        if not use_product_snapshots():
+            # Sin productSnapshot el precio sale del producto: un cambio marca
+            # a los revendedores que lo tienen en favoritos.
+            products = _DiffWatch(
+                'products',
+                product_snapshot,
+                lambda doc_id, old, new: self.mark_dirty(
+                    value[0] for value in favorites.values() if value[4] == doc_id
+                ),
+            )
+            watches.append(client.collection('products').on_snapshot(products.callback))
+        return watches
+
+
+class _DiffWatch:
+    # Guarda una huella de cada documento y avisa cuales cambiaron, entraron
+    # o salieron. El primer snapshot es la linea base; despues solo se mira
+    # la lista de cambios que trae cada evento. Antes de avisar saca el
+    # documento del cache de documentos, asi la regeneracion no lee una copia
+    # vieja (y los workers que comparten el cache tampoco).
+    def __init__(self, collection: str, fingerprint: Callable[[Dict], Hashable],
+                 on_change: Callable[[str, Optional[Hashable], Optional[Hashable]], None]) -> None:
+        self.collection = collection
+        self.fingerprint = fingerprint
+        self.on_change = on_change
+        self.known: Optional[Dict[str, Hashable]] = None
+        self._lock = threading.Lock()
+
+    def values(self) -> list:
+        with self._lock:
+            return list((self.known or {}).values())
+
+    def callback(self, docs, changes, read_time) -> None:
+        from google.cloud.firestore_v1.watch import ChangeType
+
+        changed = []
+        with self._lock:
+            if self.known is None:
+                self.known = {doc.id: self.fingerprint(doc.to_dict() or {}) for doc in docs}
+                return
+            for change in changes:
+                doc_id = change.document.id
+                new = None if change.type == ChangeType.REMOVED else self.fingerprint(change.document.to_dict() or {})
+                old = self.known.pop(doc_id, None)
+                if new is not None:
+                    self.known[doc_id] = new
+                if old != new:
+                    changed.append((doc_id, old, new))
+        for doc_id, old, new in changed:
+            document_cache.invalidate([f'{self.collection}/{doc_id}'])
+            self.on_change(doc_id, old, new)
+
+
+public_catalog_service = PublicCatalogService()
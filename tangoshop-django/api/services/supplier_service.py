@@ -1,71 +1,143 @@
-from api.utils.firebase_config import db
+import asyncio
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from api.models import Favorite, Product, Reseller
+from api.services.pricing_service import pricing_service, round2
+from api.utils.conditional import ContentVersion
+from api.utils.firebase_config import async_db, db
+from api.utils.firestore_batch import afetch_documents, fetch_documents
+
+# Campos de users que se devuelven por cada revendedor.
+_CONTACT_FIELDS = ('firstName', 'lastName', 'email')
 
 class SupplierService:
-    def get_resellers_high_markup(self, supplier_id: str, product_id: str) -> dict:
+    def _load_documents(self, collection: str, doc_ids: Iterable[str], batched: bool, field_paths: Tuple[str, ...]) -> Dict:
+        if batched:
+            return fetch_documents(db, collection, doc_ids, field_paths=field_paths)
+        return {
+            doc_id: db.collection(collection).document(doc_id).get(field_paths=field_paths)
+            for doc_id in dict.fromkeys(doc_ids)
+        }
 
-        product_doc = db.collection('products').document(product_id).get()
-        if not product_doc.exists:
-            raise ValueError('Producto no encontrado')
-        
-        product_data = product_doc.to_dict()
-        if product_data.get('supplierId') != supplier_id:
-            raise ValueError('Este producto no te pertenece')
-        
-        base_price = product_data.get('price', 0)
+    def get_resellers_high_markup(self, supplier_id: str, product_id: str, batched: Optional[bool] = None,
+                                  version: Optional[ContentVersion] = None) -> dict:
+        if batched is None:
+            batched = getattr(settings, 'SUPPLIER_BATCHED_LOOKUPS', True)
+
+        product_doc = db.collection('products').document(product_id).get(field_paths=Product.PROJECTION)
+        product_data = self._owned_product(product_doc, supplier_id)
         
         favorites_snap = db.collection('favorites') \
+            .select(Favorite.PROJECTION) \
             .where('productId', '==', product_id) \
             .where('isActive', '==', True) \
             .get()
         
+        favorites = [Favorite.from_snapshot(fav_doc) for fav_doc in favorites_snap]
+        reseller_docs = self._load_documents('resellers', [fav.resellerId for fav in favorites], batched, Reseller.PROJECTION)
+        
+        if version is not None:
+            version.add(product_doc)
+            version.add_all(favorites_snap)
+            version.add_all(reseller_docs.values())
+        
+        high_markups = self._high_markups(product_data.price, favorites, reseller_docs)
+        
+        user_docs = self._load_documents('users', [reseller_id for reseller_id, _, _ in high_markups], batched, _CONTACT_FIELDS)
+        if version is not None:
+            version.add_all(user_docs.values())
+        
+        return self._high_markup_result(product_id, product_data, high_markups, user_docs)
+
+    async def aget_resellers_high_markup(self, supplier_id: str, product_id: str,
+                                         version: Optional[ContentVersion] = None) -> dict:
+        # El producto y sus favoritos se leen a la vez; la propiedad del
+        # producto se valida antes de seguir con los revendedores.
+        product_doc, favorites_snap = await asyncio.gather(
+            async_db.collection('products').document(product_id).get(field_paths=Product.PROJECTION),
+            async_db.collection('favorites')
+            .select(Favorite.PROJECTION)
+            .where('productId', '==', product_id)
+            .where('isActive', '==', True)
+            .get(),
+        )
+        product_data = self._owned_product(product_doc, supplier_id)
+
+        favorites = [Favorite.from_snapshot(fav_doc) for fav_doc in favorites_snap]
+        reseller_docs = await afetch_documents(async_db, 'resellers', [fav.resellerId for fav in favorites],
+                                               field_paths=Reseller.PROJECTION)
+
+        if version is not None:
+            version.add(product_doc)
+            version.add_all(favorites_snap)
+            version.add_all(reseller_docs.values())
+
+        high_markups = self._high_markups(product_data.price, favorites, reseller_docs)
+
+        user_docs = await afetch_documents(async_db, 'users', [reseller_id for reseller_id, _, _ in high_markups],
+                                           field_paths=_CONTACT_FIELDS)
+        if version is not None:
+            version.add_all(user_docs.values())
+
+        return self._high_markup_result(product_id, product_data, high_markups, user_docs)
+
+    def _owned_product(self, product_doc, supplier_id: str) -> Product:
+        if not product_doc.exists:
+            raise ValueError('Producto no encontrado')
+        
+        product_data = Product.from_snapshot(product_doc)
+        if product_data.supplierId != supplier_id:
+            raise ValueError('Este producto no te pertenece')
+        return product_data
+
+    def _high_markups(self, base_price, favorites: List[Favorite], reseller_docs: Dict) -> List[Tuple]:
+        rows = []
+        for fav_data in favorites:
+            reseller_doc = reseller_docs.get(fav_data.resellerId)
+            if reseller_doc is not None and reseller_doc.exists:
+                rows.append((fav_data, Reseller.from_snapshot(reseller_doc)))
+        
+        pricing = pricing_service.apply_markups(
+            [base_price] * len(rows),
+            [fav_data.markupType for fav_data, _ in rows],
+            [fav_data.markupValue for fav_data, _ in rows],
+            [reseller_data.markupType for _, reseller_data in rows],
+            [reseller_data.defaultMarkupValue for _, reseller_data in rows],
+        )
+        selected = np.flatnonzero(pricing.percentage_increases > 20)
+        final_prices = pricing.rounded_final_prices(selected)
+        percentage_increases = round2(pricing.percentage_increases[selected])
+        
+        return [
+            (rows[index][0].resellerId, final_price, percentage_increase)
+            for index, final_price, percentage_increase in zip(selected.tolist(), final_prices, percentage_increases)
+        ]
+
+    def _high_markup_result(self, product_id: str, product_data: Product, high_markups: List[Tuple], user_docs: Dict) -> dict:
         resellers_list = []
         
-        for fav_doc in favorites_snap:
-            fav_data = fav_doc.to_dict()
-            reseller_id = fav_data.get('resellerId')
-            
-            reseller_doc = db.collection('resellers').document(reseller_id).get()
-            if not reseller_doc.exists:
-                continue
-            
-            reseller_data = reseller_doc.to_dict()
-            
-            markup_type = fav_data.get('markupType', 'default')
-            markup_value = fav_data.get('markupValue', 0)
-            
-            if markup_type == 'default':
-                markup_type = reseller_data.get('markupType', 'percentage')
-                markup_value = reseller_data.get('defaultMarkupValue', 0)
-            
-            if markup_type == 'fixed':
-                final_price = base_price + markup_value
-            elif markup_type == 'percentage':
-                final_price = base_price * (1 + markup_value / 100)
-            else:
-                final_price = base_price
-            
-            percentage_increase = ((final_price - base_price) / base_price) * 100
+        for reseller_id, final_price, percentage_increase in high_markups:
+            user_doc = user_docs.get(reseller_id)
+            user_data = user_doc.to_dict() if user_doc is not None and user_doc.exists else {}
             
-            if percentage_increase > 20:
-
-                user_doc = db.collection('users').document(reseller_id).get()
-                user_data = user_doc.to_dict() if user_doc.exists else {}
-                
-                resellers_list.append({
-                    'resellerId': reseller_id,
-                    'firstName': user_data.get('firstName'),
-                    'lastName': user_data.get('lastName'),
-                    'email': user_data.get('email'),
-                    'finalPrice': round(final_price, 2),
-                    'percentageIncrease': round(percentage_increase, 2)
-                })
+            resellers_list.append({
+                'resellerId': reseller_id,
+                'firstName': user_data.get('firstName'),
+                'lastName': user_data.get('lastName'),
+                'email': user_data.get('email'),
+                'finalPrice': final_price,
+                'percentageIncrease': percentage_increase
+            })
         
         return {
             'productId': product_id,
-            'productName': product_data.get('name'),
-            'basePrice': base_price,
+            'productName': product_data.name,
+            'basePrice': product_data.price,
             'totalResellers': len(resellers_list),
             'resellers': resellers_list
         }
 
-supplier_service = SupplierService()
\ No newline at end of file
+supplier_service = SupplierService()
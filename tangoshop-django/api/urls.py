@@ -1,14 +1,21 @@
 from django.urls import path
 
-from api import views
+from api import async_views, views
 
 urlpatterns = [
     path('', views.api_root, name='api_root'),
     path('health/', views.health_check, name='health_check'),
+    path('metrics/', views.metrics, name='metrics'),
     path('auth/register/reseller/', views.register_reseller, name='register_reseller'),
     path('auth/register/supplier/', views.register_supplier, name='register_supplier'),
     path('auth/login/', views.login, name='login'),
     path('auth/reactivate-account/', views.reactivate_account, name='reactivate_account'),
     path('catalog/my-catalog/', views.get_my_catalog, name='get_my_catalog'),
-    path('suppliers/products/<str:product_id>/high-markup-resellers/', views.get_resellers_high_markup, name='get_resellers_high_markup')
+    path('suppliers/products/<str:product_id>/high-markup-resellers/', views.get_resellers_high_markup, name='get_resellers_high_markup'),
+    path('public/catalogs/<slug:reseller_id>/', views.public_catalog, {'fmt': 'html'}, name='public_catalog'),
+    path('public/catalogs/<slug:reseller_id>/catalog.json', views.public_catalog, {'fmt': 'json'}, name='public_catalog_json'),
+    path('public/catalogs/<slug:reseller_id>/<slug:version>.<slug:fmt>', views.public_catalog, name='public_catalog_version'),
+    path('async/auth/login/', async_views.login, name='async_login'),
+    path('async/catalog/my-catalog/', async_views.get_my_catalog, name='async_get_my_catalog'),
+    path('async/suppliers/products/<str:product_id>/high-markup-resellers/', async_views.get_resellers_high_markup, name='async_get_resellers_high_markup')
 ]
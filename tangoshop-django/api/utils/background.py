@@ -0,0 +1,197 @@
+import atexit
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from api.utils.firebase_config import db
+from api.utils.firestore_batch import MAX_BATCH_WRITES
+from api.utils.metrics import record_background_job
+
+logger = logging.getLogger(__name__)
+
+
+class _Job:
+    __slots__ = ('name', 'fn', 'args', 'retry', 'attempt')
+
+    def __init__(self, name: str, fn: Callable, args: Tuple, retry: bool) -> None:
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.retry = retry
+        self.attempt = 0
+
+
+class BackgroundQueue:
+    # Cola de trabajos en proceso para las escrituras que el request no
+    # necesita esperar (notificaciones, rehash de passwords). Corren en
+    # BACKGROUND_WORKERS hilos; si fallan se reintentan hasta
+    # BACKGROUND_MAX_RETRIES veces con backoff exponencial, salvo los que se
+    # encolan con retry=False. drain() espera a los pendientes y close() lo
+    # llama al apagar el proceso (atexit y worker_exit de gunicorn). Con
+    # BACKGROUND_WORKERS=0, o despues de close(), los trabajos corren en el
+    # momento en el hilo que los encola.
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._jobs: List[Tuple[float, int, _Job]] = []
+        self._order = itertools.count()
+        self._threads: List[threading.Thread] = []
+        self._running = 0
+        self._hurry = 0
+        self._closed = False
+
+    @property
+    def workers(self) -> int:
+        return getattr(settings, 'BACKGROUND_WORKERS', 2)
+
+    def submit(self, name: str, fn: Callable, *args, delay: float = 0, retry: bool = True) -> None:
+        job = _Job(name, fn, args, retry)
+        with self._cond:
+            inline = self._closed or self.workers <= 0
+            if not inline:
+                self._start()
+                self._push(job, delay)
+                return
+        self._execute(job, retry=False)
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._jobs) + self._running
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        # Al drenar no se espera el delay de los batches ni el backoff de los
+        # reintentos. Devuelve False si quedaron trabajos sin terminar.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._hurry += 1
+            self._cond.notify_all()
+            try:
+                while self._jobs or self._running:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+                return True
+            finally:
+                self._hurry -= 1
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        if timeout is None:
+            timeout = getattr(settings, 'BACKGROUND_DRAIN_TIMEOUT', 10)
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+        if not self.drain(timeout):
+            logger.error('Se descartan %d trabajos en segundo plano sin terminar', self.pending())
+        with self._cond:
+            self._cond.notify_all()
+
+    def _start(self) -> None:
+        if self._threads:
+            return
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'background-{number}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        atexit.register(self.close)
+
+    def _push(self, job: _Job, delay: float) -> None:
+        heapq.heappush(self._jobs, (time.monotonic() + delay, next(self._order), job))
+        self._cond.notify()
+
+    def _next(self) -> Optional[_Job]:
+        with self._cond:
+            while True:
+                if self._jobs:
+                    wait = self._jobs[0][0] - time.monotonic()
+                    if wait <= 0 or self._hurry:
+                        self._running += 1
+                        return heapq.heappop(self._jobs)[2]
+                elif self._closed:
+                    return None
+                else:
+                    wait = None
+                self._cond.wait(wait)
+
+    def _work(self) -> None:
+        while True:
+            job = self._next()
+            if job is None:
+                return
+            try:
+                self._execute(job, retry=True)
+            finally:
+                with self._cond:
+                    self._running -= 1
+                    self._cond.notify_all()
+
+    def _execute(self, job: _Job, retry: bool) -> None:
+        try:
+            job.fn(*job.args)
+        except Exception:
+            job.attempt += 1
+            if retry and job.retry and job.attempt <= getattr(settings, 'BACKGROUND_MAX_RETRIES', 5):
+                # Backoff exponencial con jitter, para no reintentar todos
+                # juntos contra un Firestore que esta respondiendo mal.
+                base = getattr(settings, 'BACKGROUND_RETRY_BASE_MS', 200) / 1000
+                ceiling = getattr(settings, 'BACKGROUND_RETRY_MAX_MS', 30000) / 1000
+                delay = min(base * 2 ** (job.attempt - 1), ceiling) * random.uniform(0.5, 1)
+                logger.warning('Fallo el trabajo %s (intento %d), se reintenta en %.2fs',
+                               job.name, job.attempt, delay, exc_info=True)
+                record_background_job(job.name, 'retry')
+                with self._cond:
+                    self._push(job, delay)
+            else:
+                logger.exception('Fallo el trabajo %s despues de %d intentos', job.name, job.attempt)
+                record_background_job(job.name, 'failed')
+        else:
+            record_background_job(job.name, 'ok')
+
+
+class BatchedWriter:
+    # Junta las escrituras de una coleccion que nadie lee durante el request
+    # y las escribe con WriteBatch de hasta MAX_BATCH_WRITES documentos. El
+    # primer documento pendiente programa el commit NOTIFICATION_BATCH_DELAY_MS
+    # despues, para juntar los que lleguen mientras. El id se elige al
+    # encolar: si el commit se reintenta, el set no duplica documentos.
+    def __init__(self, collection: str, queue: BackgroundQueue) -> None:
+        self.collection = collection
+        self.queue = queue
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[str, Dict]] = []
+
+    def add(self, data: Dict) -> str:
+        doc_id = db.collection(self.collection).document().id
+        with self._lock:
+            self._pending.append((doc_id, data))
+            count = len(self._pending)
+        if count == 1:
+            delay = getattr(settings, 'NOTIFICATION_BATCH_DELAY_MS', 50) / 1000
+            self.queue.submit(self.collection, self._flush, delay=delay)
+        elif count == MAX_BATCH_WRITES:
+            self.queue.submit(self.collection, self._flush)
+        return doc_id
+
+    def _flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, []
+        # Cada batch es su propio trabajo: si uno falla se reintenta solo ese.
+        for start in range(0, len(pending), MAX_BATCH_WRITES):
+            self.queue.submit(self.collection, self._commit, pending[start:start + MAX_BATCH_WRITES])
+
+    def _commit(self, documents: List[Tuple[str, Dict]]) -> None:
+        batch = db.batch()
+        collection = db.collection(self.collection)
+        for doc_id, data in documents:
+            batch.set(collection.document(doc_id), data)
+        batch.commit()
+
+
+background_queue = BackgroundQueue()
+notification_writer = BatchedWriter('notifications', background_queue)
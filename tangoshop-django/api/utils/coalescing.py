@@ -0,0 +1,50 @@
+from typing import Any, Awaitable, Callable, Hashable, Optional, Tuple
+
+from django.conf import settings
+
+from api.utils.conditional import ContentVersion
+from api.utils.metrics import record_coalescing
+from api.utils.single_flight import SingleFlight
+
+# Requests identicos y concurrentes (misma vista y mismos argumentos) esperan
+# el calculo que ya esta en curso en este proceso y reusan su resultado y su
+# version, en lugar de armar cada uno el mismo catalogo. El resultado es
+# compartido: las vistas no deben modificarlo.
+
+_flights = SingleFlight()
+
+
+def _enabled() -> bool:
+    return getattr(settings, 'REQUEST_COALESCING_ENABLED', True)
+
+
+def coalesce(view: str, key: Tuple[Hashable, ...], compute: Callable[[ContentVersion], Any],
+             version: Optional[ContentVersion] = None) -> Any:
+    if not _enabled():
+        return compute(version)
+
+    def run():
+        loaded = ContentVersion()
+        return compute(loaded), loaded.parts
+
+    (result, parts), shared = _flights.do((view, *key), run)
+    record_coalescing(view, shared)
+    if version is not None:
+        version.update(parts)
+    return result
+
+
+async def acoalesce(view: str, key: Tuple[Hashable, ...], compute: Callable[[ContentVersion], Awaitable],
+                    version: Optional[ContentVersion] = None) -> Any:
+    if not _enabled():
+        return await compute(version)
+
+    async def run():
+        loaded = ContentVersion()
+        return await compute(loaded), loaded.parts
+
+    (result, parts), shared = await _flights.ado((view, *key), run)
+    record_coalescing(view, shared)
+    if version is not None:
+        version.update(parts)
+    return result
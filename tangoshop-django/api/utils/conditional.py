@@ -0,0 +1,60 @@
+import hashlib
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+
+def version_part(snapshot) -> Tuple[str, Optional[datetime]]:
+    update_time = snapshot.update_time if snapshot.exists else None
+    return snapshot.reference.path, update_time if isinstance(update_time, datetime) else None
+
+
+class ContentVersion:
+    # Version de una respuesta armada a partir de documentos de Firestore:
+    # se arma con el path y el update_time de cada documento leido, sin
+    # necesidad de serializar el payload.
+    def __init__(self) -> None:
+        self.parts: Dict[str, Optional[datetime]] = {}
+
+    def add(self, snapshot) -> None:
+        path, update_time = version_part(snapshot)
+        self.parts[path] = update_time
+
+    def add_all(self, snapshots: Iterable) -> None:
+        for snapshot in snapshots:
+            self.add(snapshot)
+
+    def update(self, parts: Dict[str, Optional[datetime]]) -> None:
+        self.parts.update(parts)
+
+    @property
+    def etag(self) -> str:
+        digest = hashlib.sha1()
+        for path in sorted(self.parts):
+            update_time = self.parts[path]
+            digest.update(f'{path}@{update_time.isoformat() if update_time else "-"}\n'.encode())
+        return f'"{digest.hexdigest()}"'
+
+    @property
+    def last_modified(self) -> Optional[float]:
+        times = [update_time for update_time in self.parts.values() if update_time is not None]
+        return max(times).timestamp() if times else None
+
+
+def set_validators(response, version: ContentVersion):
+    response['ETag'] = version.etag
+    if version.last_modified is not None:
+        response['Last-Modified'] = http_date(version.last_modified)
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ('Authorization',))
+    return response
+
+
+def not_modified_response(request, version: ContentVersion):
+    # Devuelve un 304 si el cliente ya tiene esta version, o None.
+    response = get_conditional_response(request, etag=version.etag, last_modified=version.last_modified)
+    if response is None:
+        return None
+    return set_validators(response, version)
@@ -1,35 +1,69 @@
 from functools import wraps
 
-from django.http import JsonResponse
+from asgiref.sync import iscoroutinefunction
+
+from api.utils.json_codec import JSONResponse
+
+def _auth_error(request):
+    if not hasattr(request, 'user_data'):
+        return JSONResponse({
+            'success': False,
+            'message': 'No autenticado'
+        }, status=401)
+    return None
+
+def _role_error(request, allowed_roles):
+    error = _auth_error(request)
+    if error is not None:
+        return error
+
+    user_type = request.user_data.get('userType')
+    if user_type not in allowed_roles:
+        return JSONResponse({
+            'success': False,
+            'message': f'Acceso denegado. Se requiere rol: {" o ".join(allowed_roles)}'
+        }, status=403)
+    return None
+
+def _guard(view_func, check):
+    # Envuelve vistas sincronicas y async: si la vista es una corrutina el
+    # wrapper tambien lo es, para que Django no la ejecute en un hilo.
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            error = check(request)
+            if error is not None:
+                return error
+            return await view_func(request, *args, **kwargs)
+        return async_wrapper
 
-def require_auth(view_func):
     @wraps(view_func)
     def wrapper(request, *args, **kwargs):
-        if not hasattr(request, 'user_data'):
-            return JsonResponse({
-                'success': False,
-                'message': 'No autenticado'
-            }, status=401)
+        error = check(request)
+        if error is not None:
+            return error
         return view_func(request, *args, **kwargs)
     return wrapper
 
+def require_auth(view_func):
+    return _guard(view_func, _auth_error)
+
 def require_role(*allowed_roles):
     def decorator(view_func):
-        @wraps(view_func)
-        def wrapper(request, *args, **kwargs):
-            if not hasattr(request, 'user_data'):
-                return JsonResponse({
-                    'success': False,
-                    'message': 'No autenticado'
-                }, status=401)
-
-            user_type = request.user_data.get('userType')
-            if user_type not in allowed_roles:
-                return JsonResponse({
-                    'success': False,
-                    'message': f'Acceso denegado. Se requiere rol: {" o ".join(allowed_roles)}'
-                }, status=403)
-
-            return view_func(request, *args, **kwargs)
-        return wrapper
-    return decorator
\ No newline at end of file
+        return _guard(view_func, lambda request: _role_error(request, allowed_roles))
+    return decorator
+
+def require_methods(*methods):
+    def check(request):
+        if request.method not in methods:
+            response = JSONResponse({
+                'success': False,
+                'message': f'Metodo {request.method} no permitido'
+            }, status=405)
+            response['Allow'] = ', '.join(methods)
+            return response
+        return None
+
+    def decorator(view_func):
+        return _guard(view_func, check)
+    return decorator
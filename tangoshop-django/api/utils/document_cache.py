@@ -0,0 +1,451 @@
+import copy
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+
+from api.utils.instrumented_firestore import _is_chainable
+from api.utils.lru_cache import LRUCache
+from api.utils.metrics import record_document_cache
+from api.utils.shared_cache import SharedCacheClient
+from api.utils.single_flight import SingleFlight
+
+# Cache de lectura para documentos leidos por id (get y get_all) de las
+# colecciones de DOCUMENT_CACHE_TTLS, con un TTL por coleccion. CachedFirestore
+# envuelve a db y async_db: las lecturas pasan primero por este proceso, luego
+# por el cache compartido entre workers (si DOCUMENT_CACHE_SOCKET esta
+# definido) y recien despues por Firestore; los misses concurrentes de un
+# mismo documento comparten una sola lectura. Las escrituras hechas por este
+# cliente invalidan el documento aca y en el cache compartido. Con cache
+# compartido, cada hit local pregunta al servidor si el documento se invalido
+# despues de leerlo (un round trip por lectura o get_all), asi las escrituras
+# de otros workers se ven enseguida; sin el, los cambios hechos por otros
+# procesos se ven cuando vence el TTL.
+#
+# users no se cachea nunca, aunque figure en DOCUMENT_CACHE_TTLS: guarda el
+# hash del password e isActive, que se leen siempre frescos para que un
+# usuario desactivado o con password nuevo no pueda entrar desde otro worker.
+_NEVER_CACHED = frozenset({'users'})
+
+# (exists, data, create_time, update_time, read_time)
+Entry = Tuple
+
+
+def _fields_key(field_paths) -> Optional[Tuple[str, ...]]:
+    return None if field_paths is None else tuple(sorted(field_paths))
+
+
+def _collection(path: str) -> str:
+    return path.rsplit('/', 2)[-2]
+
+
+def _entry(snapshot) -> Entry:
+    return (
+        snapshot.exists,
+        snapshot.to_dict() if snapshot.exists else None,
+        getattr(snapshot, 'create_time', None),
+        getattr(snapshot, 'update_time', None),
+        getattr(snapshot, 'read_time', None),
+    )
+
+
+def _project(entry: Entry, fields: Tuple[str, ...]) -> Entry:
+    exists, data, create_time, update_time, read_time = entry
+    if exists:
+        data = {field: data[field] for field in fields if field in data}
+    return exists, data, create_time, update_time, read_time
+
+
+class CachedSnapshot:
+    __slots__ = ('reference', 'exists', 'create_time', 'update_time', 'read_time', '_data')
+
+    def __init__(self, reference, entry: Entry) -> None:
+        self.reference = reference
+        self.exists, self._data, self.create_time, self.update_time, self.read_time = entry
+
+    @property
+    def id(self) -> str:
+        return self.reference.id
+
+    def to_dict(self) -> Optional[Dict]:
+        return copy.deepcopy(self._data) if self.exists else None
+
+    def get(self, field_path: str):
+        value = self._data or {}
+        for part in field_path.split('.'):
+            if not isinstance(value, dict) or part not in value:
+                raise KeyError(field_path)
+            value = value[part]
+        return copy.deepcopy(value)
+
+    def __repr__(self) -> str:
+        return f'<CachedSnapshot {self.reference.path} exists={self.exists}>'
+
+
+class DocumentCache:
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._entries: Optional[LRUCache] = None
+        self._shared: Optional[SharedCacheClient] = None
+        self._shared_path: Optional[str] = None
+        # path -> claves guardadas de ese documento (una por proyeccion).
+        self._keys: Dict[str, Set[Tuple]] = {}
+        # Cuenta las invalidaciones: una lectura que empezo antes de una
+        # escritura no guarda su resultado.
+        self._generation = 0
+        self.flights = SingleFlight()
+
+    @property
+    def entries(self) -> LRUCache:
+        if self._entries is None:
+            with self._lock:
+                if self._entries is None:
+                    self._entries = LRUCache(
+                        max_entries=getattr(settings, 'DOCUMENT_CACHE_MAX_ENTRIES', 20000),
+                        on_evict=lambda key, _entry: self._forget(key),
+                    )
+        return self._entries
+
+    @property
+    def shared(self) -> Optional[SharedCacheClient]:
+        path = getattr(settings, 'DOCUMENT_CACHE_SOCKET', None)
+        if path != self._shared_path:
+            with self._lock:
+                timeout = getattr(settings, 'DOCUMENT_CACHE_SOCKET_TIMEOUT_MS', 20) / 1000
+                self._shared = SharedCacheClient(path, timeout) if path else None
+                self._shared_path = path
+        return self._shared
+
+    def ttl(self, path: str) -> Optional[float]:
+        collection = _collection(path)
+        if collection in _NEVER_CACHED:
+            return None
+        return getattr(settings, 'DOCUMENT_CACHE_TTLS', {}).get(collection)
+
+    def get(self, reference, field_paths, fetch: Callable):
+        path = reference.path
+        ttl = self.ttl(path)
+        if ttl is None:
+            return fetch()
+        key = (path, _fields_key(field_paths))
+        entry = self._lookup(key)
+        if entry is not None:
+            return CachedSnapshot(reference, entry)
+
+        result, shared = self.flights.do(key, lambda: self._load(key, ttl, fetch))
+        return self._result(reference, key, result, shared)
+
+    async def aget(self, reference, field_paths, fetch: Callable):
+        path = reference.path
+        ttl = self.ttl(path)
+        if ttl is None:
+            return await fetch()
+        key = (path, _fields_key(field_paths))
+        entry = self._lookup(key)
+        if entry is not None:
+            return CachedSnapshot(reference, entry)
+
+        result, shared = await self.flights.ado(key, lambda: self._aload(key, ttl, fetch))
+        return self._result(reference, key, result, shared)
+
+    def get_all(self, references: Iterable, field_paths, fetch: Callable) -> List:
+        snapshots, missing = self._split(references, field_paths)
+        if missing:
+            generation = self._generation
+            fetched = list(fetch([reference for reference, _, _, _ in missing]))
+            snapshots.extend(self._store_all(missing, fetched, generation))
+        return snapshots
+
+    async def aget_all(self, references: Iterable, field_paths, fetch: Callable):
+        snapshots, missing = self._split(references, field_paths)
+        for snapshot in snapshots:
+            yield snapshot
+        if missing:
+            generation = self._generation
+            fetched = [snapshot async for snapshot in fetch([reference for reference, _, _, _ in missing])]
+            for snapshot in self._store_all(missing, fetched, generation):
+                yield snapshot
+
+    def invalidate(self, paths: Iterable[str]) -> None:
+        shared = self.shared
+        for path in paths:
+            if self.ttl(path) is None:
+                continue
+            with self._lock:
+                self._generation += 1
+                for key in self._keys.pop(path, ()):
+                    self.entries.delete(key)
+                # Quien lea despues de la escritura no se suma a una lectura
+                # que empezo antes.
+                self.flights.forget_if(lambda key: key[0] == path)
+            if shared is not None:
+                shared.invalidate(path)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.entries.clear()
+            self._keys.clear()
+            self._generation += 1
+
+    def stats(self) -> Dict:
+        stats = self.entries.stats()
+        stats['sharedErrors'] = self._shared.errors if self._shared is not None else 0
+        return stats
+
+    def _lookup(self, key: Tuple) -> Optional[Entry]:
+        hit = self._local(key)
+        if hit is None or not self._current([(key[0], hit[1])])[0]:
+            return None
+        record_document_cache(_collection(key[0]), 'local')
+        return hit[0]
+
+    def _local(self, key: Tuple) -> Optional[Tuple[Entry, Optional[int]]]:
+        # (entrada, reloj del servidor con que se leyo) o None.
+        path, fields = key
+        hit = self.entries.get(key)
+        if hit is None and fields is not None:
+            # Un documento completo en cache sirve para cualquier proyeccion.
+            full = self.entries.get((path, None), count=False)
+            if full is not None:
+                hit = (_project(full[0], fields), full[1])
+        return hit
+
+    def _current(self, hits: List[Tuple[str, Optional[int]]]) -> List[bool]:
+        # Para cada (path, reloj) local, si sigue valiendo: no vale si el
+        # servidor invalido el documento despues de ese reloj. Sin servidor,
+        # o si no responde, la copia local vale hasta su TTL.
+        shared = self.shared
+        checks = [(path, since) for path, since in hits if since is not None]
+        changed = shared.changed(checks) if shared is not None and checks else None
+        if changed is None:
+            return [True] * len(hits)
+        changed = iter(changed)
+        current = []
+        for path, since in hits:
+            stale = since is not None and next(changed)
+            if stale:
+                self._drop(path)
+            current.append(not stale)
+        return current
+
+    def _drop(self, path: str) -> None:
+        with self._lock:
+            for key in self._keys.pop(path, ()):
+                self.entries.delete(key)
+
+    def _load(self, key: Tuple, ttl: float, fetch: Callable) -> Tuple[Optional[Entry], object]:
+        generation = self._generation
+        entry, since = self._shared_get(key)
+        if entry is not None:
+            return entry, None
+        snapshot = fetch()
+        entry = _entry(snapshot)
+        self._store(key, entry, ttl, generation, since)
+        record_document_cache(_collection(key[0]), 'miss')
+        return entry, snapshot
+
+    async def _aload(self, key: Tuple, ttl: float, fetch: Callable) -> Tuple[Optional[Entry], object]:
+        generation = self._generation
+        entry, since = self._shared_get(key)
+        if entry is not None:
+            return entry, None
+        snapshot = await fetch()
+        entry = _entry(snapshot)
+        self._store(key, entry, ttl, generation, since)
+        record_document_cache(_collection(key[0]), 'miss')
+        return entry, snapshot
+
+    def _result(self, reference, key: Tuple, result, shared: bool):
+        entry, snapshot = result
+        if shared:
+            record_document_cache(_collection(key[0]), 'coalesced')
+        # Quien hizo la lectura recibe el snapshot original; los demas, una
+        # copia con su propia referencia.
+        if snapshot is not None and not shared:
+            return snapshot
+        return CachedSnapshot(reference, entry)
+
+    def _shared_get(self, key: Tuple) -> Tuple[Optional[Entry], Optional[int]]:
+        # Devuelve la entrada compartida (o None) y el reloj del servidor, que
+        # acompaña al set de lo que se lea de Firestore. Sin servidor el reloj
+        # es None y no se comparte nada.
+        shared = self.shared
+        reply = shared.get(key) if shared is not None else None
+        if reply is None:
+            return None, None
+        value, since = reply
+        if value is None:
+            return None, since
+        entry, expires_at = value
+        ttl = expires_at - time.time()
+        if ttl <= 0:
+            return None, since
+        self._store(key, entry, ttl, self._generation, since, share=False)
+        record_document_cache(_collection(key[0]), 'shared')
+        return entry, since
+
+    def _split(self, references: Iterable, field_paths) -> Tuple[List, List]:
+        fields = _fields_key(field_paths)
+        candidates = []
+        for reference in references:
+            key = (reference.path, fields)
+            ttl = self.ttl(key[0])
+            candidates.append((reference, key, ttl, self._local(key) if ttl is not None else None))
+        # Los hits locales se verifican contra el servidor en un solo pedido.
+        current = iter(self._current([(key[0], hit[1]) for _, key, _, hit in candidates if hit is not None]))
+
+        snapshots, missing = [], []
+        for reference, key, ttl, hit in candidates:
+            entry = since = None
+            if hit is not None and next(current):
+                entry = hit[0]
+                record_document_cache(_collection(key[0]), 'local')
+            elif ttl is not None:
+                entry, since = self._shared_get(key)
+            if entry is not None:
+                snapshots.append(CachedSnapshot(reference, entry))
+            else:
+                missing.append((reference, key, ttl, since))
+        return snapshots, missing
+
+    def _store_all(self, missing: List, fetched: List, generation: int) -> List:
+        by_path = {key[0]: (key, ttl, since) for _, key, ttl, since in missing}
+        for snapshot in fetched:
+            key, ttl, since = by_path.get(snapshot.reference.path, (None, None, None))
+            if ttl is not None:
+                self._store(key, _entry(snapshot), ttl, generation, since)
+                record_document_cache(_collection(key[0]), 'miss')
+        return fetched
+
+    def _store(self, key: Tuple, entry: Entry, ttl: float, generation: int, since: Optional[int] = None,
+               share: bool = True) -> None:
+        with self._lock:
+            if generation != self._generation:
+                return
+            if self.entries.set(key, (entry, since), ttl=ttl):
+                self._keys.setdefault(key[0], set()).add(key)
+        shared = self.shared if since is not None and share else None
+        if shared is not None:
+            shared.set(key, (entry, time.time() + ttl), ttl, group=key[0], since=since)
+
+    def _forget(self, key: Tuple) -> None:
+        with self._lock:
+            keys = self._keys.get(key[0])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys[key[0]]
+
+
+document_cache = DocumentCache()
+
+
+def unwrap(value):
+    if isinstance(value, CachedFirestore):
+        return object.__getattribute__(value, '_target')
+    if isinstance(value, (list, tuple)):
+        return type(value)(unwrap(item) for item in value)
+    return value
+
+
+def _path(reference) -> Optional[str]:
+    return getattr(unwrap(reference), 'path', None)
+
+
+class CachedFirestore:
+    # Proxy sobre el cliente (ya instrumentado) con la misma forma que
+    # InstrumentedFirestore: envuelve referencias, queries y batches y
+    # desenvuelve los argumentos antes de pasarlos al cliente.
+    __slots__ = ('_target', '_cache', '_asynchronous', '_pending')
+
+    def __init__(self, target, cache: DocumentCache, asynchronous: bool = False) -> None:
+        object.__setattr__(self, '_target', target)
+        object.__setattr__(self, '_cache', cache)
+        object.__setattr__(self, '_asynchronous', asynchronous)
+        # Paths escritos en un batch, que se invalidan al hacer commit.
+        object.__setattr__(self, '_pending', [] if hasattr(target, 'commit') else None)
+
+    def __getattr__(self, name):
+        target = object.__getattribute__(self, '_target')
+        value = getattr(target, name)
+        if not callable(value):
+            return self._wrap(value)
+
+        pending = object.__getattribute__(self, '_pending')
+        document = pending is None and hasattr(target, 'update')
+
+        def call(*args, **kwargs):
+            args = [unwrap(arg) for arg in args]
+            kwargs = {key: unwrap(arg) for key, arg in kwargs.items()}
+            if document and name == 'get' and len(args) <= 1 and kwargs.get('transaction') is None:
+                return self._get(value, args, kwargs)
+            if name == 'get_all' and not kwargs.get('transaction'):
+                return self._get_all(value, args, kwargs)
+            if pending is not None and name in ('set', 'update', 'create', 'delete'):
+                # En un batch solo se encola: el path se invalida en el commit.
+                pending.append(_path(args[0]))
+                value(*args, **kwargs)
+                return self
+            if pending is not None and name == 'commit':
+                return self._after(value(*args, **kwargs), pending[:])
+            if document and name in ('set', 'update', 'create', 'delete'):
+                return self._after(value(*args, **kwargs), [target.path])
+            return self._wrap(value(*args, **kwargs))
+
+        return call
+
+    def __setattr__(self, name, value) -> None:
+        setattr(object.__getattribute__(self, '_target'), name, value)
+
+    def __eq__(self, other) -> bool:
+        return object.__getattribute__(self, '_target') == unwrap(other)
+
+    def __hash__(self) -> int:
+        return hash(object.__getattribute__(self, '_target'))
+
+    def __repr__(self) -> str:
+        return f'<Cached {object.__getattribute__(self, "_target")!r}>'
+
+    def _wrap(self, value):
+        if isinstance(value, tuple):
+            return tuple(self._wrap(item) for item in value)
+        if not _is_chainable(value):
+            return value
+        return CachedFirestore(value, object.__getattribute__(self, '_cache'),
+                               object.__getattribute__(self, '_asynchronous'))
+
+    def _get(self, method, args, kwargs):
+        cache = object.__getattribute__(self, '_cache')
+        field_paths = args[0] if args else kwargs.get('field_paths')
+        if object.__getattribute__(self, '_asynchronous'):
+            return cache.aget(self, field_paths, lambda: method(*args, **kwargs))
+        return cache.get(self, field_paths, lambda: method(*args, **kwargs))
+
+    def _get_all(self, method, args, kwargs):
+        cache = object.__getattribute__(self, '_cache')
+        references = list(args[0] if args else kwargs.pop('references'))
+        field_paths = args[1] if len(args) > 1 else kwargs.get('field_paths')
+        args = args[2:]
+        kwargs['field_paths'] = field_paths
+        # Las referencias vienen desenvueltas: el snapshot en cache usa la
+        # del cliente de abajo, igual que los que devuelve Firestore.
+        if object.__getattribute__(self, '_asynchronous'):
+            return cache.aget_all(references, field_paths, lambda missing: method(missing, *args, **kwargs))
+        return cache.get_all(references, field_paths, lambda missing: method(missing, *args, **kwargs))
+
+    def _after(self, result, paths: List[str]):
+        cache = object.__getattribute__(self, '_cache')
+        pending = object.__getattribute__(self, '_pending')
+        if pending is not None:
+            pending.clear()
+        if not object.__getattribute__(self, '_asynchronous'):
+            cache.invalidate(paths)
+            return self._wrap(result)
+
+        async def invalidate_after():
+            written = await result
+            cache.invalidate(paths)
+            return self._wrap(written)
+
+        return invalidate_after()
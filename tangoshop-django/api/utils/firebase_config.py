@@ -1,27 +1,139 @@
+import importlib
+import logging
 import os
+import threading
 
-import firebase_admin
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
-from firebase_admin import auth, credentials, firestore, storage
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+_lock = threading.RLock()
+_handles = {}
+
 def initialize_firebase():
-    if not firebase_admin._apps:
-        cred_path = os.getenv('FIREBASE_CREDENTIALS_PATH', './serviceAccountKey.json')
-        cred = credentials.Certificate(cred_path)
-
-        firebase_admin.initialize_app(cred, {
-            'storageBucket': f"{os.getenv('FIREBASE_PROJECT_ID')}.appspot.com"
-        })
-
-    return {
-        'db': firestore.client(),
-        'auth': auth,
-        'storage': storage.bucket()
-    }
-
-firebase_app = initialize_firebase()
-db = firebase_app['db']
-auth_service = firebase_app['auth']
-storage_bucket = firebase_app['storage']
\ No newline at end of file
+    import firebase_admin
+    from firebase_admin import credentials
+
+    with _lock:
+        if not firebase_admin._apps:
+            cred_path = os.getenv('FIREBASE_CREDENTIALS_PATH', './serviceAccountKey.json')
+            cred = credentials.Certificate(cred_path)
+
+            firebase_admin.initialize_app(cred, {
+                'storageBucket': f"{os.getenv('FIREBASE_PROJECT_ID')}.appspot.com"
+            })
+
+        return firebase_admin.get_app()
+
+def _create_memory(name: str):
+    import json
+
+    from django.conf import settings
+
+    from api.utils.memory_firestore import MemoryAsyncFirestore, MemoryFirestore
+
+    if name == 'db':
+        client = MemoryFirestore(latency=getattr(settings, 'FIRESTORE_MEMORY_LATENCY_MS', 0) / 1000)
+        fixture = getattr(settings, 'FIRESTORE_MEMORY_FIXTURE', None)
+        if fixture:
+            with open(fixture, encoding='utf-8') as fixture_file:
+                client.load(json.load(fixture_file))
+        return client
+    if name == 'async_db':
+        from api.utils import document_cache, instrumented_firestore
+        return MemoryAsyncFirestore(instrumented_firestore.unwrap(document_cache.unwrap(get_handle('db'))))
+    raise ImproperlyConfigured(f'El backend en memoria no provee {name}')
+
+def _create(name: str):
+    from django.conf import settings
+
+    if getattr(settings, 'FIRESTORE_BACKEND', 'firebase') == 'memory':
+        return _create_memory(name)
+
+    initialize_firebase()
+    if name == 'db':
+        from firebase_admin import firestore
+        return firestore.client()
+    if name == 'async_db':
+        from firebase_admin import firestore_async
+        return firestore_async.client()
+    if name == 'auth':
+        from firebase_admin import auth
+        return auth
+    if name == 'storage':
+        from firebase_admin import storage
+        return storage.bucket()
+    raise KeyError(name)
+
+def _instrument(name: str, client):
+    from django.conf import settings
+
+    # Los clientes de Firestore pasan por el proxy que registra cada
+    # operacion en las metricas de /api/metrics/.
+    if name not in ('db', 'async_db') or not getattr(settings, 'METRICS_ENABLED', True):
+        return client
+    from api.utils.instrumented_firestore import InstrumentedFirestore
+    return InstrumentedFirestore(client)
+
+def _cache(name: str, client):
+    from django.conf import settings
+
+    # Las lecturas por id de las colecciones de DOCUMENT_CACHE_TTLS pasan por
+    # el cache de documentos; va por fuera del proxy de metricas, asi los
+    # hits no cuentan como operaciones de Firestore.
+    if name not in ('db', 'async_db') or not getattr(settings, 'DOCUMENT_CACHE_ENABLED', True):
+        return client
+    from api.utils.document_cache import CachedFirestore, document_cache
+    return CachedFirestore(client, document_cache, asynchronous=name == 'async_db')
+
+def get_handle(name: str):
+    handle = _handles.get(name)
+    if handle is None:
+        with _lock:
+            handle = _handles.get(name)
+            if handle is None:
+                handle = _handles[name] = _cache(name, _instrument(name, _create(name)))
+    return handle
+
+class LazyHandle:
+    # Proxy que crea el cliente en el primer uso. Importar este modulo no
+    # carga credenciales ni las librerias de Google, asi manage.py, los
+    # tests y el arranque de cada worker no pagan ese costo por adelantado.
+    def __init__(self, name: str) -> None:
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(get_handle(self._name), attr)
+
+    def __repr__(self) -> str:
+        state = 'inicializado' if self._name in _handles else 'sin inicializar'
+        return f'<LazyHandle {self._name} ({state})>'
+
+class LazyModule:
+    # Igual que LazyHandle para los modulos de Google que se usan por sus
+    # constantes (firestore.SERVER_TIMESTAMP): se importan en el primer uso.
+    def __init__(self, name: str) -> None:
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(importlib.import_module(self._name), attr)
+
+    def __repr__(self) -> str:
+        return f'<LazyModule {self._name}>'
+
+def warm_up() -> None:
+    # Crea el cliente de Firestore y abre el canal gRPC con una lectura de un
+    # documento inexistente, para que el primer request no pague el handshake.
+    try:
+        db.collection('_warmup').document('ping').get(timeout=10)
+    except Exception:
+        logger.warning('No se pudo precalentar la conexion con Firestore', exc_info=True)
+
+db = LazyHandle('db')
+async_db = LazyHandle('async_db')
+auth_service = LazyHandle('auth')
+storage_bucket = LazyHandle('storage')
+firestore = LazyModule('firebase_admin.firestore')
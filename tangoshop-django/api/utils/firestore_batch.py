@@ -0,0 +1,115 @@
+import asyncio
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Limite de operaciones de escritura por batch de Firestore.
+MAX_BATCH_WRITES = 500
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'FIRESTORE_GET_ALL_MAX_WORKERS', 8),
+            thread_name_prefix='firestore-get-all',
+        )
+    return _executor
+
+
+def _chunks(items: List[str], size: int) -> Iterable[List[str]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _unique_ids(doc_ids: Iterable[str]) -> List[str]:
+    return list(dict.fromkeys(doc_id for doc_id in doc_ids if doc_id))
+
+
+def fetch_documents(client, collection: str, doc_ids: Iterable[str], chunk_size: Optional[int] = None,
+                    field_paths: Optional[Iterable[str]] = None) -> Dict:
+    # Multi-get de documentos de una coleccion: una llamada get_all por chunk,
+    # con los chunks corriendo en paralelo. Devuelve {doc_id: snapshot}; con
+    # field_paths los snapshots traen solo esos campos.
+    ids = _unique_ids(doc_ids)
+    if not ids:
+        return {}
+
+    size = chunk_size or getattr(settings, 'FIRESTORE_GET_ALL_CHUNK_SIZE', 100)
+    collection_ref = client.collection(collection)
+
+    def load(chunk: List[str]) -> List:
+        refs = [collection_ref.document(doc_id) for doc_id in chunk]
+        return list(client.get_all(refs, field_paths=field_paths))
+
+    chunks = list(_chunks(ids, size))
+    if len(chunks) == 1:
+        results = [load(chunks[0])]
+    else:
+        # Cada chunk corre con una copia del contexto del request para que
+        # sus lecturas se atribuyan a la vista en las metricas.
+        futures = [_get_executor().submit(contextvars.copy_context().run, load, chunk) for chunk in chunks]
+        results = [future.result() for future in futures]
+
+    return {snap.id: snap for chunk in results for snap in chunk}
+
+
+async def afetch_documents(client, collection: str, doc_ids: Iterable[str], chunk_size: Optional[int] = None,
+                           field_paths: Optional[Iterable[str]] = None) -> Dict:
+    # Igual que fetch_documents pero con un AsyncClient: los chunks corren
+    # concurrentes en el event loop en lugar de en el pool de hilos.
+    ids = _unique_ids(doc_ids)
+    if not ids:
+        return {}
+
+    size = chunk_size or getattr(settings, 'FIRESTORE_GET_ALL_CHUNK_SIZE', 100)
+    collection_ref = client.collection(collection)
+
+    async def load(chunk: List[str]) -> List:
+        refs = [collection_ref.document(doc_id) for doc_id in chunk]
+        return [snap async for snap in client.get_all(refs, field_paths=field_paths)]
+
+    results = await asyncio.gather(*(load(chunk) for chunk in _chunks(ids, size)))
+    return {snap.id: snap for chunk in results for snap in chunk}
+
+
+def commit_updates(client, updates: List[Tuple], batch_size: int = MAX_BATCH_WRITES) -> int:
+    # Aplica [(referencia, campos)] como update() en batches de hasta 500
+    # operaciones, commiteados en paralelo. Devuelve cuantos se escribieron.
+    from google.api_core.exceptions import NotFound
+
+    size = max(1, min(batch_size, MAX_BATCH_WRITES))
+
+    def commit(chunk: List[Tuple]) -> int:
+        batch = client.batch()
+        for reference, fields in chunk:
+            batch.update(reference, fields)
+        try:
+            batch.commit()
+            return len(chunk)
+        except NotFound:
+            # Un documento borrado entre la lectura y el commit hace fallar
+            # el batch entero: se reintenta de a uno, salteando los borrados.
+            # La referencia se rearma desde client: las de los snapshots no
+            # pasan por los proxies de metricas y cache.
+            written = 0
+            for reference, fields in chunk:
+                try:
+                    client.document(reference.path).update(fields)
+                    written += 1
+                except NotFound:
+                    logger.info('Documento borrado antes de actualizarlo: %s', reference.path)
+            return written
+
+    chunks = list(_chunks(updates, size))
+    if len(chunks) <= 1:
+        return sum(commit(chunk) for chunk in chunks)
+    futures = [_get_executor().submit(contextvars.copy_context().run, commit, chunk) for chunk in chunks]
+    return sum(future.result() for future in futures)
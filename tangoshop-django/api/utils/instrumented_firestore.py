@@ -0,0 +1,151 @@
+import inspect
+import time
+from collections.abc import Iterator
+from typing import Optional
+
+from api.utils.metrics import record_firestore
+
+# Proxy sobre el cliente de Firestore (real o en memoria) que mide cada
+# operacion: envuelve las referencias, queries y batches que devuelve el
+# cliente y registra en api.utils.metrics las llamadas que van al servidor.
+# Los snapshots se devuelven sin envolver: su .reference es la del cliente,
+# asi que las escrituras se hacen con una referencia armada desde db.
+
+# Atributos que distinguen a los objetos que hay que seguir envolviendo.
+_CHAINABLE = ('where', 'document', 'collection', 'commit')
+_WRITES = ('set', 'update', 'create', 'delete')
+
+
+def _is_chainable(value) -> bool:
+    if isinstance(value, (str, bytes, dict, list, tuple)) or value is None:
+        return False
+    return any(hasattr(value, name) for name in _CHAINABLE)
+
+
+def _wrap(value):
+    if isinstance(value, tuple):
+        # CollectionReference.add devuelve (update_time, referencia).
+        return tuple(_wrap(item) for item in value)
+    return InstrumentedFirestore(value) if _is_chainable(value) else value
+
+
+def unwrap(value):
+    if isinstance(value, InstrumentedFirestore):
+        return object.__getattribute__(value, '_target')
+    if isinstance(value, (list, tuple)):
+        return type(value)(unwrap(item) for item in value)
+    return value
+
+
+def _documents(operation: str, result) -> int:
+    if operation == 'get':
+        return 1 if getattr(result, 'exists', False) else 0
+    if operation in ('query', 'commit'):
+        return len(result) if isinstance(result, list) else 0
+    if operation == 'listen':
+        return 0
+    return 1
+
+
+class InstrumentedFirestore:
+    __slots__ = ('_target',)
+
+    def __init__(self, target) -> None:
+        object.__setattr__(self, '_target', target)
+
+    def __getattr__(self, name):
+        target = object.__getattribute__(self, '_target')
+        value = getattr(target, name)
+        if not callable(value):
+            return _wrap(value)
+
+        operation = self._operation(target, name)
+
+        def call(*args, **kwargs):
+            args = [unwrap(arg) for arg in args]
+            kwargs = {key: unwrap(arg) for key, arg in kwargs.items()}
+            if operation is None:
+                return _wrap(value(*args, **kwargs))
+            return _measure(operation, value, args, kwargs)
+
+        return call
+
+    def __setattr__(self, name, value) -> None:
+        setattr(object.__getattribute__(self, '_target'), name, value)
+
+    def __eq__(self, other) -> bool:
+        return object.__getattribute__(self, '_target') == unwrap(other)
+
+    def __hash__(self) -> int:
+        return hash(object.__getattribute__(self, '_target'))
+
+    def __repr__(self) -> str:
+        return f'<Instrumented {object.__getattribute__(self, "_target")!r}>'
+
+    @staticmethod
+    def _operation(target, name: str) -> Optional[str]:
+        if name in ('get', 'stream'):
+            # Sobre una coleccion o query es una consulta; sobre un documento
+            # un get (stream no existe en DocumentReference).
+            return 'query' if hasattr(target, 'where') else 'get'
+        if name in _WRITES:
+            # En un WriteBatch solo se encola; la escritura es el commit.
+            return None if hasattr(target, 'commit') else name
+        if name in ('get_all', 'add', 'commit'):
+            return name
+        if name == 'on_snapshot':
+            return 'listen'
+        return None
+
+
+def _measure(operation: str, method, args, kwargs):
+    start = time.perf_counter()
+    try:
+        result = method(*args, **kwargs)
+    except Exception:
+        record_firestore(operation, time.perf_counter() - start, 0)
+        raise
+
+    if inspect.isasyncgen(result):
+        return _measure_async_iterator(operation, start, result)
+    if inspect.isawaitable(result):
+        return _measure_awaitable(operation, start, result)
+    if isinstance(result, Iterator):
+        # get_all y stream devuelven iteradores: el RPC corre mientras se
+        # consumen, asi que se mide hasta agotarlos.
+        return _measure_iterator(operation, start, result)
+
+    record_firestore(operation, time.perf_counter() - start, _documents(operation, result))
+    return _wrap(result)
+
+
+def _measure_iterator(operation: str, start: float, iterator):
+    count = 0
+    try:
+        for item in iterator:
+            if getattr(item, 'exists', True):
+                count += 1
+            yield item
+    finally:
+        record_firestore(operation, time.perf_counter() - start, count)
+
+
+async def _measure_async_iterator(operation: str, start: float, iterator):
+    count = 0
+    try:
+        async for item in iterator:
+            if getattr(item, 'exists', True):
+                count += 1
+            yield item
+    finally:
+        record_firestore(operation, time.perf_counter() - start, count)
+
+
+async def _measure_awaitable(operation: str, start: float, awaitable):
+    documents = 0
+    try:
+        result = await awaitable
+        documents = _documents(operation, result)
+        return _wrap(result)
+    finally:
+        record_firestore(operation, time.perf_counter() - start, documents)
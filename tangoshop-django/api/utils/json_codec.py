@@ -0,0 +1,94 @@
+import datetime
+
+import orjson
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# JSON con orjson para las respuestas de DRF, los JsonResponse de las vistas
+# async, los decoradores y el middleware. Cada uno conserva el formato del
+# encoder al que reemplaza: dumps el de DRF (fechas con microsegundos, tambien
+# los timestamps de Firestore) y JSONResponse el de Django (fechas truncadas a
+# milisegundos, Decimal como string). En ambos U+2028 y U+2029 salen
+# escapados. SERVER_TIMESTAMP se serializa como null porque su valor lo
+# asigna el servidor recien al escribir. Diferencia conocida: NaN e Infinity
+# salen como null, mientras que DRF los rechaza con ValueError y JsonResponse
+# escribe NaN, que no es JSON valido.
+
+OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+_drf_encoder = JSONEncoder()
+_django_encoder = DjangoJSONEncoder()
+_LINE_SEPARATOR, _PARAGRAPH_SEPARATOR = '\u2028'.encode(), '\u2029'.encode()
+
+
+def _sentinel(obj) -> bool:
+    from google.cloud.firestore_v1.transforms import Sentinel
+    return isinstance(obj, Sentinel)
+
+
+def _drf_default(obj):
+    # Aca llegan solo los tipos que orjson no serializa solo. El mas comun es
+    # DatetimeWithNanoseconds (orjson solo acepta datetime exacto), que se
+    # resuelve aca mismo igual que en el encoder de DRF.
+    if isinstance(obj, datetime.datetime):
+        representation = obj.isoformat()
+        if representation.endswith('+00:00'):
+            representation = representation[:-6] + 'Z'
+        return representation
+    return None if _sentinel(obj) else _drf_encoder.default(obj)
+
+
+def _django_default(obj):
+    return None if _sentinel(obj) else _django_encoder.default(obj)
+
+
+def _escape_separators(content: bytes) -> bytes:
+    # Como JSONRenderer: estos caracteres son validos en JSON pero cortan un
+    # string literal de JavaScript.
+    if _LINE_SEPARATOR in content:
+        content = content.replace(_LINE_SEPARATOR, b'\\u2028')
+    if _PARAGRAPH_SEPARATOR in content:
+        content = content.replace(_PARAGRAPH_SEPARATOR, b'\\u2029')
+    return content
+
+
+def dumps(data, indent: bool = False) -> bytes:
+    content = orjson.dumps(data, default=_drf_default, option=OPTIONS | (orjson.OPT_INDENT_2 if indent else 0))
+    return _escape_separators(content)
+
+
+def _dumps_django(data) -> bytes:
+    content = orjson.dumps(data, default=_django_default, option=OPTIONS | orjson.OPT_PASSTHROUGH_DATETIME)
+    return _escape_separators(content)
+
+
+loads = orjson.loads
+
+
+class JSONResponse(HttpResponse):
+    # Reemplazo de django.http.JsonResponse.
+    def __init__(self, data, **kwargs) -> None:
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=_dumps_django(data), **kwargs)
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        return dumps(data, indent=bool(indent))
+
+
+class ORJSONParser(JSONParser):
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read() if stream is not None else b'')
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+_MISSING = object()
+
+
+class LRUCache:
+    # Cache LRU thread-safe con limite de entradas, limite opcional de tamaño
+    # total (segun size_fn) y vencimiento opcional por entrada.
+    def __init__(
+        self,
+        max_entries: int,
+        max_size: Optional[int] = None,
+        size_fn: Optional[Callable[[Any], int]] = None,
+        ttl: Optional[float] = None,
+        on_evict: Optional[Callable[[Hashable, Any], None]] = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.size_fn = size_fn or (lambda _value: 1)
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._data: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._size = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING, count=False) is not _MISSING
+
+    def get(self, key: Hashable, default: Any = None, count: bool = True) -> Any:
+        expired = _MISSING
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[1] is not None and item[1] <= time.monotonic():
+                expired = self._remove(key)
+                item = None
+            if item is None:
+                if count:
+                    self.misses += 1
+            else:
+                self._data.move_to_end(key)
+                if count:
+                    self.hits += 1
+                return item[0]
+
+        if expired is not _MISSING and self.on_evict:
+            self.on_evict(key, expired)
+        return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> bool:
+        ttl = self.ttl if ttl is None else ttl
+        if ttl is not None and ttl <= 0:
+            return False
+        size = self.size_fn(value)
+        if self.max_size is not None and size > self.max_size:
+            self.delete(key)
+            return False
+
+        evicted = []
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            expires_at = time.monotonic() + ttl if ttl is not None else None
+            self._data[key] = (value, expires_at, size)
+            self._size += size
+            while len(self._data) > self.max_entries or (self.max_size is not None and self._size > self.max_size):
+                old_key, (old_value, _, old_size) = self._data.popitem(last=False)
+                self._size -= old_size
+                self.evictions += 1
+                evicted.append((old_key, old_value))
+
+        if self.on_evict:
+            for old_key, old_value in evicted:
+                self.on_evict(old_key, old_value)
+        return True
+
+    def delete(self, key: Hashable) -> Any:
+        with self._lock:
+            if key not in self._data:
+                return None
+            return self._remove(key)
+
+    def evict_oldest(self) -> bool:
+        with self._lock:
+            if not self._data:
+                return False
+            key, (value, _, size) = self._data.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+        if self.on_evict:
+            self.on_evict(key, value)
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            values = list(self._data.items())
+            self._data.clear()
+            self._size = 0
+            self.hits = self.misses = self.evictions = 0
+        if self.on_evict:
+            for key, (value, _, _) in values:
+                self.on_evict(key, value)
+
+    def _remove(self, key: Hashable) -> Any:
+        value, _, size = self._data.pop(key)
+        self._size -= size
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._data),
+                'size': self._size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hitRate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,776 @@
+import asyncio
+import copy
+import functools
+import logging
+import queue
+import random
+import string
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition, NotFound
+from google.cloud.firestore_v1.transforms import DELETE_FIELD, SERVER_TIMESTAMP
+from google.cloud.firestore_v1.watch import ChangeType, DocumentChange
+
+# Backend de Firestore en memoria para tests, benchmarks y correr la API sin
+# un proyecto de Firebase. Implementa el subconjunto del cliente que usan los
+# servicios: documentos (get/set/create/update/delete), consultas con where,
+# order_by, cursores, limit y select, add, batch, get_all, on_snapshot y
+# write_option(last_update_time=...) como precondicion de update y delete. Cada
+# round trip puede demorarse `latency` segundos para simular la red, y se
+# cuentan los RPCs y los documentos leidos y escritos.
+
+logger = logging.getLogger(__name__)
+
+_DOCUMENT_ID = '__name__'
+_AUTO_ID_CHARS = string.ascii_letters + string.digits
+_MISSING = object()
+
+
+def _now() -> DatetimeWithNanoseconds:
+    return DatetimeWithNanoseconds.now(timezone.utc)
+
+
+def _auto_id() -> str:
+    return ''.join(random.choices(_AUTO_ID_CHARS, k=20))
+
+
+def _get_field(data: Dict, field_path: str):
+    value = data
+    for part in field_path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _set_field(data: Dict, field_path: str, value) -> None:
+    parts = field_path.split('.')
+    for part in parts[:-1]:
+        data = data.setdefault(part, {})
+    if value is DELETE_FIELD:
+        data.pop(parts[-1], None)
+    else:
+        data[parts[-1]] = value
+
+
+def _resolve(value, timestamp):
+    if value is SERVER_TIMESTAMP:
+        return timestamp
+    if isinstance(value, dict):
+        return {key: _resolve(item, timestamp) for key, item in value.items() if item is not DELETE_FIELD}
+    if isinstance(value, list):
+        return [_resolve(item, timestamp) for item in value]
+    return copy.deepcopy(value)
+
+
+def _merge(target: Dict, source: Dict) -> None:
+    for key, value in source.items():
+        if value is DELETE_FIELD:
+            target.pop(key, None)
+        elif isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = value
+
+
+# Orden entre tipos de Firestore: null < bool < numeros < fechas < strings
+# < bytes < referencias < arrays < maps.
+def _order_key(value):
+    if value is None:
+        return (0,)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, datetime):
+        return (3, value)
+    if isinstance(value, str):
+        return (4, value)
+    if isinstance(value, bytes):
+        return (5, value)
+    if isinstance(value, MemoryDocumentReference):
+        return (6, value.path)
+    if isinstance(value, (list, tuple)):
+        return (8, tuple(_order_key(item) for item in value))
+    if isinstance(value, dict):
+        return (9, tuple((key, _order_key(item)) for key, item in sorted(value.items())))
+    return (10, repr(value))
+
+
+def _doc_id(value) -> str:
+    if isinstance(value, MemoryDocumentReference):
+        return value.id
+    return str(value).rsplit('/', 1)[-1]
+
+
+def _matches(value, op: str, expected) -> bool:
+    if value is _MISSING:
+        return False
+    if op == '==':
+        return value == expected
+    if op == '!=':
+        return value != expected and value is not None
+    if op == 'in':
+        return any(value == item for item in expected)
+    if op == 'not-in':
+        return value is not None and all(value != item for item in expected)
+    if op == 'array_contains':
+        return isinstance(value, list) and expected in value
+    if op == 'array_contains_any':
+        return isinstance(value, list) and any(item in value for item in expected)
+    if _order_key(value)[0] != _order_key(expected)[0]:
+        return False
+    if op == '<':
+        return _order_key(value) < _order_key(expected)
+    if op == '<=':
+        return _order_key(value) <= _order_key(expected)
+    if op == '>':
+        return _order_key(value) > _order_key(expected)
+    if op == '>=':
+        return _order_key(value) >= _order_key(expected)
+    raise ValueError(f'Operador no soportado: {op}')
+
+
+class _Stored:
+    __slots__ = ('data', 'create_time', 'update_time')
+
+    def __init__(self, data: Dict, create_time, update_time) -> None:
+        self.data = data
+        self.create_time = create_time
+        self.update_time = update_time
+
+
+class MemoryDocumentSnapshot:
+    def __init__(self, reference, stored: Optional[_Stored], read_time, field_paths: Optional[Iterable[str]] = None) -> None:
+        self.reference = reference
+        self.id = reference.id
+        self.exists = stored is not None
+        self.read_time = read_time
+        self.create_time = stored.create_time if stored else None
+        self.update_time = stored.update_time if stored else None
+        self._data = None
+        if stored is not None:
+            data = stored.data
+            if field_paths is not None:
+                selected = {}
+                for field_path in field_paths:
+                    value = _get_field(data, field_path)
+                    if value is not _MISSING:
+                        _set_field(selected, field_path, value)
+                data = selected
+            self._data = data
+
+    def to_dict(self) -> Optional[Dict]:
+        return copy.deepcopy(self._data) if self.exists else None
+
+    def get(self, field_path: str):
+        value = _get_field(self._data or {}, field_path)
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return copy.deepcopy(value)
+
+    def __repr__(self) -> str:
+        return f'<MemoryDocumentSnapshot {self.reference.path} exists={self.exists}>'
+
+
+class _Watch:
+    def __init__(self, client, target, callback) -> None:
+        self.client = client
+        self.target = target
+        self.callback = callback
+        self.last = _MISSING
+        self.documents: Dict[str, Tuple[int, MemoryDocumentSnapshot]] = {}
+        self.is_active = True
+
+    def unsubscribe(self) -> None:
+        self.is_active = False
+        self.client._remove_watch(self)
+
+    def deliver(self, snapshots: List) -> None:
+        current = [(snap.id, snap.update_time) for snap in snapshots]
+        if current == self.last:
+            return
+        self.last = current
+        self.callback(snapshots, self._changes(snapshots), _now())
+
+    def _changes(self, snapshots: List) -> List[DocumentChange]:
+        # Como en Firestore: la primera entrega trae todo como ADDED y las
+        # siguientes solo lo que entro, cambio o salio.
+        present = {snap.id: (index, snap) for index, snap in enumerate(snap for snap in snapshots if snap.exists)}
+        changes = [
+            DocumentChange(ChangeType.REMOVED, snap, index, -1)
+            for doc_id, (index, snap) in self.documents.items() if doc_id not in present
+        ]
+        for doc_id, (index, snap) in present.items():
+            previous = self.documents.get(doc_id)
+            if previous is None:
+                changes.append(DocumentChange(ChangeType.ADDED, snap, -1, index))
+            elif previous[1].update_time != snap.update_time:
+                changes.append(DocumentChange(ChangeType.MODIFIED, snap, previous[0], index))
+        self.documents = present
+        return changes
+
+
+class MemoryWriteOption:
+    def __init__(self, last_update_time) -> None:
+        self.last_update_time = last_update_time
+
+
+class MemoryDocumentReference:
+    def __init__(self, client, collection_path: str, doc_id: str) -> None:
+        self._client = client
+        self._collection_path = collection_path
+        self.id = doc_id
+        self.path = f'{collection_path}/{doc_id}'
+
+    @property
+    def parent(self):
+        return MemoryCollectionReference(self._client, self._collection_path)
+
+    def collection(self, name: str):
+        return MemoryCollectionReference(self._client, f'{self.path}/{name}')
+
+    def get(self, field_paths=None, transaction=None, retry=None, timeout=None) -> MemoryDocumentSnapshot:
+        self._client._round_trip()
+        return self._get(field_paths)
+
+    def set(self, document_data: Dict, merge: bool = False, retry=None, timeout=None):
+        return self._client._commit([('set', self, document_data, merge)])[0]
+
+    def create(self, document_data: Dict, retry=None, timeout=None):
+        return self._client._commit([('create', self, document_data, False)])[0]
+
+    def update(self, field_updates: Dict, option=None, retry=None, timeout=None):
+        return self._client._commit([('update', self, field_updates, option)])[0]
+
+    def delete(self, option=None, retry=None, timeout=None):
+        return self._client._commit([('delete', self, None, option)])[0]
+
+    def on_snapshot(self, callback):
+        return self._client._add_watch(self, callback)
+
+    def _get(self, field_paths=None) -> MemoryDocumentSnapshot:
+        snapshot = self._client._read(self, field_paths)
+        self._client._count(reads=1)
+        return snapshot
+
+    def _snapshots(self) -> List[MemoryDocumentSnapshot]:
+        return [self._client._read(self)]
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, MemoryDocumentReference) and other.path == self.path
+
+    def __hash__(self) -> int:
+        return hash(self.path)
+
+    def __repr__(self) -> str:
+        return f'<MemoryDocumentReference {self.path}>'
+
+
+class MemoryQuery:
+    ASCENDING = 'ASCENDING'
+    DESCENDING = 'DESCENDING'
+
+    def __init__(self, client, collection_path: str, filters=(), orders=(), limit=None, offset=0,
+                 start=None, end=None, projection=None) -> None:
+        self._client = client
+        self._collection_path = collection_path
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._offset = offset
+        self._start = start
+        self._end = end
+        self._projection = projection
+
+    def _copy(self, **changes):
+        state = {
+            'filters': self._filters, 'orders': self._orders, 'limit': self._limit, 'offset': self._offset,
+            'start': self._start, 'end': self._end, 'projection': self._projection,
+        }
+        state.update(changes)
+        return MemoryQuery(self._client, self._collection_path, **state)
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        if field_path == _DOCUMENT_ID:
+            value = [_doc_id(item) for item in value] if op_string in ('in', 'not-in') else _doc_id(value)
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path: str, direction: str = ASCENDING):
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count: int):
+        return self._copy(limit=count)
+
+    def offset(self, num_to_skip: int):
+        return self._copy(offset=num_to_skip)
+
+    def select(self, field_paths: Iterable[str]):
+        return self._copy(projection=list(field_paths))
+
+    def start_at(self, document_fields_or_snapshot):
+        return self._copy(start=(document_fields_or_snapshot, False))
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._copy(start=(document_fields_or_snapshot, True))
+
+    def end_before(self, document_fields_or_snapshot):
+        return self._copy(end=(document_fields_or_snapshot, False))
+
+    def end_at(self, document_fields_or_snapshot):
+        return self._copy(end=(document_fields_or_snapshot, True))
+
+    def get(self, transaction=None, retry=None, timeout=None) -> List[MemoryDocumentSnapshot]:
+        self._client._round_trip()
+        return self._get()
+
+    def stream(self, transaction=None, retry=None, timeout=None):
+        return iter(self.get())
+
+    def on_snapshot(self, callback):
+        return self._client._add_watch(self, callback)
+
+    def _get(self) -> List[MemoryDocumentSnapshot]:
+        snapshots = self._snapshots()
+        self._client._count(reads=max(len(snapshots), 1))
+        return snapshots
+
+    def _value(self, doc_id: str, data: Dict, field_path: str):
+        return doc_id if field_path == _DOCUMENT_ID else _get_field(data, field_path)
+
+    def _sort_key(self, doc_id: str, data: Dict):
+        key = []
+        for field_path, direction in self._orders:
+            value = _order_key(self._value(doc_id, data, field_path))
+            key.append(_Reversed(value) if direction == self.DESCENDING else value)
+        if all(field_path != _DOCUMENT_ID for field_path, _ in self._orders):
+            descending = bool(self._orders) and self._orders[-1][1] == self.DESCENDING
+            key.append(_Reversed(_order_key(doc_id)) if descending else _order_key(doc_id))
+        return tuple(key)
+
+    def _cursor_key(self, cursor):
+        if isinstance(cursor, MemoryDocumentSnapshot):
+            return self._sort_key(cursor.id, cursor._data or {})
+        values = {field_path: (_doc_id(value) if field_path == _DOCUMENT_ID else value) for field_path, value in cursor.items()}
+        key = []
+        for field_path, direction in self._orders:
+            value = _order_key(values.get(field_path))
+            key.append(_Reversed(value) if direction == self.DESCENDING else value)
+        return tuple(key)
+
+    def _candidate_ids(self) -> Optional[List[str]]:
+        # Un filtro por id de documento se resuelve con lookups directos en
+        # lugar de recorrer la coleccion.
+        for field_path, op, value in self._filters:
+            if field_path == _DOCUMENT_ID and op == '==':
+                return [value]
+            if field_path == _DOCUMENT_ID and op == 'in':
+                return list(value)
+        return None
+
+    def _snapshots(self) -> List[MemoryDocumentSnapshot]:
+        rows = []
+        for doc_id, stored in self._client._collection_items(self._collection_path, self._candidate_ids()):
+            data = stored.data
+            if not all(_matches(self._value(doc_id, data, field_path), op, value) for field_path, op, value in self._filters):
+                continue
+            if any(self._value(doc_id, data, field_path) is _MISSING for field_path, _ in self._orders):
+                continue
+            rows.append((self._sort_key(doc_id, data), doc_id, stored))
+        rows.sort(key=lambda row: row[0])
+
+        if self._start is not None:
+            cursor, after = self._start
+            bound = self._cursor_key(cursor)
+            rows = [row for row in rows if (row[0][:len(bound)] > bound if after else row[0][:len(bound)] >= bound)]
+        if self._end is not None:
+            cursor, inclusive = self._end
+            bound = self._cursor_key(cursor)
+            rows = [row for row in rows if (row[0][:len(bound)] <= bound if inclusive else row[0][:len(bound)] < bound)]
+
+        rows = rows[self._offset:]
+        if self._limit is not None:
+            rows = rows[:self._limit]
+
+        read_time = _now()
+        return [
+            MemoryDocumentSnapshot(MemoryDocumentReference(self._client, self._collection_path, doc_id), stored,
+                                   read_time, self._projection)
+            for _, doc_id, stored in rows
+        ]
+
+
+@functools.total_ordering
+class _Reversed:
+    __slots__ = ('value',)
+
+    def __init__(self, value) -> None:
+        self.value = value
+
+    def __eq__(self, other) -> bool:
+        return self.value == other.value
+
+    def __lt__(self, other) -> bool:
+        return self.value > other.value
+
+
+class MemoryCollectionReference(MemoryQuery):
+    def __init__(self, client, path: str) -> None:
+        super().__init__(client, path)
+        self.id = path.rsplit('/', 1)[-1]
+
+    def document(self, document_id: Optional[str] = None) -> MemoryDocumentReference:
+        return MemoryDocumentReference(self._client, self._collection_path, document_id or _auto_id())
+
+    def add(self, document_data: Dict, document_id: Optional[str] = None, retry=None, timeout=None):
+        reference = self.document(document_id)
+        write_result = reference.create(document_data)
+        return write_result.update_time, reference
+
+    def list_documents(self) -> List[MemoryDocumentReference]:
+        return [self.document(doc_id) for doc_id, _ in self._client._collection_items(self._collection_path)]
+
+
+class MemoryWriteResult:
+    def __init__(self, update_time) -> None:
+        self.update_time = update_time
+
+
+class MemoryWriteBatch:
+    def __init__(self, client) -> None:
+        self._client = client
+        self._writes: List[Tuple] = []
+
+    def set(self, reference, document_data: Dict, merge: bool = False):
+        self._writes.append(('set', reference, document_data, merge))
+        return self
+
+    def create(self, reference, document_data: Dict):
+        self._writes.append(('create', reference, document_data, False))
+        return self
+
+    def update(self, reference, field_updates: Dict, option=None):
+        self._writes.append(('update', reference, field_updates, option))
+        return self
+
+    def delete(self, reference, option=None):
+        self._writes.append(('delete', reference, None, option))
+        return self
+
+    def __len__(self) -> int:
+        return len(self._writes)
+
+    def commit(self, retry=None, timeout=None) -> List[MemoryWriteResult]:
+        writes, self._writes = self._writes, []
+        return self._client._commit(writes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+
+
+class MemoryFirestore:
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.ops = Counter()
+        self._documents: Dict[str, Dict[str, _Stored]] = {}
+        self._lock = threading.RLock()
+        self._watches: List[_Watch] = []
+        self._events: Optional[queue.Queue] = None
+
+    # API del cliente
+
+    def collection(self, collection_path: str) -> MemoryCollectionReference:
+        return MemoryCollectionReference(self, collection_path)
+
+    def document(self, document_path: str) -> MemoryDocumentReference:
+        collection_path, doc_id = document_path.rsplit('/', 1)
+        return MemoryDocumentReference(self, collection_path, doc_id)
+
+    def batch(self) -> MemoryWriteBatch:
+        return MemoryWriteBatch(self)
+
+    @staticmethod
+    def write_option(last_update_time) -> MemoryWriteOption:
+        return MemoryWriteOption(last_update_time)
+
+    def get_all(self, references, field_paths=None, transaction=None, retry=None, timeout=None):
+        references = list(references)
+        self._round_trip()
+        for reference in references:
+            yield reference._get(field_paths)
+
+    def collections(self) -> List[MemoryCollectionReference]:
+        with self._lock:
+            return [self.collection(path) for path in self._documents if '/' not in path]
+
+    # Datos y contadores
+
+    def load(self, collections: Dict[str, Dict[str, Dict]]) -> None:
+        # Carga {coleccion: {doc_id: data}} sin contar operaciones.
+        timestamp = _now()
+        with self._lock:
+            for collection_path, docs in collections.items():
+                target = self._documents.setdefault(collection_path, {})
+                for doc_id, data in docs.items():
+                    target[doc_id] = _Stored(_resolve(data, timestamp), timestamp, timestamp)
+        self._notify()
+
+    def dump(self) -> Dict[str, Dict[str, Dict]]:
+        with self._lock:
+            return {
+                collection_path: {doc_id: copy.deepcopy(stored.data) for doc_id, stored in docs.items()}
+                for collection_path, docs in self._documents.items()
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._documents.clear()
+        self.reset_stats()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = {'rpcs': 0, 'reads': 0, 'writes': 0}
+            stats.update(self.ops)
+            stats['listeners'] = len(self._watches)
+            return stats
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.ops.clear()
+
+    def wait_for_listeners(self) -> None:
+        if self._events is not None:
+            self._events.join()
+
+    # Internos
+
+    def _round_trip(self) -> None:
+        self._count(rpcs=1)
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def _count(self, **counts) -> None:
+        with self._lock:
+            self.ops.update(counts)
+
+    def _collection_items(self, collection_path: str, doc_ids: Optional[List[str]] = None) -> List[Tuple[str, _Stored]]:
+        with self._lock:
+            docs = self._documents.get(collection_path, {})
+            if doc_ids is None:
+                return list(docs.items())
+            return [(doc_id, docs[doc_id]) for doc_id in dict.fromkeys(doc_ids) if doc_id in docs]
+
+    def _read(self, reference: MemoryDocumentReference, field_paths=None) -> MemoryDocumentSnapshot:
+        with self._lock:
+            stored = self._documents.get(reference._collection_path, {}).get(reference.id)
+        return MemoryDocumentSnapshot(reference, stored, _now(), field_paths)
+
+    def _commit(self, writes: List[Tuple]) -> List[MemoryWriteResult]:
+        self._round_trip()
+        return self._apply(writes)
+
+    def _apply(self, writes: List[Tuple]) -> List[MemoryWriteResult]:
+        timestamp = _now()
+        with self._lock:
+            # Se validan todas las escrituras antes de aplicar ninguna: el
+            # commit es atomico como en Firestore.
+            pending = {}
+            for kind, reference, _, option in writes:
+                key = (reference._collection_path, reference.id)
+                stored = self._documents.get(reference._collection_path, {}).get(reference.id)
+                exists = pending.get(key, stored is not None)
+                if kind == 'create' and exists:
+                    raise AlreadyExists(f'Document already exists: {reference.path}')
+                if kind == 'update' and not exists:
+                    raise NotFound(f'No document to update: {reference.path}')
+                if kind in ('update', 'delete') and isinstance(option, MemoryWriteOption) and \
+                        (key in pending or stored is None or stored.update_time != option.last_update_time):
+                    raise FailedPrecondition(f'Document was modified: {reference.path}')
+                pending[key] = kind != 'delete'
+
+            for kind, reference, data, merge in writes:
+                docs = self._documents.setdefault(reference._collection_path, {})
+                current = docs.get(reference.id)
+                if kind == 'delete':
+                    docs.pop(reference.id, None)
+                    continue
+                if kind == 'update':
+                    updated = copy.deepcopy(current.data)
+                    for field_path, value in data.items():
+                        _set_field(updated, field_path, _resolve(value, timestamp) if value is not DELETE_FIELD else value)
+                    new_data = updated
+                elif merge and current is not None:
+                    new_data = copy.deepcopy(current.data)
+                    _merge(new_data, {key: (value if value is DELETE_FIELD else _resolve(value, timestamp)) for key, value in data.items()})
+                else:
+                    new_data = _resolve(data, timestamp)
+                create_time = current.create_time if current is not None else timestamp
+                docs[reference.id] = _Stored(new_data, create_time, timestamp)
+            self.ops.update(writes=len(writes))
+
+        self._notify()
+        return [MemoryWriteResult(timestamp) for _ in writes]
+
+    def _add_watch(self, target, callback) -> _Watch:
+        watch = _Watch(self, target, callback)
+        with self._lock:
+            self._watches.append(watch)
+        # El estado inicial se calcula en el hilo de listeners, no en el del
+        # request que se suscribe. Como en Firestore, si hay escrituras antes
+        # de la entrega los estados intermedios pueden llegar combinados.
+        self._dispatch(watch, initial=True)
+        return watch
+
+    def _remove_watch(self, watch: _Watch) -> None:
+        with self._lock:
+            if watch in self._watches:
+                self._watches.remove(watch)
+
+    def _notify(self) -> None:
+        with self._lock:
+            watches = list(self._watches)
+        for watch in watches:
+            self._dispatch(watch)
+
+    def _dispatch(self, watch: _Watch, initial: bool = False) -> None:
+        # El resultado se toma al momento de la escritura, pero los callbacks
+        # corren en un hilo propio, como los listeners reales, para que nunca
+        # se ejecuten dentro del commit que los dispara.
+        snapshots = None if initial else watch.target._snapshots()
+        with self._lock:
+            if self._events is None:
+                self._events = queue.Queue()
+                threading.Thread(target=self._run_events, name='memory-firestore-watch', daemon=True).start()
+        self._events.put((watch, snapshots))
+
+    def _run_events(self) -> None:
+        while True:
+            watch, snapshots = self._events.get()
+            try:
+                if watch.is_active:
+                    watch.deliver(snapshots if snapshots is not None else watch.target._snapshots())
+            except Exception:
+                logger.exception('Error en un listener de %r', watch.target)
+            finally:
+                self._events.task_done()
+
+
+
+# Cliente async sobre el mismo almacenamiento: cada round trip espera con
+# asyncio.sleep en lugar de bloquear el event loop.
+
+class _AsyncDocumentReference:
+    def __init__(self, client, reference: MemoryDocumentReference) -> None:
+        self._client = client
+        self._reference = reference
+        self.id = reference.id
+        self.path = reference.path
+
+    def collection(self, name: str):
+        return _AsyncQuery(self._client, self._reference.collection(name))
+
+    async def get(self, field_paths=None, transaction=None, retry=None, timeout=None):
+        await self._client._round_trip()
+        return self._reference._get(field_paths)
+
+    async def set(self, document_data: Dict, merge: bool = False, retry=None, timeout=None):
+        return (await self._client._commit([('set', self._reference, document_data, merge)]))[0]
+
+    async def create(self, document_data: Dict, retry=None, timeout=None):
+        return (await self._client._commit([('create', self._reference, document_data, False)]))[0]
+
+    async def update(self, field_updates: Dict, option=None, retry=None, timeout=None):
+        return (await self._client._commit([('update', self._reference, field_updates, option)]))[0]
+
+    async def delete(self, option=None, retry=None, timeout=None):
+        return (await self._client._commit([('delete', self._reference, None, option)]))[0]
+
+
+class _AsyncQuery:
+    def __init__(self, client, query: MemoryQuery) -> None:
+        self._client = client
+        self._query = query
+
+    def document(self, document_id: Optional[str] = None) -> _AsyncDocumentReference:
+        return _AsyncDocumentReference(self._client, self._query.document(document_id))
+
+    async def add(self, document_data: Dict, document_id: Optional[str] = None, retry=None, timeout=None):
+        reference = self.document(document_id)
+        write_result = await reference.create(document_data)
+        return write_result.update_time, reference
+
+    def __getattr__(self, name):
+        method = getattr(self._query, name)
+
+        @functools.wraps(method)
+        def chained(*args, **kwargs):
+            return _AsyncQuery(self._client, method(*args, **kwargs))
+        return chained
+
+    async def get(self, transaction=None, retry=None, timeout=None):
+        await self._client._round_trip()
+        return self._query._get()
+
+    async def stream(self, transaction=None, retry=None, timeout=None):
+        for snapshot in await self.get():
+            yield snapshot
+
+
+class _AsyncWriteBatch(MemoryWriteBatch):
+    def set(self, reference, document_data: Dict, merge: bool = False):
+        return super().set(reference._reference, document_data, merge)
+
+    def create(self, reference, document_data: Dict):
+        return super().create(reference._reference, document_data)
+
+    def update(self, reference, field_updates: Dict, option=None):
+        return super().update(reference._reference, field_updates, option)
+
+    def delete(self, reference, option=None):
+        return super().delete(reference._reference, option)
+
+    async def commit(self, retry=None, timeout=None):
+        writes, self._writes = self._writes, []
+        return await self._client._commit(writes)
+
+
+class MemoryAsyncFirestore:
+    def __init__(self, sync_client: MemoryFirestore) -> None:
+        self.sync_client = sync_client
+
+    def collection(self, collection_path: str) -> _AsyncQuery:
+        return _AsyncQuery(self, self.sync_client.collection(collection_path))
+
+    def document(self, document_path: str) -> _AsyncDocumentReference:
+        return _AsyncDocumentReference(self, self.sync_client.document(document_path))
+
+    def batch(self) -> _AsyncWriteBatch:
+        return _AsyncWriteBatch(self)
+
+    write_option = staticmethod(MemoryFirestore.write_option)
+
+    async def get_all(self, references, field_paths=None, transaction=None, retry=None, timeout=None):
+        references = list(references)
+        await self._round_trip()
+        for reference in references:
+            yield reference._reference._get(field_paths)
+
+    async def _round_trip(self) -> None:
+        self.sync_client._count(rpcs=1)
+        if self.sync_client.latency > 0:
+            await asyncio.sleep(self.sync_client.latency)
+
+    async def _commit(self, writes: List[Tuple]) -> List[MemoryWriteResult]:
+        await self._round_trip()
+        return self.sync_client._apply(writes)
@@ -0,0 +1,171 @@
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Metricas de Prometheus de la API. Con PROMETHEUS_MULTIPROC_DIR definido
+# (antes de arrancar gunicorn) cada worker escribe sus valores en ese
+# directorio y /api/metrics/ los agrega; sin el, se exporta el proceso actual.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+FIRESTORE_OPERATIONS = Counter(
+    'tangoshop_firestore_operations_total',
+    'Operaciones contra Firestore por vista y tipo de operacion',
+    ['view', 'operation'],
+)
+FIRESTORE_DOCUMENTS = Counter(
+    'tangoshop_firestore_documents_total',
+    'Documentos leidos (get, query, get_all) o escritos por vista y tipo de operacion',
+    ['view', 'operation'],
+)
+FIRESTORE_LATENCY = Histogram(
+    'tangoshop_firestore_operation_seconds',
+    'Latencia de cada operacion contra Firestore',
+    ['operation'],
+    buckets=LATENCY_BUCKETS,
+)
+VIEW_LATENCY = Histogram(
+    'tangoshop_view_seconds',
+    'Latencia de cada request por vista',
+    ['view', 'method'],
+    buckets=LATENCY_BUCKETS,
+)
+VIEW_FIRESTORE_OPERATIONS = Histogram(
+    'tangoshop_view_firestore_operations',
+    'Operaciones contra Firestore por request',
+    ['view'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100, 250),
+)
+DOCUMENT_CACHE_LOOKUPS = Counter(
+    'tangoshop_document_cache_lookups_total',
+    'Lecturas por id que pasaron por el cache de documentos, por coleccion y resultado '
+    '(local, shared, coalesced o miss)',
+    ['collection', 'result'],
+)
+# Proporcion de requests coalescidos por vista:
+# rate(...{shared="true"}[5m]) / ignoring(shared) sum without(shared) (rate(...[5m]))
+COALESCED_REQUESTS = Counter(
+    'tangoshop_coalesced_requests_total',
+    'Requests que calcularon su resultado (shared=false) o esperaron uno identico en curso (shared=true)',
+    ['view', 'shared'],
+)
+BACKGROUND_JOBS = Counter(
+    'tangoshop_background_jobs_total',
+    'Ejecuciones de trabajos en segundo plano por trabajo y resultado (ok, retry o failed)',
+    ['job', 'result'],
+)
+
+# Operaciones que leen documentos; el resto son escrituras o listeners.
+READ_OPERATIONS = frozenset(('get', 'query', 'get_all'))
+
+
+class RequestStats:
+    # Operaciones de Firestore de un request. Se comparte por referencia con
+    # los hilos y tareas que el request lanza (ver firestore_batch): add()
+    # toma un lock para que los hilos en paralelo no pierdan cuentas.
+    def __init__(self) -> None:
+        self.view = 'unmatched'
+        self.operations: Dict[str, int] = {}
+        self.documents: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def total_operations(self) -> int:
+        return sum(self.operations.values())
+
+    @property
+    def reads(self) -> int:
+        return sum(count for operation, count in self.documents.items() if operation in READ_OPERATIONS)
+
+    @property
+    def writes(self) -> int:
+        return sum(count for operation, count in self.documents.items()
+                   if operation not in READ_OPERATIONS and operation != 'listen')
+
+    def add(self, operation: str, documents: int) -> None:
+        with self._lock:
+            self.operations[operation] = self.operations.get(operation, 0) + 1
+            self.documents[operation] = self.documents.get(operation, 0) + documents
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar('tangoshop_request_stats', default=None)
+# Contadores adicionales abiertos con observe(); a diferencia del request
+# actual, sobreviven a los requests anidados (por ejemplo el test Client).
+_observers: ContextVar[Tuple[RequestStats, ...]] = ContextVar('tangoshop_firestore_observers', default=())
+
+
+def current_request() -> Optional[RequestStats]:
+    return _current.get()
+
+
+def start_request():
+    return _current.set(RequestStats())
+
+
+def resume_request(stats: RequestStats):
+    return _current.set(stats)
+
+
+def end_request(token) -> None:
+    _current.reset(token)
+
+
+@contextmanager
+def observe() -> Iterator[RequestStats]:
+    stats = RequestStats()
+    token = _observers.set(_observers.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _observers.reset(token)
+
+
+def record_firestore(operation: str, seconds: float, documents: int) -> None:
+    stats = _current.get()
+    view = stats.view if stats is not None else 'background'
+    FIRESTORE_OPERATIONS.labels(view, operation).inc()
+    if documents:
+        FIRESTORE_DOCUMENTS.labels(view, operation).inc(documents)
+    FIRESTORE_LATENCY.labels(operation).observe(seconds)
+    if stats is not None:
+        stats.add(operation, documents)
+    for observer in _observers.get():
+        observer.add(operation, documents)
+
+
+def record_document_cache(collection: str, result: str) -> None:
+    DOCUMENT_CACHE_LOOKUPS.labels(collection, result).inc()
+
+
+def record_coalescing(view: str, shared: bool) -> None:
+    COALESCED_REQUESTS.labels(view, 'true' if shared else 'false').inc()
+
+
+def record_background_job(job: str, result: str) -> None:
+    BACKGROUND_JOBS.labels(job, result).inc()
+
+
+def record_request(stats: RequestStats, method: str, seconds: float) -> None:
+    VIEW_LATENCY.labels(stats.view, method).observe(seconds)
+    VIEW_FIRESTORE_OPERATIONS.labels(stats.view).observe(stats.total_operations)
+
+
+def export():
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,122 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+
+import bcrypt
+from django.conf import settings
+
+
+class HasherBusyError(Exception):
+    pass
+
+
+def _hashpw(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _checkpw(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+class PasswordHasher:
+    # Con BCRYPT_POOL_WORKERS > 0 bcrypt corre en un pool de procesos acotado
+    # y, si hay mas de BCRYPT_MAX_QUEUE operaciones en curso, se rechaza
+    # enseguida con HasherBusyError (503). Solo tiene sentido con workers
+    # gthread o ASGI, que atienden otros requests mientras se espera el hash;
+    # con workers sync (BCRYPT_POOL_WORKERS=0) bcrypt corre en el hilo del
+    # request, o en un hilo aparte desde las vistas async.
+    def __init__(self) -> None:
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[threading.BoundedSemaphore] = None
+        self._lock = threading.Lock()
+
+    @property
+    def rounds(self) -> int:
+        return getattr(settings, 'BCRYPT_ROUNDS', 12)
+
+    @property
+    def workers(self) -> int:
+        return getattr(settings, 'BCRYPT_POOL_WORKERS', 0)
+
+    def hash(self, password: str) -> str:
+        return self._run(_hashpw, password.encode(), self.rounds).decode()
+
+    def check(self, password: str, hashed: str) -> bool:
+        return self._run(_checkpw, password.encode(), hashed.encode())
+
+    async def ahash(self, password: str) -> str:
+        return (await self._arun(_hashpw, password.encode(), self.rounds)).decode()
+
+    async def acheck(self, password: str, hashed: str) -> bool:
+        return await self._arun(_checkpw, password.encode(), hashed.encode())
+
+    def needs_rehash(self, hashed: str) -> bool:
+        try:
+            return int(hashed.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return False
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._slots is None:
+                self._slots = threading.BoundedSemaphore(getattr(settings, 'BCRYPT_MAX_QUEUE', 32))
+            if self._pool is None:
+                # spawn: hacer fork de un proceso con hilos de gRPC no es seguro.
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+            return self._pool
+
+    def _discard(self, pool: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+
+    def _submit(self, func, *args) -> Tuple[ProcessPoolExecutor, Future]:
+        pool = self._get_pool()
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise HasherBusyError('Servidor ocupado, intenta nuevamente en unos segundos')
+
+        try:
+            future = pool.submit(func, *args)
+        except BrokenProcessPool:
+            slots.release()
+            self._discard(pool)
+            raise
+        future.add_done_callback(lambda _future: slots.release())
+        return pool, future
+
+    def _run(self, func, *args):
+        if self.workers <= 0:
+            return func(*args)
+
+        pool, future = self._submit(func, *args)
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            self._discard(pool)
+            raise
+
+    async def _arun(self, func, *args):
+        if self.workers <= 0:
+            return await asyncio.to_thread(func, *args)
+
+        pool, future = self._submit(func, *args)
+        try:
+            return await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            self._discard(pool)
+            raise
+
+password_hasher = PasswordHasher()
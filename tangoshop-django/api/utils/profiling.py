@@ -0,0 +1,109 @@
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Tuple
+
+# Perfiladores para un solo request. DeterministicProfiler usa cProfile y
+# guarda un .pstats; SamplingProfiler toma la pila del hilo del request cada
+# `interval` segundos desde otro hilo y guarda JSON de speedscope. Ambos
+# devuelven las funciones con mas tiempo propio como [(funcion, ms)].
+
+
+def _label(filename: str, line: int, name: str) -> str:
+    return f'{name} ({os.path.basename(filename)}:{line})'
+
+
+class DeterministicProfiler:
+    extension = 'pstats'
+
+    def __init__(self) -> None:
+        self._profile = cProfile.Profile()
+
+    def start(self) -> None:
+        self._profile.enable()
+
+    def stop(self) -> None:
+        self._profile.disable()
+
+    def write(self, path: str) -> None:
+        self._profile.dump_stats(path)
+
+    def top(self, count: int) -> List[Tuple[str, float]]:
+        stats = pstats.Stats(self._profile).stats
+        hottest = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:count]
+        return [(_label(*function), round(timing[2] * 1000, 3)) for function, timing in hottest]
+
+
+class SamplingProfiler:
+    extension = 'speedscope.json'
+
+    def __init__(self, interval: float = 0.005) -> None:
+        self.interval = interval
+        self._thread_id = None
+        self._sampler = None
+        self._stopped = threading.Event()
+        self._frames: Dict[Tuple[str, str, int], int] = {}
+        self._samples: List[List[int]] = []
+        self._weights: List[float] = []
+        self._elapsed = 0.0
+
+    def start(self) -> None:
+        self._thread_id = threading.get_ident()
+        self._sampler = threading.Thread(target=self._run, name='profiling-sampler', daemon=True)
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._sampler.join()
+
+    def _run(self) -> None:
+        started = last = time.perf_counter()
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            now = time.perf_counter()
+            if frame is not None:
+                self._samples.append(self._stack(frame))
+                self._weights.append((now - last) * 1000)
+            last = now
+        self._elapsed = (time.perf_counter() - started) * 1000
+
+    def _stack(self, frame) -> List[int]:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            key = (code.co_name, code.co_filename, code.co_firstlineno)
+            stack.append(self._frames.setdefault(key, len(self._frames)))
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def write(self, path: str) -> None:
+        document = {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'exporter': 'tangoshop',
+            'shared': {'frames': [{'name': name, 'file': filename, 'line': line} for name, filename, line in self._frames]},
+            'profiles': [{
+                'type': 'sampled',
+                'name': os.path.basename(path),
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': round(self._elapsed, 3),
+                'samples': self._samples,
+                'weights': [round(weight, 3) for weight in self._weights],
+            }],
+        }
+        with open(path, 'w', encoding='utf-8') as output:
+            json.dump(document, output)
+
+    def top(self, count: int) -> List[Tuple[str, float]]:
+        own = Counter()
+        for stack, weight in zip(self._samples, self._weights):
+            own[stack[-1]] += weight
+        frames = list(self._frames)
+        return [(_label(frames[index][1], frames[index][2], frames[index][0]), round(ms, 3))
+                for index, ms in own.most_common(count)]
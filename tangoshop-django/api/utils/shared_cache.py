@@ -0,0 +1,218 @@
+import logging
+import os
+import pickle
+import socket
+import socketserver
+import struct
+import threading
+import time
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+
+from api.utils.lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Cache compartido entre los workers de gunicorn de una misma maquina: un
+# proceso (manage.py document_cache_server) guarda los valores y los workers
+# le hablan por un socket unix. Cada mensaje es un pickle con un prefijo de
+# 4 bytes de largo; el socket se crea con permisos 0600, asi solo lo usan
+# procesos del mismo usuario.
+#
+# El servidor numera las invalidaciones con un reloj: get devuelve el valor
+# junto con el reloj actual, y un set que trae un reloj anterior a la ultima
+# invalidacion de su grupo se descarta. Asi un worker cuya lectura a
+# Firestore empezo antes de una escritura hecha por otro no vuelve a guardar
+# el valor viejo. Con changed() cada worker pregunta si los documentos que
+# tiene en su cache local se invalidaron despues del reloj con que los leyo.
+
+_HEADER = struct.Struct('>I')
+# Despues de un error el cliente no vuelve a intentar por este tiempo: si el
+# servidor no esta, cada lectura sigue directo a Firestore sin esperar.
+_RETRY_AFTER = 5.0
+
+
+def _encode(message) -> bytes:
+    payload = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    return _HEADER.pack(len(payload)) + payload
+
+
+def _send(sock: socket.socket, message) -> None:
+    sock.sendall(_encode(message))
+
+
+def _receive(sock: socket.socket):
+    header = _read_exactly(sock, _HEADER.size)
+    if header is None:
+        return None
+    payload = _read_exactly(sock, _HEADER.unpack(header)[0])
+    if payload is None:
+        raise ConnectionError('Conexion cerrada a mitad de un mensaje')
+    return pickle.loads(payload)
+
+
+def _read_exactly(sock: socket.socket, size: int) -> Optional[bytes]:
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+class SharedCacheClient:
+    # Cliente del servidor, con una conexion por hilo. Cualquier error se
+    # trata como un miss: el cache compartido nunca hace fallar una lectura.
+    def __init__(self, path: str, timeout: float) -> None:
+        self.path = path
+        self.timeout = timeout
+        self.errors = 0
+        self._local = threading.local()
+        self._down_until = 0.0
+
+    def get(self, key: Hashable) -> Optional[Tuple[Any, int]]:
+        # (valor o None, reloj del servidor), o None si no hay servidor.
+        return self._call(('get', key), reply=True)
+
+    def set(self, key: Hashable, value: Any, ttl: float, group: Optional[str] = None, since: int = 0) -> None:
+        self._call(('set', key, value, ttl, group, since), reply=False)
+
+    def invalidate(self, group: str) -> None:
+        self._call(('invalidate', group), reply=False)
+
+    def changed(self, checks: List[Tuple[str, int]]) -> Optional[List[bool]]:
+        # Para cada (grupo, reloj), si el grupo se invalido despues de ese
+        # reloj. None si no hay servidor.
+        return self._call(('changed', checks), reply=True)
+
+    def _call(self, message, reply: bool):
+        if time.monotonic() < self._down_until:
+            return None
+        try:
+            data = _encode(message)
+        except (pickle.PickleError, TypeError, AttributeError):
+            # Un valor que no se puede serializar afecta solo a esa clave.
+            logger.warning('No se puede compartir %r', message[1], exc_info=True)
+            return None
+        try:
+            sock = self._connection()
+            sock.sendall(data)
+            return _receive(sock) if reply else None
+        except (OSError, pickle.PickleError, EOFError):
+            self.errors += 1
+            self._down_until = time.monotonic() + _RETRY_AFTER
+            self._close()
+            logger.warning('Cache compartido no disponible en %s', self.path, exc_info=True)
+            return None
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, 'sock', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            self._local.sock = sock
+        return sock
+
+    def _close(self) -> None:
+        sock = getattr(self._local, 'sock', None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+
+class SharedCacheStore:
+    # Valores con vencimiento propio, agrupados para poder invalidar juntas
+    # todas las claves de un documento (una por proyeccion). De los grupos
+    # invalidados se recuerda el reloj de la ultima invalidacion; al olvidar
+    # uno, su reloj pasa a ser el minimo que debe traer cualquier set. El reloj
+    # arranca en time_ns(): lo leido de un servidor anterior (que pudo perder
+    # invalidaciones) queda por debajo del minimo y se descarta.
+    def __init__(self, max_entries: int) -> None:
+        self._lock = threading.RLock()
+        self._groups: Dict[str, Set[Hashable]] = {}
+        self._group_of: Dict[Hashable, str] = {}
+        self.clock = time.time_ns()
+        self._floor = self.clock
+        self.entries = LRUCache(max_entries=max_entries, on_evict=lambda key, _value: self._forget(key))
+        self._invalidated = LRUCache(max_entries=max_entries, on_evict=lambda _group, clock: self._raise_floor(clock))
+
+    def get(self, key: Hashable) -> Tuple[Any, int]:
+        with self._lock:
+            return self.entries.get(key), self.clock
+
+    def set(self, key: Hashable, value: Any, ttl: float, group: Optional[str], since: int = 0) -> None:
+        with self._lock:
+            if group is not None and self._changed(group, since):
+                return
+            if self.entries.set(key, value, ttl=ttl) and group is not None:
+                self._groups.setdefault(group, set()).add(key)
+                self._group_of[key] = group
+
+    def invalidate(self, group: str) -> None:
+        with self._lock:
+            self.clock += 1
+            self._invalidated.set(group, self.clock)
+            for key in self._groups.pop(group, ()):
+                self._group_of.pop(key, None)
+                self.entries.delete(key)
+
+    def changed(self, checks: List[Tuple[str, int]]) -> List[bool]:
+        with self._lock:
+            return [self._changed(group, since) for group, since in checks]
+
+    def _changed(self, group: str, since: int) -> bool:
+        return self._invalidated.get(group, self._floor, count=False) > since
+
+    def _raise_floor(self, clock: int) -> None:
+        self._floor = max(self._floor, clock)
+
+    def _forget(self, key: Hashable) -> None:
+        with self._lock:
+            group = self._group_of.pop(key, None)
+            keys = self._groups.get(group)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._groups[group]
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self) -> None:
+        store = self.server.store
+        while True:
+            try:
+                message = _receive(self.request)
+            except (OSError, pickle.PickleError, EOFError):
+                return
+            if message is None:
+                return
+            operation = message[0]
+            if operation == 'get':
+                _send(self.request, store.get(message[1]))
+            elif operation == 'set':
+                store.set(*message[1:])
+            elif operation == 'invalidate':
+                store.invalidate(message[1])
+            elif operation == 'changed':
+                _send(self.request, store.changed(message[1]))
+
+
+class SharedCacheServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, max_entries: int) -> None:
+        if os.path.exists(path):
+            os.remove(path)
+        self.store = SharedCacheStore(max_entries)
+        previous = os.umask(0o177)
+        try:
+            super().__init__(path, _Handler)
+        finally:
+            os.umask(previous)
+
+    def server_close(self) -> None:
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
@@ -0,0 +1,84 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    # Agrupa las llamadas concurrentes con la misma clave: la primera ejecuta
+    # la funcion y las demas esperan su resultado (o su excepcion) en lugar de
+    # repetir la lectura. do() es para hilos y ado() para corrutinas; las
+    # corrutinas solo se agrupan dentro del mismo event loop.
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self._async_calls: Dict[Tuple[asyncio.AbstractEventLoop, Hashable], asyncio.Future] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        # Devuelve (resultado, compartido).
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            self._release(self._calls, key, future)
+
+    async def ado(self, key: Hashable, factory: Callable[[], Awaitable]) -> Tuple[Any, bool]:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            future = self._async_calls.get((loop, key))
+            leader = future is None
+            if leader:
+                future = self._async_calls[(loop, key)] = loop.create_future()
+                # Sin seguidores nadie lee la excepcion: se marca como leida.
+                future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        if not leader:
+            # shield: si se cancela un seguidor no se cancela la lectura.
+            return await asyncio.shield(future), True
+
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            self._release(self._async_calls, (loop, key), future)
+
+    def forget(self, key: Hashable) -> None:
+        self.forget_if(lambda candidate: candidate == key)
+
+    def forget_if(self, predicate: Callable[[Hashable], bool]) -> None:
+        # Las llamadas que lleguen despues ya no se suman a las que estan en
+        # curso (por ejemplo porque el dato cambio mientras se leia).
+        with self._lock:
+            for key in [key for key in self._calls if predicate(key)]:
+                del self._calls[key]
+            for loop_key in [loop_key for loop_key in self._async_calls if predicate(loop_key[1])]:
+                del self._async_calls[loop_key]
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls) + len(self._async_calls)
+
+    def _release(self, calls: Dict, key: Hashable, future) -> None:
+        with self._lock:
+            if calls.get(key) is future:
+                del calls[key]
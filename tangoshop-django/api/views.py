@@ -1,3 +1,8 @@
+import hmac
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
@@ -5,11 +10,18 @@ from api.serializers import (
     RegisterResellerSerializer,
     RegisterSupplierSerializer,
     LoginSerializer,
-    ReactivateAccountSerializer
+    ReactivateAccountSerializer,
+    CatalogQuerySerializer
 )
 from api.services.auth_service import auth_service
 from api.services.catalog_service import catalog_service
-from api.utils.decorators import require_auth, require_role
+from api.services.public_catalog_service import FORMATS, catalog_root, public_catalog_service
+from api.utils.conditional import ContentVersion, not_modified_response, set_validators
+from api.utils import metrics as api_metrics
+from api.utils.coalescing import coalesce
+from api.utils.decorators import require_auth, require_methods, require_role
+from api.utils.json_codec import JSONResponse, dumps
+from api.utils.password_hasher import HasherBusyError
 from api.services.supplier_service import supplier_service
 
 @api_view(['GET'])
@@ -27,6 +39,21 @@ def health_check(_request):
         'message': 'OK'
     })
 
+@require_methods('GET')
+def metrics(request):
+    # Formato de texto de Prometheus; fuera de DRF para no pasar por la
+    # negociacion de contenido. Con METRICS_TOKEN definido se exige en el
+    # header X-Metrics-Token.
+    expected = getattr(settings, 'METRICS_TOKEN', None)
+    if expected and not hmac.compare_digest(request.headers.get('X-Metrics-Token', ''), expected):
+        return JSONResponse({
+            'success': False,
+            'message': 'No autorizado'
+        }, status=403)
+
+    body, content_type = api_metrics.export()
+    return HttpResponse(body, content_type=content_type)
+
 @api_view(['POST'])
 def register_reseller(request):
     serializer = RegisterResellerSerializer(data=request.data)
@@ -44,6 +71,8 @@ def register_reseller(request):
             'message': 'Revendedor registrado exitosamente',
             'data': result
         }, status=status.HTTP_201_CREATED)
+    except HasherBusyError as exc:
+        return Response({'success': False, 'message': str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'})
     except ValueError as exc:
         code = status.HTTP_409_CONFLICT if 'email' in str(exc) else status.HTTP_400_BAD_REQUEST
         return Response({'success': False, 'message': str(exc)}, status=code)
@@ -71,6 +100,8 @@ def register_supplier(request):
             'message': 'Proveedor registrado exitosamente',
             'data': result
         }, status=status.HTTP_201_CREATED)
+    except HasherBusyError as exc:
+        return Response({'success': False, 'message': str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'})
     except ValueError as exc:
         code = status.HTTP_409_CONFLICT if 'email' in str(exc) else status.HTTP_400_BAD_REQUEST
         return Response({'success': False, 'message': str(exc)}, status=code)
@@ -98,6 +129,8 @@ def login(request):
             'message': 'Login exitoso',
             'data': result
         }, status=status.HTTP_200_OK)
+    except HasherBusyError as exc:
+        return Response({'success': False, 'message': str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'})
     except ValueError as exc:
         code = status.HTTP_401_UNAUTHORIZED if 'Credenciales' in str(exc) or 'Cuenta desactivada' in str(exc) else status.HTTP_400_BAD_REQUEST
         return Response({'success': False, 'message': str(exc)}, status=code)
@@ -134,6 +167,8 @@ def reactivate_account(request):
             }
         }, status=status.HTTP_200_OK)
         
+    except HasherBusyError as exc:
+        return Response({'success': False, 'message': str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'})
     except ValueError as exc:
         error_message = str(exc)
         
@@ -159,20 +194,52 @@ def reactivate_account(request):
 @require_auth
 @require_role('reseller')
 def get_my_catalog(request):
+    query = CatalogQuerySerializer(data=request.query_params)
+    if not query.is_valid():
+        return Response({
+            'success': False,
+            'message': 'Parametros invalidos',
+            'errors': query.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    params = query.validated_data
+
     try:
         reseller_id = request.user_data['userId']
-        result = catalog_service.get_reseller_catalog(reseller_id)
+
+        if params['stream']:
+            batches = catalog_service.iter_reseller_catalog(reseller_id, settings.CATALOG_STREAM_BATCH_SIZE)
+            return StreamingHttpResponse(
+                (b''.join(dumps(product) + b'\n' for product in batch) for batch in batches),
+                content_type='application/x-ndjson'
+            )
+
+        if 'page_size' in params or 'page_token' in params:
+            page_size = params.get('page_size', settings.REST_FRAMEWORK['PAGE_SIZE'])
+            result = catalog_service.get_reseller_catalog_page(reseller_id, page_size, params.get('page_token'))
+            return Response({
+                'success': True,
+                'data': result
+            }, status=status.HTTP_200_OK)
+
+        version = ContentVersion()
+        result = coalesce('catalog', (reseller_id,),
+                          lambda loaded: catalog_service.get_reseller_catalog(reseller_id, version=loaded), version)
+        not_modified = not_modified_response(request, version)
+        if not_modified is not None:
+            return not_modified
         
-        return Response({
+        return set_validators(Response({
             'success': True,
             'data': result
-        }, status=status.HTTP_200_OK)
+        }, status=status.HTTP_200_OK), version)
         
     except ValueError as exc:
+        code = status.HTTP_400_BAD_REQUEST if 'Token de pagina' in str(exc) else status.HTTP_404_NOT_FOUND
         return Response({
             'success': False,
             'message': str(exc)
-        }, status=status.HTTP_404_NOT_FOUND)
+        }, status=code)
         
     except Exception as exc:
         return Response({
@@ -186,12 +253,18 @@ def get_my_catalog(request):
 def get_resellers_high_markup(request, product_id):
     try:
         supplier_id = request.user_data['userId']
-        result = supplier_service.get_resellers_high_markup(supplier_id, product_id)
+        version = ContentVersion()
+        result = coalesce('high_markup', (supplier_id, product_id),
+                          lambda loaded: supplier_service.get_resellers_high_markup(supplier_id, product_id, version=loaded),
+                          version)
+        not_modified = not_modified_response(request, version)
+        if not_modified is not None:
+            return not_modified
         
-        return Response({
+        return set_validators(Response({
             'success': True,
             'data': result
-        }, status=status.HTTP_200_OK)
+        }, status=status.HTTP_200_OK), version)
         
     except ValueError as exc:
         error_msg = str(exc)
@@ -213,4 +286,50 @@ def get_resellers_high_markup(request, product_id):
             'success': False,
             'message': 'Error al obtener revendedores',
             'error': str(exc)
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+def _accepts_gzip(request) -> bool:
+    for coding in request.headers.get('Accept-Encoding', '').split(','):
+        name, _, params = coding.partition(';')
+        if name.strip().lower() == 'gzip':
+            _, _, quality = params.partition('q=')
+            try:
+                return float(quality or 1) > 0
+            except ValueError:
+                return True
+    return False
+
+@require_methods('GET', 'HEAD')
+def public_catalog(request, reseller_id, fmt, version=None):
+    # Catalogo publico precalculado por publish_public_catalogs: solo lee
+    # archivos, sin Firestore ni calculo de precios. La URL estable sirve la
+    # ultima version con un max-age corto; la versionada no cambia nunca.
+    immutable = version is not None
+    version = version or public_catalog_service.current_version(reseller_id)
+    compressed = _accepts_gzip(request)
+    path = version and (public_catalog_service.file_path(reseller_id, version, fmt, compressed)
+                        or public_catalog_service.file_path(reseller_id, version, fmt))
+    if not path:
+        return JSONResponse({
+            'success': False,
+            'message': 'Catalogo no encontrado'
+        }, status=404)
+
+    max_age = settings.PUBLIC_CATALOG_IMMUTABLE_MAX_AGE if immutable else settings.PUBLIC_CATALOG_MAX_AGE
+    # Cada codificacion es otra representacion y lleva su propio ETag fuerte.
+    etag = f'"{version}-gz"' if path.suffix == '.gz' else f'"{version}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        sendfile_header = getattr(settings, 'PUBLIC_CATALOG_SENDFILE_HEADER', None)
+        if sendfile_header:
+            response = HttpResponse(content_type=FORMATS[fmt])
+            response[sendfile_header] = settings.PUBLIC_CATALOG_SENDFILE_PREFIX + str(path.relative_to(catalog_root()))
+        else:
+            response = FileResponse(path.open('rb'), content_type=FORMATS[fmt])
+            response.headers.pop('Content-Disposition', None)
+        if path.suffix == '.gz':
+            response['Content-Encoding'] = 'gzip'
+    response['ETag'] = etag
+    response['Cache-Control'] = f'public, max-age={max_age}' + (', immutable' if immutable else '')
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
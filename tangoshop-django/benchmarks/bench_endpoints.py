@@ -0,0 +1,205 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tangoshop_project.settings')
+os.environ['FIRESTORE_BACKEND'] = 'memory'
+os.environ.setdefault('JWT_SECRET', 'bench-secret')
+django.setup()
+
+import numpy as np  # noqa: E402
+from django.test import Client, override_settings  # noqa: E402
+
+from api.services.auth_service import auth_service  # noqa: E402
+from api.services.catalog_service import catalog_service  # noqa: E402
+from api.utils.document_cache import document_cache  # noqa: E402
+from api.utils.firebase_config import get_handle  # noqa: E402
+from benchmarks.dataset import PASSWORD, SCALES, generate  # noqa: E402
+
+# Corre los endpoints completos (middleware, vista y servicio) contra el
+# backend en memoria con un dataset sintetico, y guarda percentiles de
+# latencia, operaciones de Firestore por request y pico de memoria.
+
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+
+# Metricas que se comparan contra el baseline: mas alto es peor.
+COMPARED = ('p95_ms', 'rpcs_per_request', 'reads_per_request', 'writes_per_request')
+
+
+def build_requests(dataset, scenario, count, rng):
+    resellers = dataset.resellers
+    tokens = {}
+
+    def token(user_id, user_type):
+        if user_id not in tokens:
+            tokens[user_id] = auth_service._encode_tokens(user_id, dataset.emails[user_id], user_type)[0]
+        return f'Bearer {tokens[user_id]}'
+
+    requests = []
+    for _ in range(count):
+        if scenario in ('catalog', 'catalog_cached'):
+            reseller_id = rng.choice(resellers)
+            requests.append(('get', '/api/catalog/my-catalog/', {'HTTP_AUTHORIZATION': token(reseller_id, 'reseller')}))
+        elif scenario == 'high_markup':
+            # Los productos populares (los primeros) concentran los favoritos.
+            product_id = dataset.products[min(int(rng.paretovariate(1.1)) - 1, len(dataset.products) - 1)]
+            supplier_id = dataset.collections['products'][product_id]['supplierId']
+            url = f'/api/suppliers/products/{product_id}/high-markup-resellers/'
+            requests.append(('get', url, {'HTTP_AUTHORIZATION': token(supplier_id, 'supplier')}))
+        elif scenario == 'login':
+            user_id = rng.choice(resellers)
+            body = json.dumps({'email': dataset.emails[user_id], 'password': PASSWORD})
+            requests.append(('post', '/api/auth/login/', {'data': body, 'content_type': 'application/json'}))
+        elif scenario == 'middleware':
+            reseller_id = rng.choice(resellers)
+            requests.append(('get', '/api/health/', {'HTTP_AUTHORIZATION': token(reseller_id, 'reseller')}))
+    return requests
+
+
+def run_scenario(db, dataset, scenario, count, memory_sample, seed):
+    client = Client()
+    rng = random.Random(seed)
+    requests = build_requests(dataset, scenario, count, rng)
+
+    catalog_service.cache.clear()
+    document_cache.clear()
+    auth_service.email_index.clear()
+    cached = scenario == 'catalog_cached'
+    latencies, rpcs, reads, writes = [], [], [], []
+
+    with override_settings(CATALOG_CACHE_ENABLED=cached, ALLOWED_HOSTS=['*']):
+        if cached:
+            # Estado estable: cada catalogo ya esta en memoria y con sus
+            # listeners activos antes de medir.
+            for method, url, kwargs in {request[2]['HTTP_AUTHORIZATION']: request for request in requests}.values():
+                getattr(client, method)(url, **kwargs)
+            db.wait_for_listeners()
+
+        for method, url, kwargs in requests:
+            before = db.stats()
+            start = time.perf_counter()
+            response = getattr(client, method)(url, **kwargs)
+            latencies.append((time.perf_counter() - start) * 1000)
+            after = db.stats()
+            if response.status_code >= 400:
+                raise RuntimeError(f'{scenario}: {url} respondio {response.status_code}: {response.content[:200]!r}')
+            rpcs.append(after['rpcs'] - before['rpcs'])
+            reads.append(after['reads'] - before['reads'])
+            writes.append(after['writes'] - before['writes'])
+
+        # Segunda pasada corta con tracemalloc: medir memoria distorsiona la
+        # latencia, por eso no se mezcla con la pasada anterior.
+        tracemalloc.start()
+        for method, url, kwargs in requests[:memory_sample]:
+            getattr(client, method)(url, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    catalog_service.cache.clear()
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        'requests': count,
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'mean_ms': round(float(np.mean(latencies)), 3),
+        'rpcs_per_request': round(float(np.mean(rpcs)), 2),
+        'reads_per_request': round(float(np.mean(reads)), 2),
+        'writes_per_request': round(float(np.mean(writes)), 2),
+        'peak_memory_kib': round(peak / 1024, 1),
+    }
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for scale, scenarios in results.items():
+        for scenario, metrics in scenarios.items():
+            previous = baseline.get(scale, {}).get(scenario)
+            if not previous:
+                continue
+            for metric in COMPARED:
+                old, new = previous.get(metric), metrics.get(metric)
+                if old is None or new is None:
+                    continue
+                limit = old * (1 + threshold) if old else threshold
+                if new > limit:
+                    regressions.append(f'{scale}/{scenario} {metric}: {old} -> {new}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de endpoints sobre el backend de Firestore en memoria')
+    parser.add_argument('--scales', default='small,medium', help=f'separadas por coma: {", ".join(SCALES)}')
+    parser.add_argument('--scenarios', default='catalog,catalog_cached,high_markup,login,middleware')
+    parser.add_argument('--requests', type=int, default=200, help='requests por escenario')
+    parser.add_argument('--memory-sample', type=int, default=20, help='requests medidos con tracemalloc')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='RTT simulado por operacion de Firestore')
+    parser.add_argument('--bcrypt-rounds', type=int, default=4)
+    parser.add_argument('--legacy-favorites', action='store_true', help='favoritos sin productSnapshot')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', type=Path, default=RESULTS_DIR / 'latest.json')
+    parser.add_argument('--baseline', type=Path, help='resultados previos contra los que comparar')
+    parser.add_argument('--threshold', type=float, default=0.2, help='empeoramiento relativo tolerado')
+    args = parser.parse_args()
+
+    db = get_handle('db')
+    db.latency = args.latency_ms / 1000
+    scenarios = args.scenarios.split(',')
+    results = {}
+
+    with override_settings(BCRYPT_ROUNDS=args.bcrypt_rounds, BCRYPT_POOL_WORKERS=0,
+                           CATALOG_PRODUCT_SNAPSHOTS=not args.legacy_favorites):
+        for scale in args.scales.split(','):
+            dataset = generate(**SCALES[scale], bcrypt_rounds=args.bcrypt_rounds, seed=args.seed,
+                               product_snapshots=not args.legacy_favorites)
+            db.clear()
+            db.load(dataset.collections)
+            print(f'{scale}: {len(dataset.products)} productos, {len(dataset.resellers)} revendedores, '
+                  f'{dataset.favorites} favoritos')
+            print(f'  {"escenario":<16}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"rpcs":>7}{"reads":>8}{"writes":>8}{"pico KiB":>10}')
+            results[scale] = {}
+            for scenario in scenarios:
+                metrics = run_scenario(db, dataset, scenario, args.requests, args.memory_sample, args.seed)
+                results[scale][scenario] = metrics
+                print(f'  {scenario:<16}{metrics["p50_ms"]:>9.2f}{metrics["p95_ms"]:>9.2f}{metrics["p99_ms"]:>9.2f}'
+                      f'{metrics["rpcs_per_request"]:>7.1f}{metrics["reads_per_request"]:>8.1f}'
+                      f'{metrics["writes_per_request"]:>8.1f}{metrics["peak_memory_kib"]:>10.0f}')
+
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'seed': args.seed,
+            'requests': args.requests,
+            'latency_ms': args.latency_ms,
+            'bcrypt_rounds': args.bcrypt_rounds,
+            'product_snapshots': not args.legacy_favorites,
+        },
+        'results': results,
+    }
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2))
+    print(f'resultados en {args.output}')
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'ERROR: regresiones mayores al {args.threshold:.0%}:')
+            for regression in regressions:
+                print(f'  {regression}')
+            sys.exit(1)
+        print(f'sin regresiones respecto de {args.baseline}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import argparse
+import io
+import os
+import random
+import time
+from datetime import timezone
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tangoshop_project.settings')
+django.setup()
+
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds  # noqa: E402
+from rest_framework.parsers import JSONParser  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from api.utils.json_codec import ORJSONParser, ORJSONRenderer  # noqa: E402
+
+# Serializacion de la respuesta de /api/catalog/my-catalog/ con el renderer
+# y parser por defecto de DRF (json de la stdlib) contra los de orjson.
+# "con timestamps" agrega un updatedAt de Firestore a cada item, el caso mas
+# costoso porque pasa por la funcion default de ambos encoders.
+
+
+def make_catalog(size, timestamps, seed=1):
+    rng = random.Random(seed)
+    products = []
+    for number in range(size):
+        base_price = round(rng.lognormvariate(8, 0.8), 2)
+        markup_type = rng.choice(('percentage', 'fixed'))
+        markup_value = rng.choice((0, 10, 15, 25, 40))
+        final_price = base_price * (1 + markup_value / 100) if markup_type == 'percentage' else base_price + markup_value
+        product = {
+            'productId': f'product{number:06d}',
+            'name': f'Producto {number} de la categoria {rng.choice(("mates", "yerbas", "termos"))}',
+            'basePrice': base_price,
+            'markupType': markup_type,
+            'markupValue': markup_value,
+            'finalPrice': round(final_price, 2),
+        }
+        if timestamps:
+            product['updatedAt'] = DatetimeWithNanoseconds(
+                2024, 1 + number % 12, 1 + number % 28, number % 24, number % 60, number % 60,
+                nanosecond=rng.randrange(10 ** 9), tzinfo=timezone.utc,
+            )
+        products.append(product)
+    return {'success': True, 'data': {'totalProducts': size, 'products': products}}
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JSONRenderer/JSONParser de DRF vs orjson')
+    parser.add_argument('--items', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f'catalogo de {args.items} items, mejor de {args.repeat}')
+    print(f'{"caso":<28}{"DRF ms":>9}{"orjson ms":>11}{"speedup":>9}{"MB/s orjson":>13}')
+    for timestamps in (False, True):
+        label = 'con timestamps' if timestamps else 'sin timestamps'
+        payload = make_catalog(args.items, timestamps)
+
+        drf_time, drf_body = best_of(lambda: JSONRenderer().render(payload), args.repeat)
+        fast_time, fast_body = best_of(lambda: ORJSONRenderer().render(payload), args.repeat)
+        print(f'{"render " + label:<28}{drf_time * 1000:>9.2f}{fast_time * 1000:>11.2f}'
+              f'{drf_time / fast_time:>8.1f}x{len(fast_body) / fast_time / 1e6:>13.0f}')
+
+        drf_parse, drf_data = best_of(lambda: JSONParser().parse(io.BytesIO(fast_body)), args.repeat)
+        fast_parse, fast_data = best_of(lambda: ORJSONParser().parse(io.BytesIO(fast_body)), args.repeat)
+        assert drf_data == fast_data, 'los parsers difieren'
+        assert drf_body == fast_body, 'los renderers difieren'
+        print(f'{"parse " + label:<28}{drf_parse * 1000:>9.2f}{fast_parse * 1000:>11.2f}'
+              f'{drf_parse / fast_parse:>8.1f}x{len(fast_body) / fast_parse / 1e6:>13.0f}')
+
+
+if __name__ == '__main__':
+    main()
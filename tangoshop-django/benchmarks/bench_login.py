@@ -0,0 +1,61 @@
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tangoshop_project.settings')
+django.setup()
+
+import bcrypt  # noqa: E402
+from django.test import override_settings  # noqa: E402
+
+from api.utils.password_hasher import HasherBusyError, PasswordHasher  # noqa: E402
+
+
+def run(hasher, hashed, logins, concurrency):
+    rejected = 0
+
+    def login(_):
+        nonlocal rejected
+        try:
+            return hasher.check('Secreta123', hashed)
+        except HasherBusyError:
+            rejected += 1
+            return None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as threads:
+        list(threads.map(login, range(logins)))
+    return time.perf_counter() - start, rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Throughput de verificacion de password (login) por core')
+    parser.add_argument('--rounds', type=int, default=12)
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 1, 2, 4])
+    parser.add_argument('--logins', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--max-queue', type=int, default=None, help='BCRYPT_MAX_QUEUE (por defecto, sin rechazos)')
+    args = parser.parse_args()
+
+    hashed = bcrypt.hashpw(b'Secreta123', bcrypt.gensalt(args.rounds)).decode()
+    print(f'bcrypt cost={args.rounds}, {args.logins} logins, {args.concurrency} hilos de request')
+    print(f'{"workers":>8} {"logins/s":>10} {"logins/s/core":>14} {"rechazados":>11}')
+
+    for workers in args.workers:
+        with override_settings(BCRYPT_ROUNDS=args.rounds, BCRYPT_POOL_WORKERS=workers, BCRYPT_MAX_QUEUE=args.max_queue or args.logins):
+            hasher = PasswordHasher()
+            if workers:
+                hasher.check('warmup', hashed)
+            elapsed, rejected = run(hasher, hashed, args.logins, args.concurrency)
+            hasher.shutdown()
+        cores = max(workers, 1)
+        rate = (args.logins - rejected) / elapsed
+        label = 'inline' if workers == 0 else str(workers)
+        print(f'{label:>8} {rate:>10.1f} {rate / cores:>14.1f} {rejected:>11}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import argparse
+import os
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tangoshop_project.settings')
+django.setup()
+
+import jwt  # noqa: E402
+from django.test import RequestFactory, override_settings  # noqa: E402
+
+from api.middlewares.auth_middleware import FirebaseAuthMiddleware  # noqa: E402
+
+
+def measure(cache_size, tokens, requests):
+    with override_settings(JWT_CACHE_SIZE=cache_size):
+        middleware = FirebaseAuthMiddleware(lambda request: None)
+    middleware.jwt_secret = 'bench-secret'
+    factory = RequestFactory()
+    prepared = [factory.get('/api/', HTTP_AUTHORIZATION=f'Bearer {tokens[i % len(tokens)]}') for i in range(requests)]
+
+    start = time.perf_counter()
+    for request in prepared:
+        middleware(request)
+    elapsed = time.perf_counter() - start
+    return elapsed / requests * 1e6, middleware.token_cache.stats() if middleware.token_cache else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Overhead por request de FirebaseAuthMiddleware')
+    parser.add_argument('--requests', type=int, default=50_000)
+    parser.add_argument('--users', type=int, default=500, help='tokens distintos en circulacion')
+    args = parser.parse_args()
+
+    exp = int(time.time()) + 3600
+    tokens = [
+        jwt.encode({'userId': f'u{i}', 'email': f'u{i}@mail.com', 'userType': 'reseller', 'exp': exp}, 'bench-secret', algorithm='HS256')
+        for i in range(args.users)
+    ]
+
+    off, _ = measure(0, tokens, args.requests)
+    on, stats = measure(max(args.users, 1), tokens, args.requests)
+    print(f'{args.requests} requests, {args.users} tokens distintos')
+    print(f'sin cache: {off:8.2f} us/request')
+    print(f'con cache: {on:8.2f} us/request (hit rate {stats["hitRate"]:.2%})')
+    print(f'speedup:   {off / on:8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
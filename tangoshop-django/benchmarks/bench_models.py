@@ -0,0 +1,91 @@
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+import orjson
+
+from api.models import Favorite, Product
+
+# Memoria por item de un catalogo grande guardado como dicts completos
+# (to_dict() sin select, lo que hacian los servicios) contra modelos con
+# slots decodificados de la proyeccion. Los documentos pasan por JSON para
+# que cada lectura cree sus propios strings, como al decodificar la
+# respuesta de Firestore; "wire" es el tamano de esa respuesta.
+
+
+def make_documents(count, seed=1):
+    rng = random.Random(seed)
+    words = ('mate', 'calabaza', 'alpaca', 'cuero', 'virola', 'bombilla', 'yerba', 'artesanal', 'tandil', 'regalo')
+    products, favorites = [], []
+    for number in range(count):
+        products.append({
+            'name': f'Producto {number} {rng.choice(words)}',
+            'description': ' '.join(rng.choice(words) for _ in range(rng.randint(40, 120))),
+            'price': round(rng.lognormvariate(8, 0.8), 2),
+            'categoryId': f'category{rng.randrange(20):02d}',
+            'supplierId': f'supplier{rng.randrange(60):04d}',
+            'photoURL': f'https://firebasestorage.googleapis.com/v0/b/tangoshop.appspot.com/o/products%2F{number:06d}.jpg?alt=media&token={rng.getrandbits(128):032x}',
+            'rating': round(rng.uniform(1, 5), 1),
+            'reviewCount': rng.randrange(500),
+            'favoritesCount': rng.randrange(2000),
+            'isActive': True,
+            'createdAt': '2024-01-01T00:00:00Z',
+        })
+        favorites.append({
+            'resellerId': 'reseller00001',
+            'productId': f'product{number:06d}',
+            'isActive': True,
+            'markupType': rng.choice(('default', 'percentage', 'fixed')),
+            'markupValue': rng.choice((0, 5, 10, 20)),
+            'createdAt': '2024-01-01T00:00:00Z',
+        })
+    return products, favorites
+
+
+def measure(build):
+    # El tiempo se mide sin tracemalloc, que lo distorsiona.
+    gc.collect()
+    start = time.perf_counter()
+    build()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    items = build()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return items, retained, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memoria por item: dicts completos vs modelos con slots')
+    parser.add_argument('--items', type=int, default=10000)
+    args = parser.parse_args()
+
+    products, favorites = make_documents(args.items)
+    cases = []
+    for label, model, documents in (('productos', Product, products), ('favoritos', Favorite, favorites)):
+        full_wire = [orjson.dumps(document) for document in documents]
+        projected_wire = [orjson.dumps({field: document[field] for field in model.PROJECTION if field in document})
+                          for document in documents]
+
+        full, full_bytes, full_time = measure(lambda: [orjson.loads(raw) for raw in full_wire])
+        models, model_bytes, model_time = measure(lambda: [model.from_dict(orjson.loads(raw)) for raw in projected_wire])
+        assert all(getattr(item, field) == document[field]
+                   for item, document in zip(models, full) for field in model.PROJECTION if field in document)
+        cases.append((label, sum(map(len, full_wire)), sum(map(len, projected_wire)), full_bytes, model_bytes,
+                      full_time, model_time))
+        del full, models
+
+    print(f'{args.items} items')
+    print(f'{"":<11}{"wire B/item":>22}{"memoria B/item":>24}{"reduccion":>11}{"decode ms":>20}')
+    print(f'{"":<11}{"dict":>11}{"modelo":>11}{"dict":>12}{"modelo":>12}{"":>11}{"dict":>10}{"modelo":>10}')
+    for label, full_wire, projected_wire, full_bytes, model_bytes, full_time, model_time in cases:
+        print(f'{label:<11}{full_wire / args.items:>11.0f}{projected_wire / args.items:>11.0f}'
+              f'{full_bytes / args.items:>12.0f}{model_bytes / args.items:>12.0f}'
+              f'{1 - model_bytes / full_bytes:>10.0%} {full_time * 1000:>10.1f}{model_time * 1000:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
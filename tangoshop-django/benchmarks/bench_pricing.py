@@ -0,0 +1,92 @@
+import argparse
+import random
+import time
+
+import numpy as np
+
+from api.services.pricing_service import pricing_service, round2
+
+
+def legacy_loop(base_prices, markup_types, markup_values, default_types, default_values):
+    final_prices = []
+    increases = []
+    for base_price, markup_type, markup_value, default_type, default_value in zip(
+        base_prices, markup_types, markup_values, default_types, default_values
+    ):
+        if markup_type == 'default':
+            markup_type = default_type
+            markup_value = default_value
+
+        if markup_type == 'fixed':
+            final_price = base_price + markup_value
+        elif markup_type == 'percentage':
+            final_price = base_price * (1 + markup_value / 100)
+        else:
+            final_price = base_price
+
+        percentage_increase = ((final_price - base_price) / base_price) * 100 if base_price else 0.0
+        final_prices.append(round(final_price, 2))
+        increases.append(round(percentage_increase, 2))
+    return final_prices, increases
+
+
+def vectorized(base_prices, markup_types, markup_values, default_types, default_values):
+    result = pricing_service.apply_markups(base_prices, markup_types, markup_values, default_types, default_values)
+    return result.rounded_final_prices(), round2(result.percentage_increases)
+
+
+def make_rows(size, seed=1):
+    rng = random.Random(seed)
+    return (
+        [round(rng.uniform(0, 10000), 2) for _ in range(size)],
+        [rng.choice(('fixed', 'percentage', 'default')) for _ in range(size)],
+        [rng.choice((0, 5, 10, 12.5, 25, 40)) for _ in range(size)],
+        [rng.choice(('fixed', 'percentage')) for _ in range(size)],
+        [rng.choice((0, 10, 20)) for _ in range(size)],
+    )
+
+
+def as_columns(base_prices, markup_types, markup_values, default_types, default_values):
+    return (
+        np.asarray(base_prices, dtype=np.float64),
+        np.asarray(markup_types, dtype=object),
+        np.asarray(markup_values, dtype=object),
+        np.asarray(default_types, dtype=object),
+        np.asarray(default_values, dtype=object),
+    )
+
+
+def best_of(func, columns, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*columns)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Loop de markups vs motor vectorizado')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    # "listas" incluye la conversion desde listas de Python (lo que hacen los
+    # servicios hoy); "columnas" mide el motor con arrays ya armados.
+    print(f'{"filas":>10} {"loop (ms)":>11} {"listas (ms)":>12} {"speedup":>8} {"columnas (ms)":>14} {"speedup":>8}')
+    for size in args.sizes:
+        rows = make_rows(size)
+        columns = as_columns(*rows)
+        loop_time, expected = best_of(legacy_loop, rows, args.repeat)
+        lists_time, from_lists = best_of(vectorized, rows, args.repeat)
+        columns_time, from_columns = best_of(pricing_service.apply_markups, columns, args.repeat)
+        assert from_lists == expected, 'el motor vectorizado difiere del loop'
+        assert round2(from_columns.final_prices) == expected[0], 'el motor vectorizado difiere del loop'
+        print(
+            f'{size:>10} {loop_time * 1000:>11.2f} {lists_time * 1000:>12.2f} {loop_time / lists_time:>7.1f}x'
+            f' {columns_time * 1000:>14.2f} {loop_time / columns_time:>7.1f}x'
+        )
+
+
+if __name__ == '__main__':
+    main()
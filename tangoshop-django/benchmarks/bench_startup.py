@@ -0,0 +1,81 @@
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+# Lo que hace un worker antes de atender el primer request: setup de Django
+# y carga de las URLs (que importa vistas y servicios). Al final verifica que
+# no se haya creado ningun cliente de Firebase.
+STARTUP = '''
+import os
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tangoshop_project.settings')
+import django
+django.setup()
+from django.conf import settings
+from django.utils.module_loading import import_module
+import_module(settings.ROOT_URLCONF)
+from api.utils import firebase_config
+print(','.join(sorted(firebase_config._handles)))
+'''
+
+LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+
+
+def run_once():
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', STARTUP],
+        cwd=PROJECT_DIR, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        errors = [line for line in result.stderr.splitlines() if not line.startswith('import time:')]
+        sys.exit('El arranque fallo:\n' + '\n'.join(errors[-20:]))
+    total = 0
+    modules = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        modules.append((int(self_us), name))
+        if not indent:
+            total += int(cumulative_us)
+    return total / 1000, modules, result.stdout.strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tiempo de import al arrancar un worker (python -X importtime)')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=float(os.getenv('STARTUP_IMPORT_BUDGET_MS', '900')),
+                        help='falla si la mediana supera este valor')
+    parser.add_argument('--top', type=int, default=10, help='modulos con mayor tiempo propio a listar')
+    args = parser.parse_args()
+
+    totals = []
+    for _ in range(args.runs):
+        total_ms, modules, handles = run_once()
+        totals.append(total_ms)
+
+    median = statistics.median(totals)
+    print(f'{args.runs} corridas: mediana {median:.0f} ms, min {min(totals):.0f} ms, max {max(totals):.0f} ms '
+          f'(presupuesto {args.budget_ms:.0f} ms)')
+    print(f'modulos con mayor tiempo propio (ultima corrida):')
+    for self_us, name in sorted(modules, reverse=True)[:args.top]:
+        print(f'  {self_us / 1000:8.1f} ms  {name}')
+
+    failed = False
+    if handles:
+        print(f'ERROR: clientes de Firebase creados durante el import: {handles}')
+        failed = True
+    if median > args.budget_ms:
+        print(f'ERROR: el import supera el presupuesto por {median - args.budget_ms:.0f} ms')
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+import random
+from typing import Dict, List
+
+import bcrypt
+import numpy as np
+from google.cloud.firestore_v1.transforms import SERVER_TIMESTAMP
+
+# Datos sinteticos con la forma de las colecciones reales. La popularidad de
+# los productos y la cantidad de favoritos por revendedor siguen una ley de
+# potencias: pocos productos concentran la mayoria de los favoritos y pocos
+# revendedores tienen catalogos muy grandes, como en produccion.
+
+SCALES = {
+    'small': {'suppliers': 5, 'products': 200, 'resellers': 50, 'max_favorites': 60},
+    'medium': {'suppliers': 20, 'products': 2000, 'resellers': 300, 'max_favorites': 400},
+    'large': {'suppliers': 60, 'products': 10000, 'resellers': 1000, 'max_favorites': 2000},
+}
+
+PASSWORD = 'Secreta123'
+
+_CATEGORIES = ('mates', 'yerbas', 'termos', 'bombillas', 'accesorios')
+
+
+class Dataset:
+    def __init__(self, collections: Dict[str, Dict[str, Dict]], suppliers: List[str], products: List[str],
+                 resellers: List[str], emails: Dict[str, str]) -> None:
+        self.collections = collections
+        self.suppliers = suppliers
+        self.products = products
+        self.resellers = resellers
+        self.emails = emails
+
+    @property
+    def favorites(self) -> int:
+        return len(self.collections['favorites'])
+
+
+def _power_law_weights(count: int, alpha: float) -> np.ndarray:
+    weights = 1 / np.arange(1, count + 1, dtype=np.float64) ** alpha
+    return weights / weights.sum()
+
+
+def generate(suppliers: int, products: int, resellers: int, max_favorites: int, alpha: float = 1.1,
+             bcrypt_rounds: int = 4, seed: int = 1, product_snapshots: bool = True) -> Dataset:
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    password_hash = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(bcrypt_rounds)).decode()
+
+    users, supplier_docs, reseller_docs, product_docs, favorites = {}, {}, {}, {}, {}
+    emails = {}
+
+    def user(user_id: str, user_type: str, first_name: str, last_name: str) -> None:
+        email = f'{user_id}@bench.tangoshop'
+        emails[user_id] = email
+        users[user_id] = {
+            'email': email, 'password': password_hash, 'firstName': first_name, 'lastName': last_name,
+            'userType': user_type, 'phone': '2494000000', 'website': '', 'photoURL': '', 'isActive': True,
+        }
+
+    supplier_ids = [f'supplier{i:04d}' for i in range(suppliers)]
+    for supplier_id in supplier_ids:
+        user(supplier_id, 'supplier', f'Proveedor {supplier_id[-4:]}', '')
+        supplier_docs[supplier_id] = {'userId': supplier_id, 'companyName': f'Proveedor {supplier_id[-4:]}'}
+
+    product_ids = [f'product{i:06d}' for i in range(products)]
+    for product_id in product_ids:
+        product_docs[product_id] = {
+            'name': f'Producto {product_id[-6:]}',
+            'price': round(rng.lognormvariate(8, 0.8), 2),
+            'supplierId': rng.choice(supplier_ids),
+            'category': rng.choice(_CATEGORIES),
+            'isActive': rng.random() > 0.05,
+        }
+
+    reseller_ids = [f'reseller{i:05d}' for i in range(resellers)]
+    popularity = _power_law_weights(products, alpha)
+    for number, reseller_id in enumerate(reseller_ids):
+        user(reseller_id, 'reseller', f'Revendedor {number}', 'Bench')
+        reseller_docs[reseller_id] = {
+            'userId': reseller_id,
+            'markupType': rng.choice(('percentage', 'fixed')),
+            'defaultMarkupValue': rng.choice((0, 10, 15, 25, 40)),
+            'isActive': True,
+        }
+
+        # Tamano del catalogo ~ Pareto, acotado por max_favorites y products.
+        size = min(int(rng.paretovariate(1.2) * 5), max_favorites, products)
+        chosen = np_rng.choice(products, size=size, replace=False, p=popularity)
+        for product_id in sorted(product_ids[index] for index in chosen):
+            markup_type = rng.choices(('default', 'percentage', 'fixed'), weights=(5, 3, 2))[0]
+            favorites[f'{reseller_id}_{product_id}'] = {
+                'resellerId': reseller_id,
+                'productId': product_id,
+                'isActive': rng.random() > 0.03,
+                'markupType': markup_type,
+                'markupValue': 0 if markup_type == 'default' else rng.choice((5, 10, 20, 35, 50, 120)),
+            }
+            if product_snapshots:
+                product = product_docs[product_id]
+                favorites[f'{reseller_id}_{product_id}'].update({
+                    'productSnapshot': {'name': product['name'], 'price': product['price'], 'isActive': product['isActive']},
+                    'productSnapshotAt': SERVER_TIMESTAMP,
+                })
+
+    collections = {
+        'users': users,
+        'suppliers': supplier_docs,
+        'resellers': reseller_docs,
+        'products': product_docs,
+        'favorites': favorites,
+    }
+    return Dataset(collections, supplier_ids, product_ids, reseller_ids, emails)
@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', '2'))
+# Con mas de un hilo gunicorn usa workers gthread (ver BCRYPT_POOL_WORKERS).
+threads = int(os.getenv('GUNICORN_THREADS', '1'))
+wsgi_app = 'tangoshop_project.wsgi:application'
+
+
+def on_starting(server):
+    # Los archivos de metricas de una corrida anterior sumarian valores
+    # viejos a /api/metrics/.
+    multiproc_dir = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if multiproc_dir:
+        os.makedirs(multiproc_dir, exist_ok=True)
+        for name in os.listdir(multiproc_dir):
+            if name.endswith('.db'):
+                os.remove(os.path.join(multiproc_dir, name))
+
+    # Con DOCUMENT_CACHE_SOCKET los workers comparten el cache de documentos
+    # a traves de un proceso aparte que vive mientras viva el master.
+    if os.getenv('DOCUMENT_CACHE_SOCKET'):
+        manage = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'manage.py')
+        server.document_cache = subprocess.Popen([sys.executable, manage, 'document_cache_server'])
+
+
+def on_exit(server):
+    document_cache = getattr(server, 'document_cache', None)
+    if document_cache is not None:
+        document_cache.terminate()
+        document_cache.wait(timeout=5)
+
+
+def post_worker_init(worker):
+    # Firebase se inicializa en el primer uso; con FIREBASE_WARMUP cada worker
+    # abre la conexion con Firestore al arrancar, antes de recibir trafico.
+    from django.conf import settings
+
+    if getattr(settings, 'FIREBASE_WARMUP', True):
+        from api.utils.firebase_config import warm_up
+        warm_up()
+
+
+def worker_exit(server, worker):
+    # Antes de terminar el worker se escriben las notificaciones y demas
+    # trabajos en segundo plano que quedaron pendientes.
+    from api.utils.background import background_queue
+    background_queue.close()
+
+
+def child_exit(server, worker):
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
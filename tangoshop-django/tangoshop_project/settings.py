@@ -28,6 +28,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middlewares.metrics_middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -37,6 +38,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middlewares.profiling_middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'tangoshop_project.urls'
@@ -68,10 +70,10 @@ DATABASES = {
 
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'api.utils.json_codec.ORJSONRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
-        'rest_framework.parsers.JSONParser',
+        'api.utils.json_codec.ORJSONParser',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -103,3 +105,120 @@ FIREBASE_CREDENTIALS_PATH = os.getenv('FIREBASE_CREDENTIALS_PATH')
 
 JWT_SECRET = os.getenv('JWT_SECRET')
 JWT_ALGORITHM = os.getenv('JWT_ALGORITHM', 'HS256')
+
+FIRESTORE_GET_ALL_CHUNK_SIZE = int(os.getenv('FIRESTORE_GET_ALL_CHUNK_SIZE', '100'))
+FIRESTORE_GET_ALL_MAX_WORKERS = int(os.getenv('FIRESTORE_GET_ALL_MAX_WORKERS', '8'))
+SUPPLIER_BATCHED_LOOKUPS = os.getenv('SUPPLIER_BATCHED_LOOKUPS', 'True') == 'True'
+
+CATALOG_CACHE_ENABLED = os.getenv('CATALOG_CACHE_ENABLED', 'True') == 'True'
+CATALOG_CACHE_MAX_RESELLERS = int(os.getenv('CATALOG_CACHE_MAX_RESELLERS', '256'))
+CATALOG_CACHE_MAX_ITEMS = int(os.getenv('CATALOG_CACHE_MAX_ITEMS', '50000'))
+# Cada entrada abre 2 listeners mas uno cada 30 productos leidos, y cada uno
+# es un stream gRPC con su hilo cuya carga inicial se cobra como lecturas.
+# Al pasar el tope se desalojan las entradas menos usadas. Ninguna entrada
+# vive mas de CATALOG_CACHE_TTL segundos, por si un listener se corta.
+CATALOG_CACHE_MAX_LISTENERS = int(os.getenv('CATALOG_CACHE_MAX_LISTENERS', '100'))
+CATALOG_CACHE_TTL = int(os.getenv('CATALOG_CACHE_TTL', '600'))
+
+CATALOG_MAX_PAGE_SIZE = int(os.getenv('CATALOG_MAX_PAGE_SIZE', '500'))
+CATALOG_STREAM_BATCH_SIZE = int(os.getenv('CATALOG_STREAM_BATCH_SIZE', '200'))
+# El catalogo usa el productSnapshot de cada favorito y solo lee los
+# productos de los favoritos que no lo tienen. Las copias solo se mantienen
+# si corre manage.py watch_product_snapshots (bajo un supervisor, una sola
+# instancia) y reconcile_product_snapshots periodicamente; las escrituras de
+# productos de la API Node no las actualizan. Antes de activarlo en una base
+# existente correr reconcile_product_snapshots para completar las copias.
+# Una copia con mas de CATALOG_PRODUCT_SNAPSHOT_MAX_AGE segundos desde su
+# ultima verificacion se ignora y se lee el producto (0: sin limite).
+CATALOG_PRODUCT_SNAPSHOTS = os.getenv('CATALOG_PRODUCT_SNAPSHOTS', 'False') == 'True'
+CATALOG_PRODUCT_SNAPSHOT_MAX_AGE = float(os.getenv('CATALOG_PRODUCT_SNAPSHOT_MAX_AGE', '86400'))
+
+# Cache de lectura para documentos leidos por id. DOCUMENT_CACHE_TTLS son
+# pares coleccion=segundos; las colecciones que no figuran no se cachean. Las
+# escrituras de un worker invalidan su copia y la del cache compartido; las de
+# otros sistemas se ven al vencer el TTL. users no se cachea nunca (password e
+# isActive se leen siempre frescos). Con DOCUMENT_CACHE_SOCKET los workers
+# comparten el cache a traves de manage.py document_cache_server
+# (gunicorn.conf.py lo arranca solo) y cada copia local se verifica contra el,
+# asi las escrituras de otro worker se ven enseguida; con varios workers y sin
+# DOCUMENT_CACHE_SOCKET, se ven al vencer el TTL.
+DOCUMENT_CACHE_ENABLED = os.getenv('DOCUMENT_CACHE_ENABLED', 'True') == 'True'
+DOCUMENT_CACHE_TTLS = {
+    collection.strip(): float(ttl)
+    for collection, ttl in (
+        item.split('=') for item in os.getenv('DOCUMENT_CACHE_TTLS', 'resellers=30,suppliers=30,products=30').split(',')
+        if item.strip()
+    )
+}
+DOCUMENT_CACHE_MAX_ENTRIES = int(os.getenv('DOCUMENT_CACHE_MAX_ENTRIES', '20000'))
+DOCUMENT_CACHE_SOCKET = os.getenv('DOCUMENT_CACHE_SOCKET')
+DOCUMENT_CACHE_SOCKET_TIMEOUT_MS = float(os.getenv('DOCUMENT_CACHE_SOCKET_TIMEOUT_MS', '20'))
+DOCUMENT_CACHE_SERVER_MAX_ENTRIES = int(os.getenv('DOCUMENT_CACHE_SERVER_MAX_ENTRIES', '100000'))
+
+# Requests concurrentes e identicos al catalogo y a high-markup esperan el
+# calculo en curso en el mismo proceso (workers con hilos o ASGI).
+REQUEST_COALESCING_ENABLED = os.getenv('REQUEST_COALESCING_ENABLED', 'True') == 'True'
+
+# Catalogos publicos precalculados (manage.py publish_public_catalogs). Las
+# URLs versionadas se cachean por PUBLIC_CATALOG_IMMUTABLE_MAX_AGE; la URL
+# estable de cada revendedor por PUBLIC_CATALOG_MAX_AGE. Detras de nginx,
+# PUBLIC_CATALOG_SENDFILE_HEADER='X-Accel-Redirect' delega el envio del
+# archivo en la location interna PUBLIC_CATALOG_SENDFILE_PREFIX.
+PUBLIC_CATALOG_DIR = os.getenv('PUBLIC_CATALOG_DIR', str(BASE_DIR / 'public_catalogs'))
+PUBLIC_CATALOG_MAX_AGE = int(os.getenv('PUBLIC_CATALOG_MAX_AGE', '60'))
+PUBLIC_CATALOG_IMMUTABLE_MAX_AGE = int(os.getenv('PUBLIC_CATALOG_IMMUTABLE_MAX_AGE', '31536000'))
+PUBLIC_CATALOG_SENDFILE_HEADER = os.getenv('PUBLIC_CATALOG_SENDFILE_HEADER')
+PUBLIC_CATALOG_SENDFILE_PREFIX = os.getenv('PUBLIC_CATALOG_SENDFILE_PREFIX', '/internal/catalogs/')
+
+# Trabajos en segundo plano (api.utils.background): escrituras que el
+# request no necesita esperar, como notificaciones y rehash de passwords. Las
+# notificaciones se juntan durante NOTIFICATION_BATCH_DELAY_MS en un WriteBatch.
+# BACKGROUND_WORKERS=0 las ejecuta en el momento, dentro del request.
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', '2'))
+BACKGROUND_MAX_RETRIES = int(os.getenv('BACKGROUND_MAX_RETRIES', '5'))
+BACKGROUND_RETRY_BASE_MS = float(os.getenv('BACKGROUND_RETRY_BASE_MS', '200'))
+BACKGROUND_RETRY_MAX_MS = float(os.getenv('BACKGROUND_RETRY_MAX_MS', '30000'))
+BACKGROUND_DRAIN_TIMEOUT = float(os.getenv('BACKGROUND_DRAIN_TIMEOUT', '10'))
+NOTIFICATION_BATCH_DELAY_MS = float(os.getenv('NOTIFICATION_BATCH_DELAY_MS', '50'))
+
+# El pool de bcrypt (api.utils.password_hasher) solo sirve si el proceso
+# atiende otros requests mientras espera un hash: workers gthread
+# (GUNICORN_THREADS > 1) o ASGI. Con los workers sync el request espera igual
+# y el pool solo suma IPC, por eso BCRYPT_POOL_WORKERS=0 (bcrypt en el hilo
+# del request, sin BCRYPT_MAX_QUEUE) es el valor por defecto.
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+BCRYPT_POOL_WORKERS = int(os.getenv('BCRYPT_POOL_WORKERS', '0'))
+BCRYPT_MAX_QUEUE = int(os.getenv('BCRYPT_MAX_QUEUE', '32'))
+
+EMAIL_CACHE_MAX_ENTRIES = int(os.getenv('EMAIL_CACHE_MAX_ENTRIES', '10000'))
+EMAIL_CACHE_TTL = int(os.getenv('EMAIL_CACHE_TTL', '300'))
+EMAIL_CACHE_NEGATIVE_TTL = int(os.getenv('EMAIL_CACHE_NEGATIVE_TTL', '5'))
+
+REFRESH_TOKEN_LEGACY_LOOKUP = os.getenv('REFRESH_TOKEN_LEGACY_LOOKUP', 'True') == 'True'
+
+JWT_CACHE_SIZE = int(os.getenv('JWT_CACHE_SIZE', '4096'))
+JWT_CACHE_MAX_TTL = int(os.getenv('JWT_CACHE_MAX_TTL', '3600'))
+
+FIREBASE_WARMUP = os.getenv('FIREBASE_WARMUP', 'True') == 'True'
+
+# 'firebase' usa el proyecto configurado; 'memory' un Firestore en memoria
+# (api.utils.memory_firestore) para correr la API y los benchmarks offline.
+FIRESTORE_BACKEND = os.getenv('FIRESTORE_BACKEND', 'firebase')
+FIRESTORE_MEMORY_LATENCY_MS = float(os.getenv('FIRESTORE_MEMORY_LATENCY_MS', '0'))
+FIRESTORE_MEMORY_FIXTURE = os.getenv('FIRESTORE_MEMORY_FIXTURE')
+
+# Metricas de Prometheus en /api/metrics/. Para agregar los workers de
+# gunicorn, PROMETHEUS_MULTIPROC_DIR debe estar definido en el entorno antes
+# de arrancar el master (ver gunicorn.conf.py).
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# Perfilado de requests: con X-Profile igual a PROFILING_TOKEN, o al azar con
+# probabilidad PROFILING_SAMPLE_RATE. PROFILING_MODE es 'deterministic'
+# (cProfile, .pstats) o 'sampling' (JSON de speedscope).
+PROFILING_TOKEN = os.getenv('PROFILING_TOKEN')
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_MODE = os.getenv('PROFILING_MODE', 'deterministic')
+PROFILING_DIR = os.getenv('PROFILING_DIR', '/tmp/tangoshop-profiles')
+PROFILING_TOP = int(os.getenv('PROFILING_TOP', '5'))
+PROFILING_SAMPLE_INTERVAL_MS = float(os.getenv('PROFILING_SAMPLE_INTERVAL_MS', '5'))
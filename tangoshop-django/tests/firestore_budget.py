@@ -0,0 +1,33 @@
+from contextlib import contextmanager
+from typing import Optional
+
+from api.utils.metrics import observe
+
+# Equivalente de assertNumQueries para Firestore: cuenta las operaciones que
+# pasan por el cliente instrumentado (api.utils.instrumented_firestore),
+# incluidas las de hilos del pool y tareas async lanzadas adentro, y falla si
+# se supera alguno de los limites. Sirve como context manager y decorador:
+#
+#     with firestore_budget(operations=3, reads=120):
+#         client.get('/api/catalog/my-catalog/', ...)
+
+
+@contextmanager
+def firestore_budget(operations: Optional[int] = None, reads: Optional[int] = None,
+                     writes: Optional[int] = None):
+    with observe() as stats:
+        yield stats
+
+    exceeded = [
+        f'{name}: {used} > {limit}'
+        for name, used, limit in (
+            ('operaciones', stats.total_operations, operations),
+            ('lecturas', stats.reads, reads),
+            ('escrituras', stats.writes, writes),
+        )
+        if limit is not None and used > limit
+    ]
+    if exceeded:
+        raise AssertionError(
+            f'Presupuesto de Firestore superado ({", ".join(exceeded)}); operaciones: {stats.operations}'
+        )
@@ -0,0 +1,104 @@
+import itertools
+from unittest.mock import AsyncMock, MagicMock
+
+
+def make_snapshot(doc_id, data, collection='docs', update_time=None):
+    snap = MagicMock()
+    snap.id = doc_id
+    snap.reference.path = f'{collection}/{doc_id}'
+    snap.update_time = update_time
+    snap.exists = data is not None
+    snap.to_dict.return_value = dict(data) if data is not None else None
+    snap.get.side_effect = lambda field: (data or {}).get(field)
+    return snap
+
+
+def make_ref(collection, doc_id):
+    ref = MagicMock()
+    ref.id = doc_id
+    ref.collection_name = collection
+    return ref
+
+
+def make_db(collections, queries=None):
+    # collections: {nombre: {doc_id: data}}; queries: {nombre: [data, ...]}
+    # para las consultas where(...).where(...).get() de cada coleccion.
+    db = MagicMock()
+    db.listeners = []
+    queries = queries or {}
+
+    def listen(target):
+        def on_snapshot(callback):
+            db.listeners.append((target, callback))
+            return MagicMock()
+        return on_snapshot
+
+    created = {}
+    auto_ids = itertools.count()
+
+    def collection(name):
+        if name in created:
+            return created[name]
+        docs = collections.get(name, {})
+        coll = created[name] = MagicMock()
+
+        def document(doc_id=None):
+            if doc_id is None:
+                doc_id = f'{name}-auto-{next(auto_ids)}'
+            ref = make_ref(name, doc_id)
+            ref.get.side_effect = lambda field_paths=None: make_snapshot(doc_id, docs.get(doc_id), name)
+            ref.on_snapshot.side_effect = listen(f'{name}/{doc_id}')
+            return ref
+
+        coll.document.side_effect = document
+        # select() no filtra campos en los mocks: devuelve la misma coleccion.
+        coll.select.return_value = coll
+        query = coll.where.return_value.where.return_value
+        query.get.return_value = [make_snapshot(f'{name}-{i}', data, name) for i, data in enumerate(queries.get(name, []))]
+        query.on_snapshot.side_effect = listen(f'{name}?query')
+        coll.where.return_value.on_snapshot.side_effect = listen(f'{name}?in')
+        return coll
+
+    def get_all(refs, field_paths=None):
+        return [make_snapshot(ref.id, collections.get(ref.collection_name, {}).get(ref.id), ref.collection_name) for ref in refs]
+
+    db.collection.side_effect = collection
+    db.get_all.side_effect = get_all
+    return db
+
+
+
+def make_async_db(collections, queries=None):
+    # Igual que make_db pero con la interfaz de AsyncClient: get() de
+    # documentos y consultas son corrutinas y get_all es un async generator.
+    db = make_db(collections, queries)
+    sync_collection = db.collection.side_effect
+    sync_get_all = db.get_all.side_effect
+    wrapped = set()
+
+    def collection(name):
+        coll = sync_collection(name)
+        if name not in wrapped:
+            wrapped.add(name)
+            sync_document = coll.document.side_effect
+
+            def document(doc_id=None):
+                ref = sync_document(doc_id)
+                ref.get = AsyncMock(side_effect=ref.get.side_effect)
+                ref.set = AsyncMock()
+                ref.update = AsyncMock()
+                return ref
+
+            coll.document.side_effect = document
+            query = coll.where.return_value.where.return_value
+            query.get = AsyncMock(return_value=query.get.return_value)
+            coll.where.return_value.get = AsyncMock(return_value=[])
+        return coll
+
+    async def get_all(refs, field_paths=None):
+        for snap in sync_get_all(refs):
+            yield snap
+
+    db.collection.side_effect = collection
+    db.get_all.side_effect = get_all
+    return db
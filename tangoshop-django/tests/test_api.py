@@ -1,8 +1,10 @@
 import json
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 from django.test import Client, TestCase
 
+from tests.firestore_mocks import make_db
+
 
 class TangoShopAPITest(TestCase):
     def setUp(self):
@@ -28,3 +30,70 @@ class TangoShopAPITest(TestCase):
         data = json.loads(response.content)
         self.assertTrue(data['success'])
         self.assertIn('data', data)
+
+    @patch('api.views.catalog_service.iter_reseller_catalog')
+    @patch('api.middlewares.auth_middleware.jwt.decode')
+    def test_my_catalog_stream(self, mock_decode: MagicMock, mock_iter: MagicMock):
+        mock_decode.return_value = {'userId': 'r1', 'email': 'r@b.com', 'userType': 'reseller'}
+        mock_iter.return_value = iter([[{'productId': 'p1'}, {'productId': 'p2'}], [{'productId': 'p3'}]])
+        response = self.client.get('/api/catalog/my-catalog/?stream=1', HTTP_AUTHORIZATION='Bearer abc')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['productId'] for line in lines], ['p1', 'p2', 'p3'])
+
+    @patch('api.middlewares.auth_middleware.jwt.decode')
+    def test_my_catalog_rejects_invalid_page_size(self, mock_decode: MagicMock):
+        mock_decode.return_value = {'userId': 'r1', 'email': 'r@b.com', 'userType': 'reseller'}
+        response = self.client.get('/api/catalog/my-catalog/?page_size=0', HTTP_AUTHORIZATION='Bearer abc')
+        self.assertEqual(response.status_code, 400)
+
+    @patch('api.middlewares.auth_middleware.jwt.decode')
+    def test_high_markup_conditional_get(self, mock_decode: MagicMock):
+        mock_decode.return_value = {'userId': 's1', 'email': 's@b.com', 'userType': 'supplier'}
+        db = make_db(
+            {
+                'products': {'p1': {'name': 'Mate', 'price': 100, 'supplierId': 's1'}},
+                'resellers': {'r1': {'markupType': 'fixed', 'defaultMarkupValue': 50}},
+                'users': {'r1': {'firstName': 'Ana', 'lastName': 'Diaz', 'email': 'ana@b.com'}},
+            },
+            {'favorites': [{'resellerId': 'r1', 'markupType': 'default'}]},
+        )
+        url = '/api/suppliers/products/p1/high-markup-resellers/'
+
+        with patch('api.services.supplier_service.db', db):
+            response = self.client.get(url, HTTP_AUTHORIZATION='Bearer abc')
+            self.assertEqual(response.status_code, 200)
+            etag = response['ETag']
+
+            response = self.client.get(url, HTTP_AUTHORIZATION='Bearer abc', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.content, b'')
+            self.assertEqual(response['ETag'], etag)
+
+            response = self.client.get(url, HTTP_AUTHORIZATION='Bearer abc', HTTP_IF_NONE_MATCH='"otro"')
+            self.assertEqual(response.status_code, 200)
+
+    @patch('api.async_views.catalog_service.aget_reseller_catalog', new_callable=AsyncMock)
+    @patch('api.middlewares.auth_middleware.jwt.decode')
+    def test_async_catalog(self, mock_decode: MagicMock, mock_catalog: AsyncMock):
+        mock_decode.return_value = {'userId': 'r1', 'email': 'r@b.com', 'userType': 'reseller'}
+        mock_catalog.return_value = {'totalProducts': 0, 'products': []}
+        response = self.client.get('/api/async/catalog/my-catalog/', HTTP_AUTHORIZATION='Bearer abc')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['data']['totalProducts'], 0)
+        self.assertIn('ETag', response)
+
+        mock_decode.return_value = {'userId': 's1', 'email': 's@b.com', 'userType': 'supplier'}
+        response = self.client.get('/api/async/catalog/my-catalog/', HTTP_AUTHORIZATION='Bearer xyz')
+        self.assertEqual(response.status_code, 403)
+
+    @patch('api.async_views.auth_service.alogin', new_callable=AsyncMock)
+    def test_async_login(self, mock_login: AsyncMock):
+        mock_login.return_value = {'token': 'abc', 'refreshToken': 'def'}
+        response = self.client.post('/api/async/auth/login/', data=json.dumps({'email': 'a@b.com', 'password': 'x'}), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(json.loads(response.content)['success'])
+
+        response = self.client.get('/api/async/auth/login/')
+        self.assertEqual(response.status_code, 405)
@@ -0,0 +1,52 @@
+import time
+from unittest.mock import MagicMock
+
+import jwt
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from api.middlewares.auth_middleware import FirebaseAuthMiddleware
+
+
+@override_settings(JWT_CACHE_SIZE=16)
+class TokenCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.get_response = MagicMock(return_value='ok')
+        self.middleware = FirebaseAuthMiddleware(self.get_response)
+        self.middleware.jwt_secret = 'secreto'
+
+    def _token(self, **claims):
+        payload = {'userId': 'u1', 'email': 'a@b.com', 'userType': 'reseller', 'exp': int(time.time()) + 60}
+        payload.update(claims)
+        return jwt.encode(payload, 'secreto', algorithm='HS256')
+
+    def _call(self, token):
+        request = self.factory.get('/api/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return request, self.middleware(request)
+
+    def test_verified_claims_are_reused(self):
+        token = self._token()
+        self._call(token)
+        request, _ = self._call(token)
+
+        self.assertEqual(request.user_data['userId'], 'u1')
+        self.assertEqual(self.middleware.token_cache.stats()['hits'], 1)
+
+    def test_invalid_and_expired_tokens_are_not_cached(self):
+        _, response = self._call(self._token(exp=int(time.time()) - 10))
+        self.assertEqual(response.status_code, 401)
+        _, response = self._call(self._token() + 'x')
+        self.assertEqual(response.status_code, 401)
+
+        self.assertEqual(len(self.middleware.token_cache), 0)
+
+    def test_entries_expire_with_the_token(self):
+        token = self._token(exp=int(time.time()) + 1)
+        self._call(token)
+        self.assertEqual(len(self.middleware.token_cache), 1)
+
+        time.sleep(1.1)
+        _, response = self._call(token)
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(len(self.middleware.token_cache), 0)
@@ -0,0 +1,225 @@
+import time
+from io import StringIO
+from unittest.mock import patch
+
+import bcrypt
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from google.api_core.exceptions import AlreadyExists
+
+from api.services.auth_service import auth_service, email_key, refresh_token_id
+from api.utils import metrics
+from api.utils.document_cache import CachedFirestore, DocumentCache
+from api.utils.instrumented_firestore import InstrumentedFirestore
+from api.utils.memory_firestore import MemoryFirestore, MemoryWriteBatch
+from tests.firestore_mocks import make_async_db, make_db, make_snapshot
+
+
+class EmailIndexTest(SimpleTestCase):
+    def setUp(self):
+        auth_service.email_index.clear()
+        self.addCleanup(auth_service.email_index.clear)
+
+    def test_known_email_is_read_with_a_document_get(self):
+        db = make_db({'users': {'u1': {'email': 'a@b.com'}}})
+        query = db.collection('users').where.return_value
+        query.get.return_value = [make_snapshot('u1', {'email': 'a@b.com'}, 'users')]
+
+        with patch('api.services.auth_service.db', db):
+            self.assertEqual(auth_service._find_user_by_email('a@b.com').id, 'u1')
+            self.assertEqual(auth_service._find_user_by_email('a@b.com').id, 'u1')
+
+        self.assertEqual(query.get.call_count, 1)
+        db.collection('users').document.assert_called_once_with('u1')
+
+    def test_unknown_email_is_negatively_cached(self):
+        db = make_db({'users': {}})
+        query = db.collection('users').where.return_value
+        query.get.return_value = []
+
+        with patch('api.services.auth_service.db', db):
+            self.assertIsNone(auth_service._find_user_by_email('nuevo@b.com'))
+            self.assertIsNone(auth_service._find_user_by_email('nuevo@b.com'))
+
+        self.assertEqual(query.get.call_count, 1)
+
+    def test_negative_entry_is_short_lived(self):
+        auth_service.email_negative_ttl = 0.05
+        self.addCleanup(setattr, auth_service, 'email_negative_ttl', 5)
+        db = make_db({'users': {}})
+        query = db.collection('users').where.return_value
+        query.get.return_value = []
+
+        with patch('api.services.auth_service.db', db):
+            auth_service._find_user_by_email('nuevo@b.com')
+            # Se registra en otro worker: pasado el TTL el login lo encuentra.
+            query.get.return_value = [make_snapshot('u1', {'email': 'nuevo@b.com'}, 'users')]
+            time.sleep(0.06)
+            self.assertEqual(auth_service._find_user_by_email('nuevo@b.com').id, 'u1')
+
+    def test_stale_entry_falls_back_to_query(self):
+        auth_service._remember_email('a@b.com', 'u1')
+        db = make_db({'users': {'u1': {'email': 'otro@b.com'}}})
+        query = db.collection('users').where.return_value
+        query.get.return_value = [make_snapshot('u2', {'email': 'a@b.com'}, 'users')]
+
+        with patch('api.services.auth_service.db', db):
+            self.assertEqual(auth_service._find_user_by_email('a@b.com').id, 'u2')
+
+        self.assertEqual(auth_service.email_index.get('a@b.com'), 'u2')
+
+
+class RefreshTokenTest(SimpleTestCase):
+    def test_tokens_are_stored_under_their_hash(self):
+        db = make_db({})
+        with patch('api.services.auth_service.db', db):
+            _, refresh_token = auth_service._generate_tokens('u1', 'a@b.com', 'reseller')
+
+        db.collection('refreshTokens').document.assert_called_once_with(refresh_token_id(refresh_token))
+
+    def test_logout_is_a_direct_document_read(self):
+        token_id = refresh_token_id('abc')
+        db = make_db({'refreshTokens': {token_id: {'userId': 'u1', 'token': 'abc', 'isValid': True}}})
+
+        with patch('api.services.auth_service.db', db):
+            auth_service.logout('u1', 'abc')
+            with self.assertRaisesMessage(ValueError, 'Token no encontrado'):
+                auth_service.logout('u2', 'abc')
+
+        db.collection('refreshTokens').where.assert_not_called()
+
+    @override_settings(DOCUMENT_CACHE_TTLS={'refreshTokens': 30}, DOCUMENT_CACHE_SOCKET=None)
+    def test_revoking_a_queried_token_is_counted_and_invalidates_the_cache(self):
+        raw = MemoryFirestore()
+        raw.load({'refreshTokens': {'auto-id': {'userId': 'u1', 'token': 'abc', 'isValid': True}}})
+        db = CachedFirestore(InstrumentedFirestore(raw), DocumentCache())
+        legacy = db.collection('refreshTokens').document('auto-id')
+        legacy.get()
+        token = metrics.start_request()
+        self.addCleanup(metrics.end_request, token)
+
+        with patch('api.services.auth_service.db', db):
+            auth_service.logout('u1', 'abc')
+
+        self.assertEqual(metrics.current_request().operations.get('update'), 1)
+        self.assertFalse(legacy.get().to_dict()['isValid'])
+
+    def test_migration_rewrites_legacy_documents(self):
+        db = make_db({})
+        legacy = make_snapshot('auto-id', {'userId': 'u1', 'token': 'abc', 'isValid': True}, 'refreshTokens')
+        migrated = make_snapshot(refresh_token_id('def'), {'userId': 'u1', 'token': 'def', 'isValid': True}, 'refreshTokens')
+        db.collection('refreshTokens').order_by.return_value.limit.return_value.get.return_value = [legacy, migrated]
+
+        with patch('api.management.commands.migrate_refresh_tokens.db', db):
+            call_command('migrate_refresh_tokens', stdout=StringIO())
+
+        batch = db.batch.return_value
+        self.assertEqual(batch.set.call_args.args[0].id, refresh_token_id('abc'))
+        self.assertEqual(batch.delete.call_args.args[0].id, 'auto-id')
+        db.write_option.assert_called_once_with(last_update_time=legacy.update_time)
+        batch.commit.assert_called_once()
+
+    def test_migration_does_not_revive_a_token_revoked_before_commit(self):
+        raw = MemoryFirestore()
+        raw.load({'refreshTokens': {'auto-id': {'userId': 'u1', 'token': 'abc', 'isValid': True}}})
+        commit = MemoryWriteBatch.commit
+
+        def revoke_first(batch, *args, **kwargs):
+            if not revoked:
+                revoked.append(1)
+                raw.collection('refreshTokens').document('auto-id').update({'isValid': False})
+            return commit(batch, *args, **kwargs)
+
+        revoked = []
+        with patch('api.management.commands.migrate_refresh_tokens.db', raw), \
+                patch.object(MemoryWriteBatch, 'commit', autospec=True, side_effect=revoke_first):
+            call_command('migrate_refresh_tokens', stdout=StringIO())
+
+        self.assertEqual(raw.dump()['refreshTokens'], {
+            refresh_token_id('abc'): {'userId': 'u1', 'token': 'abc', 'isValid': False},
+        })
+
+
+@override_settings(BCRYPT_POOL_WORKERS=0, BCRYPT_ROUNDS=4)
+class RegistrationTest(SimpleTestCase):
+    payload = {'email': 'Nuevo@B.com', 'password': 'secreta123', 'firstName': 'Ana', 'lastName': 'Gomez'}
+
+    def setUp(self):
+        auth_service.email_index.clear()
+        self.addCleanup(auth_service.email_index.clear)
+
+    def test_registration_is_a_single_batch_commit(self):
+        db = make_db({'users': {}})
+        db.collection('users').where.return_value.get.return_value = []
+
+        with patch('api.services.auth_service.db', db), \
+                patch('api.services.auth_service.notification_writer') as notifications:
+            result = auth_service.register_reseller(self.payload)
+
+        batch = db.batch.return_value
+        batch.commit.assert_called_once_with()
+        self.assertEqual(batch.set.call_count, 3)
+        guard = batch.create.call_args.args[0]
+        self.assertEqual((guard.collection_name, guard.id), ('userEmails', 'Nuevo@B.com'))
+        for name in ('users', 'resellers', 'notifications', 'refreshTokens'):
+            db.collection(name).add.assert_not_called()
+        self.assertEqual(auth_service.email_index.get('Nuevo@B.com'), result['user']['userId'])
+        # La bienvenida queda para el escritor en segundo plano.
+        notifications.add.assert_called_once()
+        self.assertEqual(notifications.add.call_args.args[0]['userId'], result['user']['userId'])
+
+    def test_registration_ignores_and_replaces_a_cached_miss(self):
+        auth_service._remember_email('Nuevo@B.com', None)
+        db = make_db({'users': {}})
+        query = db.collection('users').where.return_value
+        query.get.return_value = []
+
+        with patch('api.services.auth_service.db', db), \
+                patch('api.services.auth_service.notification_writer'):
+            result = auth_service.register_reseller(self.payload)
+
+        query.get.assert_called_once()
+        self.assertEqual(auth_service.email_index.get('Nuevo@B.com'), result['user']['userId'])
+
+    def test_email_key_is_case_sensitive(self):
+        # Igual que la consulta por email: A@b.com y a@b.com son cuentas distintas.
+        self.assertNotEqual(email_key('A@b.com'), email_key('a@b.com'))
+        self.assertEqual(email_key('a/b%2F@c.com'), 'a%2Fb%252F@c.com')
+
+    def test_duplicate_email_rolls_back_the_batch(self):
+        db = make_db({'users': {}})
+        db.collection('users').where.return_value.get.return_value = []
+        db.batch.return_value.commit.side_effect = AlreadyExists('userEmails/Nuevo@B.com')
+
+        with patch('api.services.auth_service.db', db), \
+                patch('api.services.auth_service.notification_writer') as notifications:
+            with self.assertRaisesMessage(ValueError, 'El email ya esta registrado'):
+                auth_service.register_reseller(self.payload)
+
+        self.assertIsNone(auth_service.email_index.get('Nuevo@B.com'))
+        notifications.add.assert_not_called()
+
+
+@override_settings(BCRYPT_POOL_WORKERS=0, BCRYPT_ROUNDS=4)
+class AsyncLoginTest(SimpleTestCase):
+    def setUp(self):
+        auth_service.email_index.clear()
+        self.addCleanup(auth_service.email_index.clear)
+
+    async def test_login_merges_profile_and_stores_refresh_token(self):
+        hashed = bcrypt.hashpw(b'secreta123', bcrypt.gensalt(4)).decode()
+        db = make_async_db({
+            'users': {'u1': {'email': 'a@b.com', 'password': hashed, 'userType': 'reseller', 'firstName': 'Ana'}},
+            'resellers': {'u1': {'markupType': 'fixed', 'defaultMarkupValue': 5}},
+        })
+        auth_service._remember_email('a@b.com', 'u1')
+
+        with patch('api.services.auth_service.async_db', db):
+            result = await auth_service.alogin({'email': 'a@b.com', 'password': 'secreta123'})
+            with self.assertRaisesMessage(ValueError, 'Credenciales invalidas'):
+                await auth_service.alogin({'email': 'a@b.com', 'password': 'otra'})
+
+        self.assertEqual(result['user']['firstName'], 'Ana')
+        self.assertEqual(result['user']['defaultMarkupValue'], 5)
+        db.collection('refreshTokens').document.assert_called_once_with(refresh_token_id(result['refreshToken']))
@@ -0,0 +1,136 @@
+import threading
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, override_settings
+from google.api_core.exceptions import ServiceUnavailable
+from prometheus_client import REGISTRY
+
+from api.utils import firebase_config
+from api.utils.background import BackgroundQueue, BatchedWriter
+from api.utils.instrumented_firestore import InstrumentedFirestore
+from api.utils.memory_firestore import MemoryFirestore, MemoryWriteBatch
+
+
+def sample(job, result):
+    return REGISTRY.get_sample_value('tangoshop_background_jobs_total', {'job': job, 'result': result}) or 0
+
+
+@override_settings(BACKGROUND_WORKERS=2, BACKGROUND_RETRY_BASE_MS=1, BACKGROUND_RETRY_MAX_MS=5)
+class BackgroundQueueTest(SimpleTestCase):
+    def setUp(self):
+        self.queue = BackgroundQueue()
+        self.addCleanup(self.queue.close, 1)
+
+    def test_failed_jobs_are_retried_with_backoff(self):
+        calls, before = [], sample('test_job', 'retry')
+
+        def flaky():
+            calls.append(threading.current_thread().name)
+            if len(calls) < 3:
+                raise ServiceUnavailable('Firestore no disponible')
+
+        with self.assertLogs('api.utils.background', 'WARNING'):
+            self.queue.submit('test_job', flaky)
+            self.assertTrue(self.queue.drain(2))
+
+        self.assertEqual(len(calls), 3)
+        self.assertTrue(all(name.startswith('background-') for name in calls))
+        self.assertEqual(sample('test_job', 'retry') - before, 2)
+
+    @override_settings(BACKGROUND_MAX_RETRIES=2)
+    def test_gives_up_after_max_retries(self):
+        calls, before = [], sample('test_job', 'failed')
+
+        def failing():
+            calls.append(1)
+            raise ServiceUnavailable('Firestore no disponible')
+
+        with self.assertLogs('api.utils.background', 'ERROR'):
+            self.queue.submit('test_job', failing)
+            self.queue.drain(2)
+
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(sample('test_job', 'failed') - before, 1)
+
+    def test_jobs_without_retry_run_once(self):
+        calls = []
+
+        def failing():
+            calls.append(1)
+            raise ServiceUnavailable('Firestore no disponible')
+
+        with self.assertLogs('api.utils.background', 'ERROR'):
+            self.queue.submit('test_job', failing, retry=False)
+            self.assertTrue(self.queue.drain(2))
+
+        self.assertEqual(len(calls), 1)
+
+    def test_drain_does_not_wait_for_delays(self):
+        done = threading.Event()
+        self.queue.submit('test_job', done.set, delay=60)
+
+        self.assertTrue(self.queue.drain(2))
+        self.assertTrue(done.is_set())
+
+    def test_drain_reports_unfinished_jobs(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        self.queue.submit('test_job', release.wait)
+
+        self.assertFalse(self.queue.drain(0.05))
+        release.set()
+        self.assertTrue(self.queue.drain(2))
+
+    def test_runs_inline_when_disabled_or_closed(self):
+        threads = []
+        with override_settings(BACKGROUND_WORKERS=0):
+            self.queue.submit('test_job', lambda: threads.append(threading.current_thread()))
+        self.queue.close(1)
+        self.queue.submit('test_job', lambda: threads.append(threading.current_thread()))
+
+        self.assertEqual(threads, [threading.current_thread()] * 2)
+
+
+@override_settings(BACKGROUND_WORKERS=2, BACKGROUND_RETRY_BASE_MS=1, NOTIFICATION_BATCH_DELAY_MS=1000)
+class BatchedWriterTest(SimpleTestCase):
+    def setUp(self):
+        self.raw = MemoryFirestore()
+        patcher = patch.dict(firebase_config._handles, {'db': InstrumentedFirestore(self.raw)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.queue = BackgroundQueue()
+        self.addCleanup(self.queue.close, 1)
+        self.writer = BatchedWriter('notifications', self.queue)
+
+    def test_pending_writes_share_one_batch(self):
+        ids = [self.writer.add({'userId': f'u{number}', 'type': 'welcome'}) for number in range(5)]
+        self.assertTrue(self.queue.drain(2))
+
+        notifications = self.raw.dump()['notifications']
+        self.assertEqual(sorted(notifications), sorted(ids))
+        self.assertEqual(self.raw.stats()['rpcs'], 1)
+
+    def test_batches_are_capped_at_500_writes(self):
+        for number in range(501):
+            self.writer.add({'userId': f'u{number}', 'type': 'welcome'})
+        self.assertTrue(self.queue.drain(2))
+
+        self.assertEqual(len(self.raw.dump()['notifications']), 501)
+        self.assertEqual(self.raw.stats()['rpcs'], 2)
+
+    def test_retried_commit_does_not_duplicate(self):
+        commit, attempts = MemoryWriteBatch.commit, []
+
+        def unavailable_once(batch, *args, **kwargs):
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise ServiceUnavailable('Firestore no disponible')
+            return commit(batch, *args, **kwargs)
+
+        with patch.object(MemoryWriteBatch, 'commit', autospec=True, side_effect=unavailable_once), \
+                self.assertLogs('api.utils.background', 'WARNING'):
+            doc_id = self.writer.add({'userId': 'u1', 'type': 'welcome'})
+            self.assertTrue(self.queue.drain(2))
+
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(list(self.raw.dump()['notifications']), [doc_id])
@@ -0,0 +1,266 @@
+import math
+import time
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, override_settings
+
+from api.models import Favorite, Reseller
+from api.services.catalog_service import catalog_service
+from api.utils.conditional import ContentVersion
+from tests.firestore_mocks import make_async_db, make_db, make_snapshot
+
+
+class CatalogServiceTest(SimpleTestCase):
+    def setUp(self):
+        catalog_service.cache.clear()
+
+    def test_catalog_prices_match_markup_rules(self):
+        db = make_db(
+            {
+                'resellers': {'r1': {'markupType': 'percentage', 'defaultMarkupValue': 10}},
+                'products': {
+                    'p1': {'name': 'Mate', 'price': 100, 'isActive': True},
+                    'p2': {'name': 'Yerba', 'price': 20.5, 'isActive': True},
+                    'p3': {'name': 'Termo', 'price': 300, 'isActive': False},
+                },
+            },
+            {
+                'favorites': [
+                    {'productId': 'p1', 'markupType': 'fixed', 'markupValue': 5},
+                    {'productId': 'p2', 'markupType': 'default'},
+                    {'productId': 'p3', 'markupType': 'percentage', 'markupValue': 50},
+                    {'productId': 'missing', 'markupType': 'fixed', 'markupValue': 1},
+                ],
+            },
+        )
+
+        with patch('api.services.catalog_service.db', db):
+            result = catalog_service.get_reseller_catalog('r1')
+
+        self.assertEqual(result['totalProducts'], 2)
+        self.assertEqual(result['products'], [
+            {'productId': 'p1', 'name': 'Mate', 'basePrice': 100, 'markupType': 'fixed', 'markupValue': 5, 'finalPrice': 105},
+            {'productId': 'p2', 'name': 'Yerba', 'basePrice': 20.5, 'markupType': 'percentage', 'markupValue': 10, 'finalPrice': 22.55},
+        ])
+        # Como antes: precio y markup fijo enteros dan un precio final entero.
+        self.assertIsInstance(result['products'][0]['finalPrice'], int)
+
+    @override_settings(CATALOG_CACHE_ENABLED=False)
+    def test_product_without_name_keeps_null_name(self):
+        db = make_db(
+            {
+                'resellers': {'r1': {'markupType': 'fixed', 'defaultMarkupValue': 1}},
+                'products': {'p1': {'price': 10, 'isActive': True}},
+            },
+            {'favorites': [{'productId': 'p1', 'markupType': 'default'}]},
+        )
+
+        with patch('api.services.catalog_service.db', db):
+            result = catalog_service.get_reseller_catalog('r1')
+
+        self.assertIsNone(result['products'][0]['name'])
+
+    @override_settings(FIRESTORE_GET_ALL_CHUNK_SIZE=50, CATALOG_CACHE_ENABLED=False)
+    def test_catalog_round_trips_scale_with_chunks(self):
+        total = 820
+        db = make_db(
+            {
+                'resellers': {'r1': {'markupType': 'fixed', 'defaultMarkupValue': 1}},
+                'products': {f'p{i}': {'name': f'Producto {i}', 'price': 10, 'isActive': True} for i in range(total)},
+            },
+            {'favorites': [{'productId': f'p{i}', 'markupType': 'default'} for i in range(total)]},
+        )
+
+        with patch('api.services.catalog_service.db', db):
+            result = catalog_service.get_reseller_catalog('r1')
+
+        self.assertEqual(result['totalProducts'], total)
+        self.assertEqual(db.get_all.call_count, math.ceil(total / 50))
+        product_reads = [c for c in db.collection.call_args_list if c.args == ('products',)]
+        self.assertEqual(len(product_reads), 1)
+
+
+    @override_settings(CATALOG_CACHE_ENABLED=False)
+    async def test_async_catalog_matches_sync(self):
+        collections = {
+            'resellers': {'r1': {'markupType': 'percentage', 'defaultMarkupValue': 15}},
+            'products': {f'p{i}': {'name': f'Producto {i}', 'price': 10 + i, 'isActive': True} for i in range(40)},
+        }
+        queries = {'favorites': [{'productId': f'p{i}', 'markupType': 'default'} for i in range(40)]}
+
+        with patch('api.services.catalog_service.db', make_db(collections, queries)):
+            expected = catalog_service.get_reseller_catalog('r1')
+        async_db = make_async_db(collections, queries)
+        with patch('api.services.catalog_service.async_db', async_db):
+            result = await catalog_service.aget_reseller_catalog('r1')
+
+        self.assertEqual(result, expected)
+        async_db.collection('resellers').document.assert_called_once_with('r1')
+
+    async def test_async_catalog_rejects_unknown_reseller(self):
+        with patch('api.services.catalog_service.async_db', make_async_db({'resellers': {}})):
+            with self.assertRaisesMessage(ValueError, 'Revendedor no encontrado'):
+                await catalog_service.aget_reseller_catalog('r1')
+
+class CatalogCacheTest(SimpleTestCase):
+    def setUp(self):
+        catalog_service.cache.clear()
+        self.db = make_db(
+            {
+                'resellers': {'r1': {'markupType': 'percentage', 'defaultMarkupValue': 10}},
+                'products': {
+                    'p1': {'name': 'Mate', 'price': 100, 'isActive': True},
+                    'p2': {'name': 'Yerba', 'price': 50, 'isActive': True},
+                },
+            },
+            {'favorites': [{'productId': 'p1', 'markupType': 'default'}, {'productId': 'p2', 'markupType': 'fixed', 'markupValue': 5}]},
+        )
+        patcher = patch('api.services.catalog_service.db', self.db)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(catalog_service.cache.clear)
+
+    def _listener(self, target):
+        return next(callback for name, callback in self.db.listeners if name == target)
+
+    def test_repeat_loads_are_served_from_memory(self):
+        first = catalog_service.get_reseller_catalog('r1')
+        reads = self.db.collection.call_count
+        second = catalog_service.get_reseller_catalog('r1')
+
+        self.assertIs(first, second)
+        self.assertEqual(self.db.collection.call_count, reads)
+        self.assertEqual(catalog_service.cache.stats()['hits'], 1)
+        self.assertEqual(catalog_service.cache.stats()['misses'], 1)
+
+    def test_product_and_reseller_changes_are_patched_in_place(self):
+        catalog_service.get_reseller_catalog('r1')
+
+        self._listener('products?in')([
+            make_snapshot('p1', {'name': 'Mate', 'price': 200, 'isActive': True}),
+            make_snapshot('p2', {'name': 'Yerba', 'price': 50, 'isActive': False}),
+        ], [], None)
+        self._listener('resellers/r1')([make_snapshot('r1', {'markupType': 'fixed', 'defaultMarkupValue': 3})], [], None)
+
+        reads = self.db.collection.call_count
+        catalog = catalog_service.get_reseller_catalog('r1')
+        self.assertEqual(self.db.collection.call_count, reads)
+        self.assertEqual(catalog['products'], [
+            {'productId': 'p1', 'name': 'Mate', 'basePrice': 200, 'markupType': 'fixed', 'markupValue': 3, 'finalPrice': 203},
+        ])
+
+    def test_listener_updates_change_content_version(self):
+        first = ContentVersion()
+        catalog_service.get_reseller_catalog('r1', version=first)
+        cached = ContentVersion()
+        catalog_service.get_reseller_catalog('r1', version=cached)
+        self.assertEqual(first.etag, cached.etag)
+
+        self._listener('products?in')([
+            make_snapshot('p1', {'name': 'Mate', 'price': 200, 'isActive': True}, 'products', datetime(2026, 1, 2, tzinfo=timezone.utc)),
+            make_snapshot('p2', {'name': 'Yerba', 'price': 50, 'isActive': True}, 'products'),
+        ], [], None)
+
+        patched = ContentVersion()
+        catalog_service.get_reseller_catalog('r1', version=patched)
+        self.assertNotEqual(patched.etag, first.etag)
+        self.assertEqual(patched.last_modified, datetime(2026, 1, 2, tzinfo=timezone.utc).timestamp())
+
+    def test_new_favorite_invalidates_entry(self):
+        catalog_service.get_reseller_catalog('r1')
+
+        self._listener('favorites?query')([
+            make_snapshot('f1', {'productId': 'p1', 'markupType': 'default'}),
+            make_snapshot('f3', {'productId': 'p9', 'markupType': 'default'}),
+        ], [], None)
+
+        self.assertIsNone(catalog_service.cache.get('r1'))
+        self.assertEqual(catalog_service.cache.stats()['invalidations'], 1)
+
+    @override_settings(CATALOG_CACHE_MAX_ITEMS=5)
+    def test_size_cap_evicts_least_recently_used(self):
+        catalog_service.cache._entries = None
+        self.addCleanup(setattr, catalog_service.cache, '_entries', None)
+        for reseller_id in ('r1', 'r2', 'r3'):
+            catalog_service.cache.store(self.db, reseller_id, Reseller(), [Favorite(productId='p1')], {'p1': None})
+
+        self.assertIsNone(catalog_service.cache.get('r1'))
+        self.assertEqual(catalog_service.cache.stats()['evictions'], 1)
+
+    @override_settings(CATALOG_CACHE_MAX_LISTENERS=7)
+    def test_listener_cap_evicts_least_recently_used(self):
+        products = {f'p{number}': None for number in range(31)}
+        for reseller_id in ('r1', 'r2'):
+            catalog_service.cache.store(self.db, reseller_id, Reseller(), [Favorite(productId='p1')], {'p1': None})
+        catalog_service.cache.store(self.db, 'r3', Reseller(), [Favorite(productId='p1')], products)
+        catalog_service.cache.store(self.db, 'r4', Reseller(), [], {f'p{number}': None for number in range(151)})
+
+        self.assertIsNone(catalog_service.cache.get('r1'))
+        self.assertIsNotNone(catalog_service.cache.get('r2'))
+        self.assertIsNone(catalog_service.cache.get('r4'))
+        self.assertEqual(catalog_service.cache.stats()['listeners'], 7)
+
+    def test_closed_listener_drops_entry(self):
+        catalog_service.get_reseller_catalog('r1')
+        catalog_service.cache.entries.get('r1', count=False).watches[1].is_active = False
+
+        self.assertIsNone(catalog_service.cache.get('r1'))
+        self.assertEqual(catalog_service.cache.stats()['invalidations'], 1)
+        self.assertEqual(catalog_service.cache.stats()['listeners'], 0)
+
+    def test_entries_expire_after_ttl(self):
+        with override_settings(CATALOG_CACHE_TTL=60):
+            catalog_service.get_reseller_catalog('r1')
+        with patch('api.services.catalog_cache.time.time', return_value=time.time() + 61):
+            self.assertIsNone(catalog_service.cache.get('r1'))
+
+
+class CatalogPaginationTest(SimpleTestCase):
+    def _db(self, pages):
+        db = make_db(
+            {
+                'resellers': {'r1': {'markupType': 'fixed', 'defaultMarkupValue': 1}},
+                'products': {f'p{i}': {'name': f'Producto {i}', 'price': 10, 'isActive': True} for i in range(5)},
+            },
+        )
+        ordered = db.collection('favorites').where.return_value.where.return_value.order_by.return_value
+        ordered.limit.return_value.get.return_value = pages[0]
+        ordered.start_after.return_value.limit.return_value.get.return_value = pages[1]
+        return db, ordered
+
+    def test_page_token_resumes_after_last_favorite(self):
+        first = [make_snapshot(f'f{i}', {'productId': f'p{i}', 'markupType': 'default'}) for i in range(2)]
+        second = [make_snapshot('f2', {'productId': 'p2', 'markupType': 'default'})]
+        db, ordered = self._db([first, second])
+
+        with patch('api.services.catalog_service.db', db):
+            page = catalog_service.get_reseller_catalog_page('r1', 2)
+            self.assertEqual([p['productId'] for p in page['products']], ['p0', 'p1'])
+            self.assertEqual(page['pageCount'], 2)
+            self.assertNotIn('totalProducts', page)
+            self.assertIsNotNone(page['nextPageToken'])
+
+            page = catalog_service.get_reseller_catalog_page('r1', 2, page['nextPageToken'])
+            self.assertEqual([p['productId'] for p in page['products']], ['p2'])
+            self.assertIsNone(page['nextPageToken'])
+
+        self.assertEqual(list(ordered.start_after.call_args.args[0].values()), ['f1'])
+
+    def test_stream_yields_batches_until_exhausted(self):
+        first = [make_snapshot(f'f{i}', {'productId': f'p{i}', 'markupType': 'default'}) for i in range(2)]
+        second = [make_snapshot('f2', {'productId': 'p2', 'markupType': 'default'})]
+        db, _ = self._db([first, second])
+
+        with patch('api.services.catalog_service.db', db):
+            batches = list(catalog_service.iter_reseller_catalog('r1', 2))
+
+        self.assertEqual([[p['finalPrice'] for p in batch] for batch in batches], [[11.0, 11.0], [11.0]])
+
+    def test_rejects_token_from_other_reseller(self):
+        token = catalog_service._encode_page_token('r2', 'f1')
+        db, _ = self._db([[], []])
+
+        with patch('api.services.catalog_service.db', db):
+            with self.assertRaisesMessage(ValueError, 'Token de pagina invalido'):
+                catalog_service.get_reseller_catalog_page('r1', 2, token)
@@ -0,0 +1,151 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from django.test import Client, SimpleTestCase, override_settings
+from google.cloud.firestore_v1.transforms import SERVER_TIMESTAMP
+from prometheus_client import REGISTRY
+
+from api.utils import firebase_config
+from api.utils.coalescing import acoalesce, coalesce
+from api.utils.conditional import ContentVersion
+from api.utils.instrumented_firestore import InstrumentedFirestore
+from api.utils.memory_firestore import MemoryFirestore
+from api.utils.single_flight import SingleFlight
+
+
+def sample(view, shared):
+    return REGISTRY.get_sample_value('tangoshop_coalesced_requests_total', {'view': view, 'shared': shared}) or 0
+
+
+def run_concurrently(count, fn):
+    barrier = threading.Barrier(count)
+
+    def call(_):
+        barrier.wait()
+        return fn()
+
+    with ThreadPoolExecutor(count) as executor:
+        return list(executor.map(call, range(count)))
+
+
+class SingleFlightTest(SimpleTestCase):
+    def test_concurrent_calls_share_one_execution(self):
+        flights, calls = SingleFlight(), []
+
+        def slow():
+            calls.append(1)
+            threading.Event().wait(0.05)
+            return 'catalogo'
+
+        results = run_concurrently(6, lambda: flights.do('r1', slow))
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(shared for _, shared in results), [False] + [True] * 5)
+        self.assertEqual({result for result, _ in results}, {'catalogo'})
+        self.assertEqual(flights.in_flight(), 0)
+
+    def test_errors_reach_every_waiter(self):
+        flights = SingleFlight()
+
+        def failing():
+            threading.Event().wait(0.05)
+            raise ValueError('Revendedor no encontrado')
+
+        def call():
+            try:
+                flights.do('r1', failing)
+            except ValueError as exc:
+                return str(exc)
+
+        self.assertEqual(set(run_concurrently(4, call)), {'Revendedor no encontrado'})
+
+    def test_async_calls_share_one_execution(self):
+        flights, calls = SingleFlight(), []
+
+        async def slow():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            return 'catalogo'
+
+        async def scenario():
+            return await asyncio.gather(*(flights.ado('r1', slow) for _ in range(5)))
+
+        results = asyncio.run(scenario())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([shared for _, shared in results].count(False), 1)
+
+
+class CoalesceTest(SimpleTestCase):
+    def _compute(self, calls):
+        def compute(version):
+            calls.append(1)
+            threading.Event().wait(0.05)
+            version.parts['resellers/r1'] = None
+            return {'totalProducts': 0}
+        return compute
+
+    def test_waiters_reuse_result_and_version(self):
+        calls, before = [], sample('test_view', 'true')
+
+        def request():
+            version = ContentVersion()
+            return coalesce('test_view', ('r1',), self._compute(calls), version), version.etag
+
+        results = run_concurrently(4, request)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len({etag for _, etag in results}), 1)
+        self.assertEqual(sample('test_view', 'true') - before, 3)
+
+    @override_settings(REQUEST_COALESCING_ENABLED=False)
+    def test_can_be_disabled(self):
+        calls = []
+        run_concurrently(3, lambda: coalesce('test_view', ('r1',), self._compute(calls), ContentVersion()))
+        self.assertEqual(len(calls), 3)
+
+    def test_async(self):
+        calls = []
+
+        async def compute(version):
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            return 'ok'
+
+        async def scenario():
+            return await asyncio.gather(*(acoalesce('test_view', ('r1',), compute) for _ in range(4)))
+
+        self.assertEqual(asyncio.run(scenario()), ['ok'] * 4)
+        self.assertEqual(len(calls), 1)
+
+
+@override_settings(CATALOG_CACHE_ENABLED=False, CATALOG_PRODUCT_SNAPSHOTS=True)
+class CatalogViewCoalescingTest(SimpleTestCase):
+    def setUp(self):
+        self.raw = MemoryFirestore(latency=0.02)
+        self.raw.load({
+            'resellers': {'r1': {'markupType': 'percentage', 'defaultMarkupValue': 10}},
+            'favorites': {
+                f'f{number}': {'resellerId': 'r1', 'productId': f'p{number}', 'isActive': True,
+                               'productSnapshot': {'name': f'Producto {number}', 'price': 100, 'isActive': True},
+                               'productSnapshotAt': SERVER_TIMESTAMP}
+                for number in range(3)
+            },
+        })
+        for patcher in (patch.dict(firebase_config._handles, {'db': InstrumentedFirestore(self.raw)}),
+                        patch('api.middlewares.auth_middleware.jwt.decode',
+                              return_value={'userId': 'r1', 'email': 'r1@example.com', 'userType': 'reseller'})):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_concurrent_identical_requests_build_the_catalog_once(self):
+        def request():
+            return Client().get('/api/catalog/my-catalog/', HTTP_AUTHORIZATION='Bearer token')
+
+        responses = run_concurrently(6, request)
+
+        self.assertEqual({response.status_code for response in responses}, {200})
+        self.assertEqual(len({response['ETag'] for response in responses}), 1)
+        # Un get del revendedor y una query de favoritos para los seis.
+        self.assertEqual(self.raw.stats()['rpcs'], 2)
@@ -0,0 +1,217 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.test import SimpleTestCase, override_settings
+
+from api.utils.document_cache import CachedFirestore, CachedSnapshot, DocumentCache
+from api.utils.firestore_batch import fetch_documents
+from api.utils.instrumented_firestore import InstrumentedFirestore
+from api.utils.memory_firestore import MemoryAsyncFirestore, MemoryFirestore
+from api.utils.shared_cache import SharedCacheServer
+from tests.firestore_budget import firestore_budget
+
+TTLS = {'resellers': 30, 'products': 30}
+
+
+@override_settings(DOCUMENT_CACHE_TTLS=TTLS, DOCUMENT_CACHE_SOCKET=None)
+class DocumentCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.raw = MemoryFirestore()
+        self.raw.load({
+            'resellers': {'r1': {'markupType': 'percentage', 'defaultMarkupValue': 10, 'bio': 'x'}},
+            'products': {f'p{number}': {'name': f'Producto {number}', 'price': number} for number in range(5)},
+            'refreshTokens': {'t1': {'isValid': True}},
+            'users': {'u1': {'email': 'a@b.com', 'password': 'hash', 'isActive': True}},
+        })
+        self.cache = DocumentCache()
+        self.db = CachedFirestore(InstrumentedFirestore(self.raw), self.cache)
+
+    def test_repeated_reads_hit_the_cache(self):
+        reseller = self.db.collection('resellers').document('r1')
+        with firestore_budget(operations=1):
+            first = reseller.get()
+            second = reseller.get()
+
+        self.assertIsInstance(second, CachedSnapshot)
+        self.assertEqual(second.to_dict(), first.to_dict())
+        self.assertEqual((second.id, second.update_time), (first.id, first.update_time))
+
+    def test_full_document_serves_projections(self):
+        reseller = self.db.collection('resellers').document('r1')
+        reseller.get()
+        with firestore_budget(operations=0):
+            projected = reseller.get(field_paths=['markupType'])
+
+        self.assertEqual(projected.to_dict(), {'markupType': 'percentage'})
+
+    def test_missing_documents_are_cached(self):
+        with firestore_budget(operations=1):
+            self.assertFalse(self.db.collection('resellers').document('nope').get().exists)
+            self.assertFalse(self.db.collection('resellers').document('nope').get().exists)
+
+    def test_collections_without_ttl_are_not_cached(self):
+        with firestore_budget(operations=2):
+            self.db.collection('refreshTokens').document('t1').get()
+            self.db.collection('refreshTokens').document('t1').get()
+
+    @override_settings(DOCUMENT_CACHE_TTLS={**TTLS, 'users': 5})
+    def test_users_are_never_cached(self):
+        with firestore_budget(operations=2):
+            self.db.collection('users').document('u1').get()
+            self.db.collection('users').document('u1').get()
+
+    def test_writes_invalidate(self):
+        reseller = self.db.collection('resellers').document('r1')
+        reseller.get()
+        reseller.update({'defaultMarkupValue': 20})
+        self.assertEqual(reseller.get().to_dict()['defaultMarkupValue'], 20)
+
+        batch = self.db.batch()
+        batch.update(reseller, {'defaultMarkupValue': 30})
+        batch.commit()
+        self.assertEqual(reseller.get().to_dict()['defaultMarkupValue'], 30)
+
+    def test_entries_expire(self):
+        with override_settings(DOCUMENT_CACHE_TTLS={'resellers': 0.05}):
+            reseller = self.db.collection('resellers').document('r1')
+            reseller.get()
+            self.raw.collection('resellers').document('r1').update({'defaultMarkupValue': 20})
+            self.assertEqual(reseller.get().to_dict()['defaultMarkupValue'], 10)
+            time.sleep(0.06)
+            self.assertEqual(reseller.get().to_dict()['defaultMarkupValue'], 20)
+
+    def test_get_all_fetches_only_misses(self):
+        fetch_documents(self.db, 'products', ['p0', 'p1'])
+        with firestore_budget(operations=1, reads=3):
+            snapshots = fetch_documents(self.db, 'products', [f'p{number}' for number in range(5)])
+
+        self.assertEqual(sorted(snapshots), ['p0', 'p1', 'p2', 'p3', 'p4'])
+        self.assertEqual(snapshots['p1'].to_dict(), {'name': 'Producto 1', 'price': 1})
+
+    def test_concurrent_misses_share_one_read(self):
+        self.raw.latency = 0.05
+        reseller = self.db.collection('resellers').document('r1')
+        barrier = threading.Barrier(8)
+
+        def read(_):
+            barrier.wait()
+            return reseller.get().to_dict()
+
+        with firestore_budget(operations=1), ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(read, range(8)))
+
+        self.assertEqual(len({str(result) for result in results}), 1)
+        self.assertEqual(self.cache.flights.in_flight(), 0)
+
+    def test_async_reads_and_writes(self):
+        async_db = CachedFirestore(InstrumentedFirestore(MemoryAsyncFirestore(self.raw)), self.cache, asynchronous=True)
+        reseller = async_db.collection('resellers').document('r1')
+
+        async def scenario():
+            with firestore_budget(operations=1):
+                first, second = await asyncio.gather(reseller.get(), reseller.get())
+            await reseller.update({'defaultMarkupValue': 20})
+            third = await reseller.get()
+            return first, second, third
+
+        first, second, third = asyncio.run(scenario())
+        self.assertEqual(first.to_dict(), second.to_dict())
+        self.assertEqual(third.to_dict()['defaultMarkupValue'], 20)
+        # Lo que escribio el cliente async tambien invalida las lecturas sync.
+        self.assertEqual(self.db.collection('resellers').document('r1').get().to_dict()['defaultMarkupValue'], 20)
+
+
+class SharedTierTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.path = os.path.join(directory, 'cache.sock')
+        self.server = SharedCacheServer(self.path, max_entries=100)
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(os.rmdir, directory)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.raw = MemoryFirestore()
+        self.raw.load({'resellers': {'r1': {'markupType': 'fixed', 'defaultMarkupValue': 5}}})
+        override = override_settings(DOCUMENT_CACHE_TTLS=TTLS, DOCUMENT_CACHE_SOCKET=self.path)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def _worker(self):
+        cache = DocumentCache()
+        return cache, CachedFirestore(InstrumentedFirestore(self.raw), cache)
+
+    def _flush(self, cache):
+        # set e invalidate no esperan respuesta: un get por la misma conexion
+        # asegura que el servidor ya los proceso.
+        cache.shared.get('flush')
+
+    def test_workers_share_hits_and_invalidations(self):
+        (first_cache, first), (_, second) = self._worker(), self._worker()
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+
+        with firestore_budget(operations=1):
+            first.collection('resellers').document('r1').get()
+            self._flush(first_cache)
+            shared = second.collection('resellers').document('r1').get()
+        self.assertEqual(shared.to_dict(), {'markupType': 'fixed', 'defaultMarkupValue': 5})
+
+        first.collection('resellers').document('r1').update({'defaultMarkupValue': 7})
+        self._flush(first_cache)
+        third = self._worker()[1].collection('resellers').document('r1').get()
+        self.assertEqual(third.to_dict()['defaultMarkupValue'], 7)
+
+    def test_local_copies_see_writes_from_other_workers(self):
+        (first_cache, first), (_, second) = self._worker(), self._worker()
+        reseller = second.collection('resellers').document('r1')
+        reseller.get()
+        fetch_documents(second, 'resellers', ['r1'])
+
+        first.collection('resellers').document('r1').update({'defaultMarkupValue': 9})
+        self._flush(first_cache)
+
+        self.assertEqual(reseller.get().to_dict()['defaultMarkupValue'], 9)
+        first.collection('resellers').document('r1').update({'defaultMarkupValue': 11})
+        self._flush(first_cache)
+        self.assertEqual(fetch_documents(second, 'resellers', ['r1'])['r1'].to_dict()['defaultMarkupValue'], 11)
+
+    def test_unchanged_local_copies_skip_firestore(self):
+        _, worker = self._worker()
+        reseller = worker.collection('resellers').document('r1')
+        with firestore_budget(operations=1):
+            reseller.get()
+            reseller.get()
+            fetch_documents(worker, 'resellers', ['r1'])
+
+    def test_read_started_before_an_invalidation_is_not_shared(self):
+        (first_cache, _), (second_cache, _) = self._worker(), self._worker()
+        key = ('resellers/r1', None)
+        _, since = first_cache.shared.get(key)
+        second_cache.shared.invalidate('resellers/r1')
+        self._flush(second_cache)
+
+        first_cache.shared.set(key, 'viejo', 30, group='resellers/r1', since=since)
+        self.assertIsNone(first_cache.shared.get(key)[0])
+        _, since = first_cache.shared.get(key)
+        first_cache.shared.set(key, 'nuevo', 30, group='resellers/r1', since=since)
+        self.assertEqual(first_cache.shared.get(key)[0], 'nuevo')
+
+    def test_unpicklable_value_skips_only_that_key(self):
+        cache, _ = self._worker()
+        with self.assertLogs('api.utils.shared_cache', 'WARNING'):
+            cache.shared.set('lock', threading.Lock(), 30)
+        cache.shared.set('ok', 1, 30)
+
+        self.assertEqual(cache.shared.get('ok')[0], 1)
+        self.assertEqual(cache.shared.errors, 0)
+
+    def test_unavailable_server_falls_back_to_firestore(self):
+        with override_settings(DOCUMENT_CACHE_SOCKET=self.path + '.missing'):
+            _, worker = self._worker()
+            with firestore_budget(operations=1), self.assertLogs('api.utils.shared_cache', 'WARNING'):
+                self.assertTrue(worker.collection('resellers').document('r1').get().exists)
@@ -0,0 +1,32 @@
+from unittest.mock import MagicMock, patch
+
+from django.test import SimpleTestCase
+
+from api.utils import firebase_config
+
+
+class LazyHandleTest(SimpleTestCase):
+    def setUp(self):
+        patcher = patch.dict(firebase_config._handles, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_client_is_created_on_first_use(self):
+        client = MagicMock()
+        handle = firebase_config.LazyHandle('db')
+
+        with patch.object(firebase_config, '_create', return_value=client) as create:
+            self.assertEqual(firebase_config._handles, {})
+            handle.collection('users')
+            handle.collection('products')
+
+        create.assert_called_once_with('db')
+        self.assertEqual(client.collection.call_count, 2)
+
+    def test_warm_up_failure_is_logged(self):
+        client = MagicMock()
+        client.collection.return_value.document.return_value.get.side_effect = RuntimeError('sin red')
+
+        with patch.object(firebase_config, '_create', return_value=client), \
+                self.assertLogs('api.utils.firebase_config', level='WARNING'):
+            firebase_config.warm_up()
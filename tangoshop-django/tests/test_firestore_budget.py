@@ -0,0 +1,118 @@
+import json
+import math
+from collections import Counter
+from unittest.mock import patch
+
+from django.test import Client, SimpleTestCase, override_settings
+
+from api.utils import firebase_config
+from api.utils.background import background_queue
+from api.utils.instrumented_firestore import InstrumentedFirestore
+from api.utils.memory_firestore import MemoryAsyncFirestore, MemoryFirestore
+from benchmarks.dataset import PASSWORD, SCALES, generate
+from tests.firestore_budget import firestore_budget
+
+
+class FirestoreBudgetTest(SimpleTestCase):
+    def setUp(self):
+        self.db = InstrumentedFirestore(MemoryFirestore())
+
+    def test_fails_when_budget_is_exceeded(self):
+        with self.assertRaisesMessage(AssertionError, 'operaciones: 2 > 1'):
+            with firestore_budget(operations=1):
+                self.db.collection('users').document('u1').get()
+                self.db.collection('users').document('u2').get()
+
+    def test_works_as_decorator(self):
+        @firestore_budget(operations=1, writes=1)
+        def save():
+            self.db.collection('users').document('u1').set({'email': 'a@b.com'})
+
+        save()
+        save()
+
+
+@override_settings(CATALOG_CACHE_ENABLED=False, BCRYPT_ROUNDS=4, BCRYPT_POOL_WORKERS=0)
+class EndpointBudgetTest(SimpleTestCase):
+    # Presupuestos sobre el dataset sintetico 'small' de los benchmarks, con
+    # el revendedor de catalogo mas grande y el producto mas popular: la
+    # cantidad de operaciones no debe crecer con la cantidad de documentos.
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.dataset = generate(**SCALES['small'], bcrypt_rounds=4)
+        favorites = cls.dataset.collections['favorites'].values()
+        cls.reseller_id, cls.catalog_size = Counter(f['resellerId'] for f in favorites).most_common(1)[0]
+        cls.product_id, cls.popularity = Counter(f['productId'] for f in favorites).most_common(1)[0]
+        cls.supplier_id = cls.dataset.collections['products'][cls.product_id]['supplierId']
+
+    def setUp(self):
+        raw = MemoryFirestore()
+        raw.load(self.dataset.collections)
+        handles = {'db': InstrumentedFirestore(raw), 'async_db': InstrumentedFirestore(MemoryAsyncFirestore(raw))}
+        for patcher in (patch.dict(firebase_config._handles, handles),
+                        patch('api.middlewares.auth_middleware.jwt.decode', side_effect=self._claims)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # Los trabajos en segundo plano terminan antes de sacar los patches.
+        self.addCleanup(background_queue.drain, 5)
+        self.client = Client()
+
+    def _claims(self, token, *args, **kwargs):
+        user_type, user_id = token.split(':')
+        return {'userId': user_id, 'email': self.dataset.emails[user_id], 'userType': user_type}
+
+    def _chunks(self, count):
+        return math.ceil(count / 100)
+
+    @override_settings(CATALOG_PRODUCT_SNAPSHOTS=True)
+    def test_my_catalog(self):
+        # Revendedor y query de favoritos: los productos salen del
+        # productSnapshot de cada favorito.
+        budget = {'operations': 2, 'reads': 1 + self.catalog_size}
+        for url in ('/api/catalog/my-catalog/', '/api/async/catalog/my-catalog/'):
+            with self.subTest(url=url), firestore_budget(**budget, writes=0):
+                response = self.client.get(url, HTTP_AUTHORIZATION=f'Bearer reseller:{self.reseller_id}')
+                self.assertEqual(response.status_code, 200)
+
+    def test_my_catalog_without_snapshots(self):
+        # Ademas, un get_all por cada 100 productos.
+        budget = {'operations': 2 + self._chunks(self.catalog_size), 'reads': 1 + 2 * self.catalog_size}
+        with firestore_budget(**budget, writes=0):
+            response = self.client.get('/api/catalog/my-catalog/', HTTP_AUTHORIZATION=f'Bearer reseller:{self.reseller_id}')
+            self.assertEqual(response.status_code, 200)
+
+    def test_resellers_high_markup(self):
+        # Producto, query de favoritos y get_all de revendedores y usuarios.
+        budget = {'operations': 2 + 2 * self._chunks(self.popularity), 'reads': 1 + 3 * self.popularity}
+        for prefix in ('/api', '/api/async'):
+            url = f'{prefix}/suppliers/products/{self.product_id}/high-markup-resellers/'
+            with self.subTest(url=url), firestore_budget(**budget, writes=0):
+                response = self.client.get(url, HTTP_AUTHORIZATION=f'Bearer supplier:{self.supplier_id}')
+                self.assertEqual(response.status_code, 200)
+
+    def test_login(self):
+        body = json.dumps({'email': self.dataset.emails[self.reseller_id], 'password': PASSWORD})
+        for url in ('/api/auth/login/', '/api/async/auth/login/'):
+            with self.subTest(url=url), firestore_budget(operations=3, reads=2, writes=1):
+                response = self.client.post(url, body, content_type='application/json')
+                self.assertEqual(response.status_code, 200)
+
+    def test_register(self):
+        # Chequeo del email y un unico batch con usuario, perfil, indice de
+        # email y refresh token; la notificacion se escribe en segundo plano.
+        profile = {'email': 'nueva@b.com', 'password': 'Secreta123'}
+        with firestore_budget(operations=2, reads=1, writes=4):
+            response = self.client.post('/api/auth/register/reseller/', json.dumps({
+                **profile, 'firstName': 'Ana', 'lastName': 'Diaz',
+            }), content_type='application/json')
+            self.assertEqual(response.status_code, 201)
+
+        profile['email'] = 'proveedor@b.com'
+        with firestore_budget(operations=2, reads=1, writes=4):
+            response = self.client.post('/api/auth/register/supplier/', json.dumps({
+                **profile, 'companyName': 'Mates SA', 'phone': '2494000000', 'website': 'https://mates.com.ar',
+                'address': {'province': 'Buenos Aires', 'city': 'Tandil', 'street': 'Pinto', 'number': '500'},
+            }), content_type='application/json')
+            self.assertEqual(response.status_code, 201)
@@ -0,0 +1,67 @@
+import io
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import numpy as np
+from django.http import JsonResponse
+from django.test import SimpleTestCase
+from firebase_admin import firestore
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from api.utils.json_codec import JSONResponse, ORJSONParser, ORJSONRenderer, loads
+
+
+class JSONCodecTest(SimpleTestCase):
+    def test_matches_drf_renderer(self):
+        data = {
+            'createdAt': datetime(2024, 3, 1, 12, 30, 5, 250000, tzinfo=timezone.utc),
+            'price': Decimal('10.50'),
+            'name': 'Mate ñandú\u2028chico\u2029',
+            'tags': ('a', 'b'),
+            'updatedAt': DatetimeWithNanoseconds(2024, 3, 1, 12, 30, 5, nanosecond=123456789, tzinfo=timezone.utc),
+            1: None,
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_json_response_matches_django(self):
+        data = {
+            'createdAt': datetime(2024, 3, 1, 12, 30, 5, 123456, tzinfo=timezone.utc),
+            'updatedAt': DatetimeWithNanoseconds(2024, 3, 1, 12, 30, 5, nanosecond=123456789, tzinfo=timezone.utc),
+            'price': Decimal('10.50'),
+            'name': 'Mate\u2028chico',
+        }
+        content = JSONResponse(data).content
+        self.assertEqual(loads(content), json.loads(JsonResponse(data).content))
+        self.assertIn(b'"2024-03-01T12:30:05.123Z"', content)
+        self.assertIn(b'\\u2028', content)
+
+    def test_non_finite_floats_render_as_null(self):
+        # DRF los rechaza y JsonResponse escribe NaN, que no es JSON valido.
+        self.assertEqual(ORJSONRenderer().render({'a': float('nan'), 'b': float('inf')}), b'{"a":null,"b":null}')
+
+    def test_firestore_timestamps(self):
+        data = {
+            'updatedAt': DatetimeWithNanoseconds(2024, 3, 1, 12, 30, 5, nanosecond=123456789, tzinfo=timezone.utc),
+            'createdAt': firestore.SERVER_TIMESTAMP,
+            'prices': np.array([1.5, 2.25]),
+        }
+        self.assertEqual(loads(ORJSONRenderer().render(data)), {
+            'updatedAt': '2024-03-01T12:30:05.123456Z',
+            'createdAt': None,
+            'prices': [1.5, 2.25],
+        })
+
+    def test_parser(self):
+        parser = ORJSONParser()
+        self.assertEqual(parser.parse(io.BytesIO(b'{"email": "a@b.com"}')), {'email': 'a@b.com'})
+        with self.assertRaises(ParseError):
+            parser.parse(io.BytesIO(b'{"email": '))
+
+    def test_json_response(self):
+        response = JSONResponse({'success': False}, status=401)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.content, b'{"success":false}')
@@ -0,0 +1,152 @@
+import threading
+import time
+from datetime import datetime
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, override_settings
+from firebase_admin import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from api.services.auth_service import auth_service, refresh_token_id
+from api.services.catalog_service import catalog_service
+from api.utils.memory_firestore import MemoryAsyncFirestore, MemoryFirestore
+
+
+class MemoryFirestoreTest(SimpleTestCase):
+    def setUp(self):
+        self.db = MemoryFirestore()
+
+    def test_documents_round_trip_with_server_timestamp(self):
+        ref = self.db.collection('users').document('u1')
+        ref.set({'email': 'a@b.com', 'address': {'city': 'Tandil'}, 'createdAt': firestore.SERVER_TIMESTAMP})
+        ref.update({'address.city': 'Azul', 'isActive': False})
+
+        snap = ref.get()
+        self.assertTrue(snap.exists)
+        self.assertEqual(snap.get('address.city'), 'Azul')
+        self.assertIsInstance(snap.get('createdAt'), datetime)
+        self.assertLess(snap.create_time, snap.update_time)
+        self.assertFalse(self.db.collection('users').document('u2').get().exists)
+        with self.assertRaises(KeyError):
+            snap.get('phone')
+
+    def test_queries_filter_order_and_paginate(self):
+        self.db.load({'favorites': {
+            f'f{i:02d}': {'resellerId': 'r1' if i % 2 else 'r2', 'isActive': True, 'price': i} for i in range(20)
+        }})
+        query = self.db.collection('favorites') \
+            .where('resellerId', '==', 'r1') \
+            .where('isActive', '==', True) \
+            .order_by(FieldPath.document_id())
+
+        first = query.limit(4).get()
+        rest = query.start_after({FieldPath.document_id(): first[-1].id}).get()
+        self.assertEqual([snap.id for snap in first], ['f01', 'f03', 'f05', 'f07'])
+        self.assertEqual([snap.id for snap in rest], ['f09', 'f11', 'f13', 'f15', 'f17', 'f19'])
+
+        top = self.db.collection('favorites').order_by('price', direction='DESCENDING').limit(2).select(['price']).get()
+        self.assertEqual([snap.to_dict() for snap in top], [{'price': 19}, {'price': 18}])
+
+        refs = [self.db.collection('favorites').document(doc_id) for doc_id in ('f02', 'f04', 'zz')]
+        self.assertEqual(len(self.db.collection('favorites').where(FieldPath.document_id(), 'in', refs).get()), 2)
+
+    def test_batch_commit_is_atomic(self):
+        self.db.collection('userEmails').document('a@b.com').set({'userId': 'u1'})
+        batch = self.db.batch()
+        batch.set(self.db.collection('users').document('u2'), {'email': 'a@b.com'})
+        batch.create(self.db.collection('userEmails').document('a@b.com'), {'userId': 'u2'})
+
+        with self.assertRaises(Exception):
+            batch.commit()
+        self.assertFalse(self.db.collection('users').document('u2').get().exists)
+
+    def test_counts_operations_and_simulates_latency(self):
+        self.db.latency = 0.01
+        self.db.load({'products': {f'p{i}': {'price': i} for i in range(5)}})
+
+        start = time.perf_counter()
+        refs = [self.db.collection('products').document(f'p{i}') for i in range(5)]
+        snaps = list(self.db.get_all(refs))
+        _, ref = self.db.collection('notifications').add({'read': False})
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(len(snaps), 5)
+        self.assertTrue(ref.get().exists)
+        self.assertEqual(self.db.stats(), {'rpcs': 3, 'reads': 6, 'writes': 1, 'listeners': 0})
+        self.assertGreaterEqual(elapsed, 0.02)
+
+    def test_listeners_fire_on_changes(self):
+        self.db.load({'resellers': {'r1': {'defaultMarkupValue': 10}}})
+        seen = []
+        changed = threading.Event()
+
+        def callback(docs, changes, read_time):
+            seen.append(docs[0].to_dict()['defaultMarkupValue'])
+            if seen[-1] == 25:
+                changed.set()
+
+        watch = self.db.collection('resellers').document('r1').on_snapshot(callback)
+        self.db.wait_for_listeners()
+        self.db.collection('resellers').document('r1').update({'defaultMarkupValue': 25})
+        self.assertTrue(changed.wait(2))
+        watch.unsubscribe()
+        self.assertEqual(seen, [10, 25])
+
+    def test_query_listeners_report_document_changes(self):
+        self.db.load({'products': {'p1': {'price': 10}, 'p2': {'price': 20}}})
+        deliveries = []
+        watch = self.db.collection('products').on_snapshot(
+            lambda docs, changes, read_time: deliveries.append(
+                sorted((change.type.name, change.document.id) for change in changes)))
+        self.addCleanup(watch.unsubscribe)
+        self.db.wait_for_listeners()
+
+        self.db.collection('products').document('p1').update({'price': 15})
+        self.db.wait_for_listeners()
+        self.db.collection('products').document('p2').delete()
+        self.db.collection('products').document('p3').set({'price': 30})
+        self.db.wait_for_listeners()
+
+        self.assertEqual(deliveries, [
+            [('ADDED', 'p1'), ('ADDED', 'p2')],
+            [('MODIFIED', 'p1')],
+            [('REMOVED', 'p2')],
+            [('ADDED', 'p3')],
+        ])
+
+    async def test_async_client_shares_storage(self):
+        async_db = MemoryAsyncFirestore(self.db)
+        await async_db.collection('users').document('u1').set({'email': 'a@b.com'})
+
+        snaps = await async_db.collection('users').where('email', '==', 'a@b.com').get()
+        docs = [snap async for snap in async_db.get_all([async_db.collection('users').document('u1')])]
+        self.assertEqual([snap.id for snap in snaps], ['u1'])
+        self.assertTrue(docs[0].exists)
+        self.assertTrue(self.db.collection('users').document('u1').get().exists)
+
+
+@override_settings(BCRYPT_POOL_WORKERS=0, BCRYPT_ROUNDS=4, CATALOG_CACHE_ENABLED=False, BACKGROUND_WORKERS=0)
+class MemoryBackendServicesTest(SimpleTestCase):
+    def setUp(self):
+        self.db = MemoryFirestore()
+        auth_service.email_index.clear()
+        self.addCleanup(auth_service.email_index.clear)
+
+    def test_register_login_and_catalog_offline(self):
+        with patch('api.services.auth_service.db', self.db), patch('api.services.catalog_service.db', self.db), \
+                patch('api.utils.background.db', self.db):
+            registered = auth_service.register_reseller({'email': 'ana@b.com', 'password': 'secreta123', 'firstName': 'Ana', 'lastName': 'Diaz'})
+            reseller_id = registered['user']['userId']
+            with self.assertRaisesMessage(ValueError, 'El email ya esta registrado'):
+                auth_service.register_reseller({'email': 'ana@b.com', 'password': 'otra12345', 'firstName': 'A', 'lastName': 'B'})
+            auth_service.email_index.clear()
+            logged = auth_service.login({'email': 'ana@b.com', 'password': 'secreta123'})
+
+            self.db.collection('products').document('p1').set({'name': 'Mate', 'price': 100, 'isActive': True})
+            self.db.collection('favorites').add({'resellerId': reseller_id, 'productId': 'p1', 'isActive': True, 'markupType': 'fixed', 'markupValue': 5})
+            catalog = catalog_service.get_reseller_catalog(reseller_id)
+
+        self.assertEqual(logged['user']['userId'], reseller_id)
+        self.assertEqual(catalog['products'][0]['finalPrice'], 105)
+        self.assertIn(refresh_token_id(logged['refreshToken']), self.db.dump()['refreshTokens'])
+        self.assertEqual([n['userId'] for n in self.db.dump()['notifications'].values()], [reseller_id])
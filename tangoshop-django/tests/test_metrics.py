@@ -0,0 +1,120 @@
+import threading
+from unittest.mock import MagicMock, patch
+
+from django.test import Client, SimpleTestCase, override_settings
+from prometheus_client import REGISTRY
+
+from api.utils import metrics
+from api.utils.firestore_batch import fetch_documents
+from api.utils.instrumented_firestore import InstrumentedFirestore
+from api.utils.memory_firestore import MemoryAsyncFirestore, MemoryFirestore
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class InstrumentedFirestoreTest(SimpleTestCase):
+    def setUp(self):
+        self.raw = MemoryFirestore()
+        self.raw.load({'products': {f'p{i}': {'price': i} for i in range(5)}})
+        self.db = InstrumentedFirestore(self.raw)
+        token = metrics.start_request()
+        self.addCleanup(metrics.end_request, token)
+        self.stats = metrics.current_request()
+
+    def test_counts_operations_and_documents(self):
+        self.db.collection('products').document('p1').get()
+        self.db.collection('products').where('price', '>=', 3).get()
+        batch = self.db.batch()
+        batch.set(self.db.collection('products').document('p9'), {'price': 9})
+        batch.update(self.db.collection('products').document('p1'), {'price': 10})
+        batch.commit()
+
+        self.assertEqual(self.stats.operations, {'get': 1, 'query': 1, 'commit': 1})
+        self.assertEqual((self.stats.reads, self.stats.writes), (3, 2))
+        self.assertEqual(self.raw.stats()['rpcs'], 3)
+
+    def test_chunks_in_worker_threads_are_attributed_to_the_request(self):
+        snaps = fetch_documents(self.db, 'products', ['p0', 'p1', 'p2', 'p3', 'zz'], chunk_size=2)
+
+        self.assertEqual(len(snaps), 5)
+        self.assertEqual(self.stats.operations, {'get_all': 3})
+        self.assertEqual(self.stats.reads, 4)
+
+    def test_concurrent_adds_are_not_lost(self):
+        def add():
+            for _ in range(5000):
+                self.stats.add('get_all', 2)
+
+        threads = [threading.Thread(target=add) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.stats.operations, {'get_all': 40000})
+        self.assertEqual(self.stats.reads, 80000)
+
+    async def test_async_client(self):
+        async_db = InstrumentedFirestore(MemoryAsyncFirestore(self.raw))
+        await async_db.collection('products').document('p1').update({'price': 2})
+        refs = [async_db.collection('products').document(doc_id) for doc_id in ('p1', 'p2')]
+        snaps = [snap async for snap in async_db.get_all(refs)]
+
+        self.assertEqual(len(snaps), 2)
+        self.assertEqual(self.stats.operations, {'update': 1, 'get_all': 1})
+        self.assertEqual((self.stats.reads, self.stats.writes), (2, 1))
+
+
+@override_settings(CATALOG_CACHE_ENABLED=False)
+class MetricsEndpointTest(SimpleTestCase):
+    def setUp(self):
+        self.db = InstrumentedFirestore(MemoryFirestore())
+        self.db.load({
+            'resellers': {'r1': {'markupType': 'percentage', 'defaultMarkupValue': 10}},
+            'products': {'p1': {'name': 'Mate', 'price': 100, 'isActive': True}},
+            'favorites': {'f1': {'resellerId': 'r1', 'productId': 'p1', 'isActive': True, 'markupType': 'default'}},
+        })
+
+    @patch('api.middlewares.auth_middleware.jwt.decode')
+    def test_view_operations_are_exported(self, mock_decode: MagicMock):
+        mock_decode.return_value = {'userId': 'r1', 'email': 'r@b.com', 'userType': 'reseller'}
+        view = 'get_my_catalog'
+        before = sample('tangoshop_firestore_operations_total', view=view, operation='query')
+        requests_before = sample('tangoshop_view_seconds_count', view=view, method='GET')
+
+        with patch('api.services.catalog_service.db', self.db):
+            response = Client().get('/api/catalog/my-catalog/', HTTP_AUTHORIZATION='Bearer metrics-reseller')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(response.wsgi_request.firestore_stats.reads, 2)
+
+        self.assertEqual(sample('tangoshop_firestore_operations_total', view=view, operation='query'), before + 1)
+        self.assertEqual(sample('tangoshop_view_seconds_count', view=view, method='GET'), requests_before + 1)
+
+        exported = Client().get('/api/metrics/')
+        self.assertEqual(exported.status_code, 200)
+        self.assertIn(b'tangoshop_firestore_operations_total{operation="query",view="get_my_catalog"}', exported.content)
+
+    @patch('api.middlewares.auth_middleware.jwt.decode')
+    def test_streamed_reads_are_recorded_when_the_stream_closes(self, mock_decode: MagicMock):
+        mock_decode.return_value = {'userId': 'r1', 'email': 'r@b.com', 'userType': 'reseller'}
+        view = 'get_my_catalog'
+        reads_before = sample('tangoshop_firestore_documents_total', view=view, operation='query')
+        requests_before = sample('tangoshop_view_seconds_count', view=view, method='GET')
+
+        with patch('api.services.catalog_service.db', self.db):
+            response = Client().get('/api/catalog/my-catalog/?stream=true', HTTP_AUTHORIZATION='Bearer metrics-reseller')
+            self.assertEqual(sample('tangoshop_view_seconds_count', view=view, method='GET'), requests_before)
+            self.assertIn(b'"productId":"p1"', b''.join(response.streaming_content))
+            response.close()
+
+        self.assertEqual(sample('tangoshop_firestore_documents_total', view=view, operation='query'), reads_before + 1)
+        self.assertEqual(sample('tangoshop_view_seconds_count', view=view, method='GET'), requests_before + 1)
+        self.assertGreaterEqual(response.wsgi_request.firestore_stats.reads, 2)
+
+    @override_settings(METRICS_TOKEN='secreto')
+    def test_token_is_required_when_configured(self):
+        self.assertEqual(Client().get('/api/metrics/').status_code, 403)
+        self.assertEqual(Client().get('/api/metrics/', HTTP_X_METRICS_TOKEN='secreto').status_code, 200)
+        self.assertEqual(Client().post('/api/metrics/', HTTP_X_METRICS_TOKEN='secreto').status_code, 405)
@@ -0,0 +1,38 @@
+from django.test import SimpleTestCase
+
+from api.models import Favorite, Product, Reseller
+from api.utils.firestore_batch import fetch_documents
+from api.utils.memory_firestore import MemoryFirestore
+from tests.firestore_mocks import make_snapshot
+
+
+class FirestoreModelTest(SimpleTestCase):
+    def test_from_snapshot_reads_only_projected_fields(self):
+        snapshot = make_snapshot('p1', {
+            'name': 'Mate', 'price': 100, 'supplierId': 's1', 'isActive': True,
+            'description': 'Calabaza forrada en cuero', 'photoURL': 'https://example.com/mate.jpg',
+        })
+        product = Product.from_snapshot(snapshot)
+
+        self.assertEqual(product, Product(name='Mate', description=None, price=100, categoryId=None, supplierId='s1'))
+        self.assertFalse(hasattr(product, '__dict__'))
+        self.assertIsNone(Product.from_snapshot(make_snapshot('p2', None)))
+
+    def test_missing_fields_keep_service_defaults(self):
+        self.assertFalse(Product.from_dict({}).isActive)
+        self.assertTrue(Product(name='Mate', description='', price=100, categoryId='', supplierId='s1').isActive)
+        self.assertEqual(Favorite.from_dict({'productId': 'p1'}).markupType, 'default')
+        self.assertEqual(Reseller.from_dict({}), Reseller(markupType='percentage', defaultMarkupValue=0))
+
+    def test_missing_required_fields_decode_to_none(self):
+        product = Product.from_dict({'price': 100, 'isActive': True})
+
+        self.assertEqual((product.name, product.description, product.categoryId, product.supplierId),
+                         (None, None, None, None))
+
+    def test_projection_is_applied_by_the_backend(self):
+        db = MemoryFirestore()
+        db.load({'products': {'p1': {'name': 'Mate', 'price': 100, 'description': 'x' * 500, 'isActive': True}}})
+
+        snapshots = fetch_documents(db, 'products', ['p1'], field_paths=Product.PROJECTION)
+        self.assertEqual(snapshots['p1'].to_dict(), {'name': 'Mate', 'price': 100, 'isActive': True})
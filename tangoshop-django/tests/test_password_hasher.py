@@ -0,0 +1,81 @@
+from unittest.mock import MagicMock, patch
+
+import bcrypt
+from django.test import SimpleTestCase, override_settings
+
+from api.services.auth_service import auth_service
+from api.utils.memory_firestore import MemoryFirestore
+from api.utils.password_hasher import HasherBusyError, PasswordHasher
+
+
+@override_settings(BCRYPT_ROUNDS=4)
+class PasswordHasherTest(SimpleTestCase):
+    @override_settings(BCRYPT_POOL_WORKERS=1)
+    def test_hash_and_check_run_in_pool(self):
+        hasher = PasswordHasher()
+        self.addCleanup(hasher.shutdown)
+
+        hashed = hasher.hash('Secreta123')
+
+        self.assertTrue(hashed.startswith('$2b$04$'))
+        self.assertTrue(hasher.check('Secreta123', hashed))
+        self.assertFalse(hasher.check('otra', hashed))
+
+    @override_settings(BCRYPT_POOL_WORKERS=1, BCRYPT_MAX_QUEUE=1)
+    def test_rejects_when_queue_is_full(self):
+        hasher = PasswordHasher()
+        self.addCleanup(hasher.shutdown)
+        hasher._get_pool()
+        hasher._slots.acquire()
+        self.addCleanup(hasher._slots.release)
+
+        with self.assertRaises(HasherBusyError):
+            hasher.hash('Secreta123')
+
+    @override_settings(BCRYPT_POOL_WORKERS=0, BCRYPT_MAX_QUEUE=0)
+    def test_runs_inline_without_queue_limit_when_pool_disabled(self):
+        hasher = PasswordHasher()
+
+        self.assertTrue(hasher.check('Secreta123', hasher.hash('Secreta123')))
+        self.assertIsNone(hasher._pool)
+        self.assertIsNone(hasher._slots)
+
+    def test_needs_rehash_compares_cost(self):
+        hasher = PasswordHasher()
+
+        self.assertTrue(hasher.needs_rehash(bcrypt.hashpw(b'x', bcrypt.gensalt(5)).decode()))
+        self.assertFalse(hasher.needs_rehash(bcrypt.hashpw(b'x', bcrypt.gensalt(4)).decode()))
+        self.assertFalse(hasher.needs_rehash('no-es-bcrypt'))
+
+    @override_settings(BCRYPT_POOL_WORKERS=0, BACKGROUND_WORKERS=0)
+    def test_login_rehashes_outdated_cost(self):
+        stored = bcrypt.hashpw(b'Secreta123', bcrypt.gensalt(5)).decode()
+        user_doc = MagicMock(id='u1')
+        user_doc.to_dict.return_value = {'email': 'a@b.com', 'password': stored, 'userType': 'admin'}
+        db = MagicMock()
+
+        with patch('api.services.auth_service.db', db), \
+                patch.object(auth_service, '_find_user_by_email', return_value=user_doc), \
+                patch.object(auth_service, '_generate_tokens', return_value=('a', 'r')):
+            auth_service.login({'email': 'a@b.com', 'password': 'Secreta123'})
+
+        update = db.collection.return_value.document.return_value.update
+        update.assert_called_once()
+        self.assertTrue(update.call_args.args[0]['password'].startswith('$2b$04$'))
+
+    @override_settings(BCRYPT_POOL_WORKERS=0)
+    def test_rehash_does_not_overwrite_a_newer_password(self):
+        db = MemoryFirestore()
+        stored = bcrypt.hashpw(b'Secreta123', bcrypt.gensalt(5)).decode()
+        db.load({'users': {'u1': {'email': 'a@b.com', 'password': stored}}})
+        user_ref = db.collection('users').document('u1')
+        seen = user_ref.get().update_time
+        # Un reset de password entre el login y el rehash.
+        user_ref.update({'password': 'nuevo-hash'})
+
+        with patch('api.services.auth_service.db', db):
+            auth_service._rehash_password('u1', seen, 'Secreta123')
+            self.assertEqual(user_ref.get().to_dict()['password'], 'nuevo-hash')
+
+            auth_service._rehash_password('u1', user_ref.get().update_time, 'Secreta123')
+            self.assertTrue(user_ref.get().to_dict()['password'].startswith('$2b$04$'))
@@ -0,0 +1,72 @@
+import random
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from api.services.pricing_service import pricing_service, round2
+
+
+def legacy_price(base_price, markup_type, markup_value, default_type, default_value):
+    if markup_type == 'default':
+        markup_type = default_type
+        markup_value = default_value
+
+    if markup_type == 'fixed':
+        final_price = base_price + markup_value
+    elif markup_type == 'percentage':
+        final_price = base_price * (1 + markup_value / 100)
+    else:
+        final_price = base_price
+
+    increase = ((final_price - base_price) / base_price) * 100 if base_price else 0.0
+    return round(final_price, 2), round(increase, 2)
+
+
+class PricingServiceTest(SimpleTestCase):
+    def test_matches_legacy_loop(self):
+        rng = random.Random(7)
+        rows = [
+            (
+                rng.choice([0, 1.005, 2.675, round(rng.uniform(0, 5000), 2), rng.randint(1, 900)]),
+                rng.choice(['fixed', 'percentage', 'default', 'otro']),
+                rng.choice([0, 5, 12.5, 33.3, rng.randint(0, 200)]),
+                rng.choice(['fixed', 'percentage']),
+                rng.choice([0, 10, 25.5]),
+            )
+            for _ in range(5000)
+        ]
+
+        result = pricing_service.apply_markups(*zip(*rows))
+        final_prices = result.rounded_final_prices()
+        increases = round2(result.percentage_increases)
+
+        for row, final_price, increase in zip(rows, final_prices, increases):
+            expected = legacy_price(*row)
+            self.assertEqual((final_price, increase), expected, row)
+            self.assertIs(type(final_price), type(expected[0]), row)
+
+    def test_resolves_default_markup(self):
+        result = pricing_service.apply_markups([100, 100], ['default', 'fixed'], [0, 7], 'percentage', 15)
+
+        self.assertEqual(result.markup_types.tolist(), ['percentage', 'fixed'])
+        self.assertEqual(result.markup_values.tolist(), [15, 7])
+        self.assertEqual(result.rounded_final_prices(), [115.0, 107])
+
+    def test_unused_markup_values_are_not_converted(self):
+        result = pricing_service.apply_markups([100, 100], ['otro', 'fixed'], ['n/a', 5], 'percentage', 0)
+
+        self.assertEqual(result.rounded_final_prices(), [100, 105])
+
+    def test_zero_base_price_has_no_increase(self):
+        result = pricing_service.apply_markups([0], ['fixed'], [10], 'percentage', 0)
+
+        self.assertEqual(result.final_prices.tolist(), [10.0])
+        self.assertEqual(result.percentage_increases.tolist(), [0.0])
+
+    def test_round2_keeps_builtin_round_semantics(self):
+        rng = np.random.default_rng(3)
+        values = [2.675, 1.005, 0.125, 0.375, 1234.565, -2.675, 10.0, -0.0, 1e14 + 0.3, float('inf')]
+        values += ((rng.integers(0, 10 ** 7, 20000) + 0.5) / 100).tolist()
+        values += np.round(rng.random(20000) * 5000, 3).tolist()
+        expected = [round(value, 2) for value in values]
+        self.assertEqual([repr(value) for value in round2(np.array(values))], [repr(value) for value in expected])
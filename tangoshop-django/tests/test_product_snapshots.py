@@ -0,0 +1,174 @@
+import io
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from google.cloud.firestore_v1.transforms import SERVER_TIMESTAMP
+
+from api.services.catalog_service import catalog_service
+from api.services.product_snapshot_service import ProductSnapshotService
+from api.utils import firebase_config
+from api.utils.instrumented_firestore import InstrumentedFirestore
+from api.utils.memory_firestore import MemoryFirestore
+from tests.firestore_budget import firestore_budget
+
+
+def _favorites(count, product_id='p1', snapshot=None):
+    favorites = {}
+    for number in range(count):
+        favorites[f'f{number:04d}'] = {'resellerId': f'r{number}', 'productId': product_id, 'markupType': 'default'}
+        if snapshot is not None:
+            favorites[f'f{number:04d}'].update({'productSnapshot': snapshot, 'productSnapshotAt': SERVER_TIMESTAMP})
+    return favorites
+
+
+class ProductSnapshotServiceTest(SimpleTestCase):
+    def setUp(self):
+        self.db = MemoryFirestore()
+        self.service = ProductSnapshotService()
+
+    def test_fan_out_commits_in_batches_of_500(self):
+        self.db.load({
+            'products': {'p1': {'name': 'Mate', 'price': 150, 'isActive': True}},
+            'favorites': _favorites(1201, snapshot={'name': 'Mate', 'price': 100, 'isActive': True}),
+        })
+        batches = []
+        original = self.db.batch
+
+        def batch():
+            created = original()
+            batches.append(created)
+            return created
+
+        with patch.object(self.db, 'batch', side_effect=batch):
+            written = self.service.fan_out('p1', {'name': 'Mate', 'price': 150, 'isActive': True}, self.db)
+
+        self.assertEqual(written, 1201)
+        self.assertEqual(len(batches), 3)
+        favorite = self.db.collection('favorites').document('f1200').get().to_dict()
+        self.assertEqual(favorite['productSnapshot'], {'name': 'Mate', 'price': 150, 'isActive': True})
+
+    def test_fan_out_skips_favorites_already_up_to_date(self):
+        snapshot = {'name': 'Mate', 'price': 100, 'isActive': True}
+        self.db.load({'favorites': _favorites(3, snapshot=snapshot)})
+
+        self.assertEqual(self.service.fan_out('p1', snapshot, self.db), 0)
+
+    def test_watch_updates_favorites_when_product_changes(self):
+        self.db.load({
+            'products': {'p1': {'name': 'Mate', 'price': 100, 'isActive': True, 'description': 'x'}},
+            'favorites': _favorites(2, snapshot={'name': 'Mate', 'price': 100, 'isActive': True}),
+        })
+        watch = self.service.watch(self.db)
+        self.addCleanup(watch.unsubscribe)
+        self.db.wait_for_listeners()
+
+        self.db.collection('products').document('p1').update({'price': 120})
+        favorite = self.db.collection('favorites').document('f0001')
+        deadline = time.monotonic() + 2
+        while favorite.get().to_dict()['productSnapshot']['price'] != 120:
+            self.assertLess(time.monotonic(), deadline, 'el listener no actualizo el favorito')
+            time.sleep(0.01)
+
+        self.db.collection('products').document('p1').delete()
+        deadline = time.monotonic() + 2
+        while favorite.get().to_dict()['productSnapshot'] != {}:
+            self.assertLess(time.monotonic(), deadline, 'el listener no marco el producto borrado')
+            time.sleep(0.01)
+
+
+class ReconcileProductSnapshotsTest(SimpleTestCase):
+    def setUp(self):
+        self.db = MemoryFirestore()
+        favorites = _favorites(4)
+        favorites['f0001']['productSnapshot'] = {'name': 'Mate', 'price': 90, 'isActive': True}
+        favorites['f0002']['productSnapshot'] = {'name': 'Mate', 'price': 100, 'isActive': True}
+        favorites['f0003']['productId'] = 'gone'
+        self.db.load({
+            'products': {'p1': {'name': 'Mate', 'price': 100, 'isActive': True}},
+            'favorites': favorites,
+        })
+        patcher = patch.dict(firebase_config._handles, {'db': self.db})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _snapshot(self, favorite_id):
+        return self.db.collection('favorites').document(favorite_id).get().to_dict().get('productSnapshot')
+
+    def test_repairs_missing_drifted_and_expiring_snapshots(self):
+        # f0002 coincide con el producto pero nunca se verifico: se renueva.
+        out = io.StringIO()
+        call_command('reconcile_product_snapshots', '--batch-size', '3', stdout=out)
+
+        self.assertIn('Listo: 4 revisados, 2 sin copia, 1 desactualizados, 1 por vencer, 4 reparados', out.getvalue())
+        for favorite_id in ('f0000', 'f0001', 'f0002'):
+            self.assertEqual(self._snapshot(favorite_id), {'name': 'Mate', 'price': 100, 'isActive': True})
+        self.assertEqual(self._snapshot('f0003'), {})
+
+        out = io.StringIO()
+        call_command('reconcile_product_snapshots', stdout=out)
+        self.assertIn('0 reparados', out.getvalue())
+
+    def test_dry_run_writes_nothing(self):
+        out = io.StringIO()
+        call_command('reconcile_product_snapshots', '--dry-run', stdout=out)
+
+        self.assertIn('4 a reparar', out.getvalue())
+        self.assertIsNone(self._snapshot('f0000'))
+        self.assertEqual(self._snapshot('f0001')['price'], 90)
+
+
+@override_settings(CATALOG_CACHE_ENABLED=False, CATALOG_PRODUCT_SNAPSHOTS=True)
+class CatalogFromSnapshotsTest(SimpleTestCase):
+    def setUp(self):
+        self.raw = raw = MemoryFirestore()
+        raw.load({
+            'resellers': {'r1': {'markupType': 'percentage', 'defaultMarkupValue': 10}},
+            'products': {'p1': {'name': 'Mate', 'price': 100, 'isActive': True},
+                         'p2': {'name': 'Bombilla', 'price': 50, 'isActive': True}},
+            'favorites': {
+                'f1': {'resellerId': 'r1', 'productId': 'p1', 'markupType': 'default', 'isActive': True,
+                       'productSnapshot': {'name': 'Mate', 'price': 100, 'isActive': True},
+                       'productSnapshotAt': SERVER_TIMESTAMP},
+                'f2': {'resellerId': 'r1', 'productId': 'p2', 'markupType': 'default', 'isActive': True},
+            },
+        })
+        patcher = patch.dict(firebase_config._handles, {'db': InstrumentedFirestore(raw)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reads_only_products_without_snapshot(self):
+        with firestore_budget(operations=3, reads=4):
+            catalog = catalog_service.get_reseller_catalog('r1')
+
+        self.assertEqual(sorted(item['name'] for item in catalog['products']), ['Bombilla', 'Mate'])
+
+    @override_settings(CATALOG_PRODUCT_SNAPSHOTS=False)
+    def test_setting_disables_snapshots(self):
+        with firestore_budget(operations=3, reads=5):
+            catalog = catalog_service.get_reseller_catalog('r1')
+
+        self.assertEqual(catalog['totalProducts'], 2)
+
+    def test_expired_snapshots_read_the_product(self):
+        old = datetime.now(timezone.utc) - timedelta(days=2)
+        self.raw.collection('favorites').document('f1').update({'productSnapshotAt': old})
+        self.raw.collection('products').document('p1').update({'price': 200})
+
+        with firestore_budget(operations=3, reads=5):
+            catalog = catalog_service.get_reseller_catalog('r1')
+
+        self.assertEqual({item['name']: item['basePrice'] for item in catalog['products']}['Mate'], 200)
+
+    @override_settings(CATALOG_CACHE_ENABLED=True)
+    def test_cached_catalog_expires_with_its_oldest_snapshot(self):
+        catalog_service.cache.clear()
+        self.addCleanup(catalog_service.cache.clear)
+        catalog_service.get_reseller_catalog('r1')
+        self.assertIsNotNone(catalog_service.cache.get('r1'))
+
+        with override_settings(CATALOG_PRODUCT_SNAPSHOT_MAX_AGE=86400):
+            with patch('api.services.catalog_cache.time.time', return_value=time.time() + 86401):
+                self.assertIsNone(catalog_service.cache.get('r1'))
@@ -0,0 +1,61 @@
+import json
+import os
+import pstats
+import tempfile
+import time
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.test import Client, SimpleTestCase, override_settings
+
+from api.middlewares.profiling_middleware import ProfilingMiddleware
+from api.utils.profiling import SamplingProfiler
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class ProfilingMiddlewareTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    @override_settings(PROFILING_TOKEN=None, PROFILING_SAMPLE_RATE=0)
+    def test_removed_from_chain_when_off(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: None)
+
+    def test_requested_profile_is_written_and_summarized(self):
+        with override_settings(PROFILING_TOKEN='perfilar', PROFILING_DIR=self.directory):
+            response = Client().get('/api/health/', HTTP_X_PROFILE='perfilar')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('health_check', response['X-Profile-Id'])
+        self.assertTrue(response['X-Profile-Summary'])
+        path = os.path.join(self.directory, f'{response["X-Profile-Id"]}.pstats')
+        self.assertTrue(pstats.Stats(path).total_calls)
+
+    def test_unauthorized_header_is_ignored(self):
+        with override_settings(PROFILING_TOKEN='perfilar', PROFILING_DIR=self.directory):
+            response = Client().get('/api/health/', HTTP_X_PROFILE='otro')
+
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_sampling_profiler_exports_speedscope(self):
+        profiler = SamplingProfiler(interval=0.001)
+        profiler.start()
+        busy(0.05)
+        profiler.stop()
+        path = os.path.join(self.directory, 'perfil.speedscope.json')
+        profiler.write(path)
+
+        with open(path, encoding='utf-8') as profile_file:
+            document = json.load(profile_file)
+        profile = document['profiles'][0]
+        self.assertEqual(profile['type'], 'sampled')
+        self.assertEqual(len(profile['samples']), len(profile['weights']))
+        self.assertIn('busy', profiler.top(1)[0][0])
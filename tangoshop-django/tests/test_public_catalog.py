@@ -0,0 +1,187 @@
+import gzip
+import io
+import json
+import shutil
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import Client, SimpleTestCase, override_settings
+from google.cloud.firestore_v1.transforms import SERVER_TIMESTAMP
+
+from api.services.catalog_service import catalog_service
+from api.services.public_catalog_service import PublicCatalogService, public_catalog_service
+from api.utils import firebase_config
+from api.utils.instrumented_firestore import InstrumentedFirestore
+from api.utils.memory_firestore import MemoryFirestore
+from tests.firestore_budget import firestore_budget
+
+
+class PublicCatalogTestCase(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        override = override_settings(PUBLIC_CATALOG_DIR=self.directory, CATALOG_CACHE_ENABLED=False,
+                                     CATALOG_PRODUCT_SNAPSHOTS=True)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.raw = MemoryFirestore()
+        self.raw.load({
+            'users': {'r1': {'firstName': 'Ana', 'lastName': 'Paz', 'userType': 'reseller', 'password': 'hash'}},
+            'resellers': {
+                'r1': {'markupType': 'percentage', 'defaultMarkupValue': 10,
+                       'catalogSettings': {'isPublic': True, 'lastGenerated': None, 'catalogUrl': ''}},
+                'r2': {'markupType': 'percentage', 'defaultMarkupValue': 0,
+                       'catalogSettings': {'isPublic': False, 'lastGenerated': None, 'catalogUrl': ''}},
+            },
+            'favorites': {
+                'f1': {'resellerId': 'r1', 'productId': 'p1', 'isActive': True, 'markupType': 'default',
+                       'productSnapshot': {'name': 'Mate <imperial>', 'price': 100, 'isActive': True},
+                       'productSnapshotAt': SERVER_TIMESTAMP},
+            },
+        })
+        patcher = patch.dict(firebase_config._handles, {'db': InstrumentedFirestore(self.raw)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def reseller(self, reseller_id='r1'):
+        return self.raw.collection('resellers').document(reseller_id).get().to_dict()
+
+
+class PublicCatalogServiceTest(PublicCatalogTestCase):
+    def test_generate_writes_versioned_files(self):
+        version = public_catalog_service.generate('r1')
+
+        directory = Path(self.directory) / 'r1'
+        payload = json.loads((directory / f'{version}.json').read_bytes())
+        self.assertEqual(payload, {
+            'resellerId': 'r1', 'name': 'Ana Paz', 'totalProducts': 1,
+            'products': [{'productId': 'p1', 'name': 'Mate <imperial>', 'price': 110.0}],
+        })
+        html = gzip.decompress((directory / f'{version}.html.gz').read_bytes()).decode()
+        self.assertIn('Mate &lt;imperial&gt;', html)
+        self.assertEqual((directory / 'current').read_text(), version)
+
+        settings = self.reseller()['catalogSettings']
+        self.assertEqual(settings['catalogUrl'], '/api/public/catalogs/r1/')
+        self.assertIsNotNone(settings['lastGenerated'])
+
+    def test_unchanged_inputs_write_nothing(self):
+        version = public_catalog_service.generate('r1')
+        with firestore_budget(writes=0):
+            self.assertEqual(public_catalog_service.generate('r1'), version)
+
+    def test_changed_inputs_publish_a_new_version_and_prune_old_ones(self):
+        versions = []
+        for markup in (10, 20, 30, 40, 50):
+            self.raw.collection('resellers').document('r1').update({'defaultMarkupValue': markup})
+            versions.append(public_catalog_service.generate('r1'))
+
+        self.assertEqual(len(set(versions)), 5)
+        kept = {path.name.split('.')[0] for path in (Path(self.directory) / 'r1').glob('*.json')}
+        self.assertEqual(kept, set(versions[1:]))
+
+    @override_settings(CATALOG_CACHE_ENABLED=True)
+    def test_generate_bypasses_catalog_cache(self):
+        self.addCleanup(catalog_service.cache.clear)
+        public_catalog_service.generate('r1')
+
+        self.assertEqual(catalog_service.cache.stats()['entries'], 0)
+        self.assertEqual(catalog_service.cache.stats()['listeners'], 0)
+
+    def test_private_catalogs_are_unpublished(self):
+        public_catalog_service.generate('r1')
+        self.raw.collection('resellers').document('r1').update({'catalogSettings.isPublic': False})
+
+        self.assertIsNone(public_catalog_service.generate('r1'))
+        self.assertFalse((Path(self.directory) / 'r1').exists())
+        self.assertEqual(self.reseller()['catalogSettings']['catalogUrl'], '')
+
+    def test_watch_marks_resellers_whose_inputs_changed(self):
+        service = PublicCatalogService()
+        watches = service.watch(self.raw)
+        for watch in watches:
+            self.addCleanup(watch.unsubscribe)
+        self.raw.wait_for_listeners()
+
+        self.raw.collection('resellers').document('r1').update({'catalogSettings.lastGenerated': 'ayer'})
+        self.assertEqual(service.take_dirty(timeout=0.2), set())
+
+        self.raw.collection('favorites').document('f1').update({'productSnapshot.price': 120})
+        self.raw.collection('users').document('r1').update({'lastName': 'Perez'})
+
+        self.assertEqual(service.take_dirty(settle=0.05, timeout=2), {'r1'})
+        self.assertEqual(service.take_dirty(timeout=0), set())
+
+        self.raw.collection('favorites').document('f1').delete()
+        self.assertEqual(service.take_dirty(timeout=2), {'r1'})
+
+    def test_command_publishes_public_resellers(self):
+        out = io.StringIO()
+        call_command('publish_public_catalogs', stdout=out)
+
+        self.assertIn('1 publicados, 0 no publicos, 0 con error', out.getvalue())
+        self.assertIsNotNone(public_catalog_service.current_version('r1'))
+        self.assertIsNone(public_catalog_service.current_version('r2'))
+
+
+class PublicCatalogViewTest(PublicCatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.version = public_catalog_service.generate('r1')
+        self.client = Client()
+        # El trafico publico no lee Firestore ni calcula precios.
+        pricing = patch('api.services.catalog_service.pricing_service.apply_markups', side_effect=AssertionError)
+        pricing.start()
+        self.addCleanup(pricing.stop)
+
+    def get(self, url, **headers):
+        with firestore_budget(operations=0):
+            response = self.client.get(url, **headers)
+        self.addCleanup(response.close)
+        return response
+
+    def test_serves_precompressed_variant(self):
+        response = self.get('/api/public/catalogs/r1/', HTTP_ACCEPT_ENCODING='br, gzip')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/html; charset=utf-8')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['ETag'], f'"{self.version}-gz"')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        self.assertIn(b'Ana Paz', gzip.decompress(b''.join(response.streaming_content)))
+
+    def test_serves_plain_json_without_gzip(self):
+        response = self.get('/api/public/catalogs/r1/catalog.json', HTTP_ACCEPT_ENCODING='gzip;q=0')
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(json.loads(b''.join(response.streaming_content))['totalProducts'], 1)
+        self.assertEqual(response['ETag'], f'"{self.version}"')
+
+    def test_versioned_urls_are_immutable(self):
+        response = self.get(f'/api/public/catalogs/r1/{self.version}.json')
+
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(self.get(f'/api/public/catalogs/r1/{"0" * 16}.json').status_code, 404)
+        self.assertEqual(self.get(f'/api/public/catalogs/r1/{self.version}.txt').status_code, 404)
+
+    def test_not_modified(self):
+        response = self.get('/api/public/catalogs/r1/', HTTP_IF_NONE_MATCH=f'"{self.version}"')
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+
+    def test_unknown_or_private_catalogs(self):
+        self.assertEqual(self.get('/api/public/catalogs/r2/').status_code, 404)
+        self.assertEqual(self.get('/api/public/catalogs/nope/').status_code, 404)
+
+    @override_settings(PUBLIC_CATALOG_SENDFILE_HEADER='X-Accel-Redirect')
+    def test_sendfile(self):
+        response = self.get('/api/public/catalogs/r1/', HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(response['X-Accel-Redirect'], f'/internal/catalogs/r1/{self.version}.html.gz')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response.content, b'')
@@ -0,0 +1,59 @@
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from api.services.supplier_service import supplier_service
+from tests.firestore_mocks import make_async_db, make_db
+
+
+class SupplierServiceTest(SimpleTestCase):
+    def _db(self, total, factory=make_db):
+        resellers = {f'r{i}': {'markupType': 'percentage', 'defaultMarkupValue': 10 + (i % 3) * 10} for i in range(total)}
+        users = {f'r{i}': {'firstName': f'Nombre {i}', 'lastName': 'Apellido', 'email': f'r{i}@mail.com'} for i in range(total)}
+        return factory(
+            {
+                'products': {'p1': {'name': 'Mate', 'price': 100, 'supplierId': 's1'}},
+                'resellers': resellers,
+                'users': users,
+            },
+            {'favorites': [{'resellerId': f'r{i}', 'markupType': 'default'} for i in range(total)]},
+        )
+
+    def test_batched_and_serial_modes_match(self):
+        with patch('api.services.supplier_service.db', self._db(30)):
+            batched = supplier_service.get_resellers_high_markup('s1', 'p1', batched=True)
+        with patch('api.services.supplier_service.db', self._db(30)):
+            serial = supplier_service.get_resellers_high_markup('s1', 'p1', batched=False)
+
+        self.assertEqual(batched, serial)
+        self.assertEqual(batched['totalResellers'], 10)
+        self.assertEqual(batched['resellers'][0], {
+            'resellerId': 'r2',
+            'firstName': 'Nombre 2',
+            'lastName': 'Apellido',
+            'email': 'r2@mail.com',
+            'finalPrice': 130.0,
+            'percentageIncrease': 30.0,
+        })
+
+    def test_batched_mode_uses_constant_round_trips(self):
+        db = self._db(90)
+        with patch('api.services.supplier_service.db', db):
+            supplier_service.get_resellers_high_markup('s1', 'p1', batched=True)
+
+        self.assertEqual(db.get_all.call_count, 2)
+
+    def test_product_without_name_keeps_null_product_name(self):
+        db = make_db({'products': {'p1': {'price': 100, 'supplierId': 's1'}}}, {'favorites': []})
+        with patch('api.services.supplier_service.db', db):
+            result = supplier_service.get_resellers_high_markup('s1', 'p1', batched=True)
+
+        self.assertIsNone(result['productName'])
+
+    async def test_async_lookup_matches_sync(self):
+        with patch('api.services.supplier_service.db', self._db(30)):
+            expected = supplier_service.get_resellers_high_markup('s1', 'p1', batched=True)
+        with patch('api.services.supplier_service.async_db', self._db(30, make_async_db)):
+            result = await supplier_service.aget_resellers_high_markup('s1', 'p1')
+
+        self.assertEqual(result, expected)